@@ -0,0 +1,71 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from ..services.executor import run_io
+from ..services.doc_store import get_document_text_stats
+from ..services import index_versions
+from ..services.index_versions import IndexVersionError
+
+router = APIRouter(prefix="/index", tags=["Index Versions"])
+
+class ReindexRequest(BaseModel):
+    """Settings of the new index version; omitted ones are kept from the
+    active version (chunk_max_tokens null = the embedder's window)"""
+    embedder_backend: Optional[Literal["sentence-transformers", "onnx", "hashing"]] = None
+    embedder_model: Optional[str] = None
+    embedder_model_path: Optional[str] = None
+    embedder_dimension: Optional[int] = Field(None, ge=1)
+    chunk_max_tokens: Optional[int] = Field(None, ge=1)
+    chunk_overlap_tokens: Optional[int] = Field(None, ge=0)
+    # Switch queries to the new version as soon as it is built
+    activate: bool = True
+
+async def _call(function, *args, **kwargs):
+    try:
+        return await run_io(function, *args, **kwargs)
+    except IndexVersionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@router.get("/versions")
+async def list_index_versions():
+    """Every index version (newest first) and the document texts kept for re-indexing"""
+    return {
+        "versions": await _call(index_versions.list_versions),
+        "document_texts": await run_io(get_document_text_stats)
+    }
+
+@router.get("/versions/{version}")
+async def get_index_version(version: int):
+    """One index version with its build progress"""
+    return await _call(index_versions.get_version, version)
+
+@router.post("/reindex", status_code=202)
+async def reindex(request: ReindexRequest):
+    """Rebuild the index from the kept document texts with new chunking or
+    embedding settings as a new version, in the background (throttled to
+    REINDEX_DUTY_CYCLE); follow it at GET /index/versions/{version}"""
+    options = request.model_dump(exclude_unset=True, exclude={"activate"})
+    return await _call(index_versions.start_reindex, options, activate=request.activate)
+
+@router.post("/versions/{version}/activate", status_code=202)
+async def activate_index_version(version: int):
+    """Switch queries to a ready or retired version once it has caught up
+    with changed documents, in the background; follow it at
+    GET /index/versions/{version}"""
+    return await _call(index_versions.activate_version, version)
+
+@router.post("/versions/{version}/cancel")
+async def cancel_index_version(version: int):
+    """Stop a version being built"""
+    return await _call(index_versions.cancel_reindex, version)
+
+@router.post("/rollback", status_code=202)
+async def rollback_index():
+    """Switch back to the previously active version, in the background like
+    activation"""
+    return await _call(index_versions.rollback)
+
+@router.delete("/versions/{version}")
+async def delete_index_version(version: int):
+    """Delete an inactive version's data from disk"""
+    return await _call(index_versions.delete_version, version)
@@ -1,19 +1,34 @@
-from fastapi import APIRouter, HTTPException
-from ..services.doc_store import list_documents, delete_document, get_document_stats
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query
+from ..services.doc_store import list_documents_page, get_document_stats
+from ..services.executor import run_io
+from ..services.lifecycle import delete_documents, delete_matching, compact_index
+from .query import as_utc
 
 router = APIRouter(prefix="/metadata", tags=["Document Metadata"])
 
 @router.get("")
-async def get_all_metadata():
-    """Get metadata for all uploaded documents"""
+async def get_all_metadata(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    sort: Literal["upload_time", "filename", "pages", "chunks", "text_length", "doc_id"] = "upload_time",
+    order: Literal["asc", "desc"] = "desc"
+):
+    """Get metadata for uploaded documents, one page at a time (follow
+    next_cursor until it is null)"""
     try:
-        documents = list_documents()
-        stats = get_document_stats()
+        page = await run_io(list_documents_page, limit=limit, cursor=cursor, sort=sort,
+                            descending=order == "desc")
+        stats = await run_io(get_document_stats)
         
         return {
-            "documents": documents,
+            "documents": page["documents"],
+            "next_cursor": page["next_cursor"],
             "stats": stats
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve metadata: {str(e)}")
 
@@ -21,17 +36,52 @@ async def get_all_metadata():
 async def get_metadata_stats():
     """Get document statistics"""
     try:
-        return get_document_stats()
+        return await run_io(get_document_stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve stats: {str(e)}")
 
+@router.delete("")
+async def delete_documents_matching(
+    filename_pattern: Optional[str] = Query(None, description='glob, e.g. "invoice_*.pdf"'),
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None
+):
+    """Bulk delete every document matching the filters (at least one),
+    with its chunks, lexical index entries and cached answers"""
+    if filename_pattern is None and uploaded_after is None and uploaded_before is None:
+        raise HTTPException(status_code=400, detail="At least one filter is required for a bulk delete")
+    try:
+        result = await run_io(
+            delete_matching,
+            filename_pattern=filename_pattern,
+            uploaded_after=as_utc(uploaded_after),
+            uploaded_before=as_utc(uploaded_before)
+        )
+        return {"message": f"Deleted {len(result['deleted'])} documents", **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete documents: {str(e)}")
+
+@router.post("/compact")
+async def compact_documents(
+    min_age_seconds: Optional[float] = Query(None, ge=0),
+    dry_run: bool = False
+):
+    """Remove orphaned chunks (indexed documents without a metadata row,
+    older than min_age_seconds, default COMPACTION_MIN_AGE_SECONDS) and
+    report the space reclaimed"""
+    try:
+        return await run_io(compact_index, min_age_seconds=min_age_seconds, dry_run=dry_run)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Compaction failed: {str(e)}")
+
 @router.delete("/{doc_id}")
 async def delete_document_metadata(doc_id: str):
-    """Delete document metadata (note: does not remove from vector store)"""
+    """Delete a document: metadata, vector store chunks, lexical index
+    entries and cached answers"""
     try:
-        success = delete_document(doc_id)
-        if success:
-            return {"message": f"Document {doc_id} metadata deleted successfully"}
+        result = await run_io(delete_documents, [doc_id])
+        if result["deleted"]:
+            return {"message": f"Document {doc_id} deleted successfully", "chunks_deleted": result["chunks_deleted"]}
         else:
             raise HTTPException(status_code=404, detail="Document not found")
     except HTTPException:
@@ -43,7 +93,7 @@ async def delete_document_metadata(doc_id: str):
 async def metadata_health():
     """Health check for metadata service"""
     try:
-        stats = get_document_stats()
+        stats = await run_io(get_document_stats)
         return {
             "status": "healthy",
             "database": "connected",
@@ -1,14 +1,39 @@
-from typing import Optional
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from ..services.vector_store import search_similar_chunks
-from ..services.llm_providers import LLMRequest, generate_with_fallback
+import json
+import time
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from ..config import settings
+from ..services.vector_store import retrieve_chunks, retrieve_chunks_batch, embed_chunks, embed_query_batched
+from ..services import llm_providers
+from ..services.llm_providers import LLMRequest, generate_with_fallback, stream_with_fallback, provider_limits
+from ..services.context_builder import ContextBuilder
+from ..services.executor import run_cpu, run_io
+from ..services.doc_store import find_document_ids
+from ..services.semantic_cache import semantic_cache, get_corpus_version
+from ..services import metrics
 
 router = APIRouter(prefix="/query", tags=["Document Query"])
 
+class QueryFilters(BaseModel):
+    """Restrict retrieval to matching documents (all given filters apply)"""
+    doc_ids: Optional[list[str]] = None
+    filename_pattern: Optional[str] = None  # glob, e.g. "invoice_*.pdf"
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
 class QueryRequest(BaseModel):
     question: str
     max_chunks: int = 5
+    # Retrieval mode (defaults to RETRIEVAL_MODE) and hybrid fusion weights
+    retrieval_mode: Optional[Literal["dense", "lexical", "hybrid"]] = None
+    dense_weight: float = Field(1.0, ge=0)
+    lexical_weight: float = Field(1.0, ge=0)
+    filters: Optional[QueryFilters] = None
 
 class QueryResponse(BaseModel):
     answer: str
@@ -16,51 +41,369 @@ class QueryResponse(BaseModel):
     success: bool
     relevant_chunks: list[str]
     error: Optional[str] = None
+    hedge_delay: Optional[float] = None
+    cached: bool = False
+    # Tokens of context sent to the answering provider, and how many fewer
+    # that is than joining every retrieved chunk
+    context_tokens: Optional[int] = None
+    tokens_saved: Optional[int] = None
+    # Seconds per stage of this request (DEBUG only): embed, filters,
+    # cache_lookup, vector_search, lexical_search, context, llm_<provider>,
+    # db, generate, total
+    timings: Optional[dict[str, float]] = None
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC, as upload times are stored"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+async def resolve_filters(filters: Optional[QueryFilters]) -> Optional[list[str]]:
+    """Document ids matching the filters (None when unfiltered)"""
+    if filters is None or not filters.model_dump(exclude_none=True):
+        return None
+    return await run_io(
+        find_document_ids,
+        doc_ids=filters.doc_ids,
+        filename_pattern=filters.filename_pattern,
+        uploaded_after=as_utc(filters.uploaded_after),
+        uploaded_before=as_utc(filters.uploaded_before)
+    )
+
+@dataclass
+class PreparedQuery:
+    """Everything before generation. response is set when the query was
+    answered without calling a provider (cache hit, nothing to search)."""
+    response: Optional[QueryResponse] = None
+    query_embedding: Optional[list[float]] = None
+    corpus_version: int = 0
+    cache_key: tuple = ()
+    chunks: list[str] = field(default_factory=list)
+    builder: Optional[ContextBuilder] = None
+    budgets: dict[str, int] = field(default_factory=dict)
+    llm_request: Optional[LLMRequest] = None
+
+def _no_match_response() -> QueryResponse:
+    return QueryResponse(
+        answer="No documents match the given filters.",
+        provider_used="none",
+        success=False,
+        relevant_chunks=[],
+        error="No documents match the filters"
+    )
+
+def _cache_key(request: QueryRequest, doc_ids: Optional[list[str]]) -> tuple:
+    # Answers are only reused for the same retrieval settings and scope
+    return (
+        request.max_chunks, request.retrieval_mode or settings.RETRIEVAL_MODE,
+        request.dense_weight, request.lexical_weight,
+        tuple(sorted(doc_ids)) if doc_ids is not None else None
+    )
+
+def _retrieval_args(request: QueryRequest, query_embedding: list[float], doc_ids: Optional[list[str]]) -> dict:
+    return {
+        "query": request.question,
+        "k": request.max_chunks,
+        "query_embedding": query_embedding,
+        "mode": request.retrieval_mode or settings.RETRIEVAL_MODE,
+        "dense_weight": request.dense_weight,
+        "lexical_weight": request.lexical_weight,
+        "doc_ids": doc_ids
+    }
+
+def _assemble(request: QueryRequest, hits: list[dict], query_embedding: list[float],
+              corpus_version: int, cache_key: tuple) -> PreparedQuery:
+    """Context assembly for retrieved hits (CPU work: run off the event loop)"""
+    flattened_chunks = [hit["text"] for hit in hits]
+    
+    if not flattened_chunks:
+        return PreparedQuery(response=QueryResponse(
+            answer="No relevant documents found. Please upload documents first.",
+            provider_used="none",
+            success=False,
+            relevant_chunks=[],
+            error="No documents in database"
+        ))
+    
+    # Merge overlapping neighbours, drop near-duplicates and pack into
+    # each provider's token budget
+    builder = ContextBuilder(
+        hits, query_embedding,
+        lambda_=settings.MMR_LAMBDA,
+        duplicate_threshold=settings.MMR_DUPLICATE_THRESHOLD
+    )
+    context, _ = builder.pack(settings.CONTEXT_TOKEN_BUDGET)
+    budgets = {p.name: p.context_tokens for p in llm_providers.PROVIDERS}
+    provider_contexts = {
+        name: builder.pack(budget)[0]
+        for name, budget in budgets.items() if budget != settings.CONTEXT_TOKEN_BUDGET
+    }
+    return PreparedQuery(
+        query_embedding=query_embedding,
+        corpus_version=corpus_version,
+        cache_key=cache_key,
+        chunks=flattened_chunks,
+        builder=builder,
+        budgets=budgets,
+        llm_request=LLMRequest(query=request.question, context=context, provider_contexts=provider_contexts)
+    )
+
+async def prepare_query(request: QueryRequest) -> PreparedQuery:
+    """Embedding, filters, cache lookup, retrieval and context assembly"""
+    # Embed once (micro-batched with concurrent queries): used for the
+    # cache lookup and the vector search
+    with metrics.timed("embed"):
+        query_embedding = await embed_query_batched(request.question)
+    corpus_version = await run_io(get_corpus_version)
+    with metrics.timed("filters"):
+        doc_ids = await resolve_filters(request.filters)
+    if doc_ids is not None and not doc_ids:
+        return PreparedQuery(response=_no_match_response())
+    cache_key = _cache_key(request, doc_ids)
+
+    # Serve semantically equivalent questions from the answer cache
+    if settings.SEMANTIC_CACHE_ENABLED:
+        with metrics.timed("cache_lookup"):
+            cached = await run_cpu(semantic_cache.lookup, query_embedding, cache_key)
+        if cached:
+            return PreparedQuery(response=QueryResponse(**cached, cached=True))
+
+    # Search for relevant document chunks (embedding + Chroma run off the event loop)
+    hits = await run_cpu(retrieve_chunks, **_retrieval_args(request, query_embedding, doc_ids),
+                         include_embeddings=True)
+    with metrics.timed("context"):
+        return await run_cpu(_assemble, request, hits, query_embedding, corpus_version, cache_key)
+
+async def prepare_batch(requests: list[QueryRequest]) -> list[PreparedQuery]:
+    """prepare_query for many questions: one embedding batch and one
+    multi-vector retrieval call (per document scope) for the whole list"""
+    prepared = [None] * len(requests)
+    for i, request in enumerate(requests):
+        if not request.question.strip():
+            prepared[i] = PreparedQuery(response=QueryResponse(
+                answer="", provider_used="none", success=False, relevant_chunks=[],
+                error="Question cannot be empty"
+            ))
+    todo = [i for i, p in enumerate(prepared) if p is None]
+    if not todo:
+        return prepared
+
+    with metrics.timed("embed"):
+        embeddings = await run_cpu(embed_chunks, [requests[i].question for i in todo])
+    corpus_version = await run_io(get_corpus_version)
+    with metrics.timed("filters"):
+        scopes = await asyncio.gather(*(resolve_filters(requests[i].filters) for i in todo))
+
+    pending = []
+    for i, query_embedding, doc_ids in zip(todo, embeddings, scopes):
+        if doc_ids is not None and not doc_ids:
+            prepared[i] = PreparedQuery(response=_no_match_response())
+            continue
+        pending.append((i, query_embedding, doc_ids, _cache_key(requests[i], doc_ids)))
+    if settings.SEMANTIC_CACHE_ENABLED and pending:
+        def lookup_all():
+            return [semantic_cache.lookup(query_embedding, cache_key)
+                    for _, query_embedding, _, cache_key in pending]
+        with metrics.timed("cache_lookup"):
+            cached = await run_cpu(lookup_all)
+        for (i, *_), payload in zip(pending, cached):
+            if payload:
+                prepared[i] = PreparedQuery(response=QueryResponse(**payload, cached=True))
+        pending = [item for item, payload in zip(pending, cached) if not payload]
+    if not pending:
+        return prepared
+
+    hits = await run_cpu(
+        retrieve_chunks_batch,
+        [_retrieval_args(requests[i], query_embedding, doc_ids) for i, query_embedding, doc_ids, _ in pending],
+        include_embeddings=True
+    )
+
+    def assemble_all():
+        return [
+            _assemble(requests[i], item_hits, query_embedding, corpus_version, cache_key)
+            for (i, query_embedding, _, cache_key), item_hits in zip(pending, hits)
+        ]
+    with metrics.timed("context"):
+        assembled = await run_cpu(assemble_all)
+    for (i, *_), item in zip(pending, assembled):
+        prepared[i] = item
+    return prepared
+
+def complete_query(prepared: PreparedQuery, result: dict) -> QueryResponse:
+    """Build the response from a generation result and cache successful
+    answers (blocking: callers run it on the CPU pool)"""
+    context_tokens = prepared.builder.pack(
+        prepared.budgets.get(result["provider_used"], settings.CONTEXT_TOKEN_BUDGET)
+    )[1]
+    tokens_saved = max(0, prepared.builder.tokens_retrieved - context_tokens)
+
+    if settings.SEMANTIC_CACHE_ENABLED and result["success"]:
+        semantic_cache.store(
+            prepared.query_embedding,
+            prepared.cache_key,
+            {
+                "answer": result["answer"],
+                "provider_used": result["provider_used"],
+                "success": True,
+                "relevant_chunks": prepared.chunks,
+                "context_tokens": context_tokens,
+                "tokens_saved": tokens_saved
+            },
+            corpus_version=prepared.corpus_version
+        )
+    
+    return QueryResponse(
+        answer=result["answer"],
+        provider_used=result["provider_used"],
+        success=result["success"],
+        relevant_chunks=prepared.chunks,
+        error=result.get("error"),
+        hedge_delay=result.get("hedge_delay"),
+        context_tokens=context_tokens,
+        tokens_saved=tokens_saved
+    )
 
 @router.post("", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
     
+    timings = metrics.start_timings() if settings.DEBUG else None
+    start = time.perf_counter()
     try:
-        # Search for relevant document chunks
-        chunks = search_similar_chunks(query=request.question, k=request.max_chunks)
-        
-        # Flatten chunks if nested lists
-        flattened_chunks = []
-        for c in chunks:
-            if isinstance(c, list):
-                flattened_chunks.extend(c)
-            else:
-                flattened_chunks.append(c)
-        
-        if not flattened_chunks:
-            return QueryResponse(
-                answer="No relevant documents found. Please upload documents first.",
-                provider_used="none",
-                success=False,
-                relevant_chunks=[],
-                error="No documents in database"
-            )
-        
-        # Join chunks with double newlines
-        context = '\n\n'.join(flattened_chunks)
+        prepared = await prepare_query(request)
+        if prepared.response is not None:
+            return _with_timings(prepared.response, timings, start)
         
         # Generate answer using LLM
-        llm_request = LLMRequest(query=request.question, context=context)
-        result = generate_with_fallback(llm_request)
+        with metrics.timed("generate"):
+            result = await generate_with_fallback(prepared.llm_request)
+        return _with_timings(await run_cpu(complete_query, prepared, result), timings, start)
         
-        return QueryResponse(
-            answer=result["answer"],
-            provider_used=result["provider_used"],
-            success=result["success"],
-            relevant_chunks=flattened_chunks,
-            error=result.get("error")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
+
+def _with_timings(response: QueryResponse, timings: Optional[dict], start: float) -> QueryResponse:
+    """Attach the request's stage breakdown (when one was collected)"""
+    if timings is None:
+        return response
+    breakdown = {name: round(seconds, 6) for name, seconds in timings.items()}
+    breakdown["total"] = round(time.perf_counter() - start, 6)
+    return response.model_copy(update={"timings": breakdown})
+
+def _sse(event: str, data: dict) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _query_events(prepared: PreparedQuery, timings: Optional[dict] = None,
+                        start: float = 0.0) -> AsyncIterator[str]:
+    """chunks -> provider -> token... -> done (the QueryResponse without the
+    chunks and answer already sent); errors end the stream with an error event"""
+    if prepared.response is not None:
+        response = _with_timings(prepared.response, timings, start)
+        yield _sse("chunks", {"relevant_chunks": response.relevant_chunks})
+        if response.success:
+            yield _sse("token", {"text": response.answer})
+        yield _sse("done", response.model_dump(exclude={"relevant_chunks"}))
+        return
+
+    yield _sse("chunks", {"relevant_chunks": prepared.chunks})
+    try:
+        async for event in stream_with_fallback(prepared.llm_request):
+            if event["type"] == "provider":
+                yield _sse("provider", {
+                    "provider": event["provider"],
+                    "time_to_first_token": event["time_to_first_token"]
+                })
+            elif event["type"] == "token":
+                yield _sse("token", {"text": event["text"]})
+            else:
+                response = _with_timings(await run_cpu(complete_query, prepared, event["result"]), timings, start)
+                yield _sse("done", response.model_dump(exclude={"relevant_chunks", "answer"}))
+    except Exception as e:
+        yield _sse("error", {"detail": f"Query processing failed: {str(e)}"})
+
+@router.post("/stream")
+async def stream_query(request: QueryRequest):
+    """Like POST /query, as Server-Sent Events: a "chunks" event with the
+    retrieved chunks, "provider" once a provider starts answering, "token"
+    events with answer text as it is generated, then "done"."""
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    timings = metrics.start_timings() if settings.DEBUG else None
+    start = time.perf_counter()
+    try:
+        prepared = await prepare_query(request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
+
+    return StreamingResponse(
+        _query_events(prepared, timings, start),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class BatchQueryRequest(BaseModel):
+    queries: list[QueryRequest] = Field(..., min_length=1, max_length=settings.BATCH_MAX_QUERIES)
+
+class BatchQueryResponse(BaseModel):
+    results: list[QueryResponse]
+
+async def _answer(index: int, prepared: PreparedQuery, limits: dict) -> tuple[int, QueryResponse]:
+    if prepared.response is not None:
+        return index, prepared.response
+    try:
+        result = await generate_with_fallback(prepared.llm_request, limits=limits)
+        return index, await run_cpu(complete_query, prepared, result)
+    except Exception as e:
+        return index, QueryResponse(
+            answer="", provider_used="none", success=False,
+            relevant_chunks=prepared.chunks, error=f"Query processing failed: {str(e)}"
         )
-        
+
+async def _batch_lines(tasks: list) -> AsyncIterator[str]:
+    """One JSON line per item, as items finish"""
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, response = await next_done
+            yield json.dumps({"index": index, **response.model_dump()}) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@router.post("/batch", response_model=BatchQueryResponse)
+async def query_batch(request: BatchQueryRequest, stream: bool = Query(False)):
+    """Answer a list of questions: embedded in one batch, retrieved with one
+    multi-vector index query, generated concurrently with at most
+    BATCH_PROVIDER_CONCURRENCY calls per provider. Results keep the request
+    order; with stream=true they are sent as NDJSON lines ({"index", ...})
+    as each one finishes."""
+    try:
+        prepared = await prepare_batch(request.queries)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
 
+    limits = provider_limits(settings.BATCH_PROVIDER_CONCURRENCY)
+    tasks = [asyncio.create_task(_answer(i, item, limits)) for i, item in enumerate(prepared)]
+    if stream:
+        return StreamingResponse(_batch_lines(tasks), media_type="application/x-ndjson")
+    results = await asyncio.gather(*tasks)
+    return BatchQueryResponse(results=[response for _, response in results])
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Semantic answer cache hit/miss counters"""
+    return await run_io(semantic_cache.stats)
+
+@router.delete("/cache")
+async def clear_cache():
+    """Drop every cached answer"""
+    await run_io(semantic_cache.clear)
+    return {"message": "Semantic cache cleared"}
+
 @router.get("/test")
 async def test_query():
     return {"message": "Query service is working", "status": "healthy"}
@@ -1,115 +1,180 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from ..services.vector_store import add_document_chunks, get_collection_stats
-from ..services.doc_store import save_metadata, count_documents, DOC_LIMIT
-from ..utils.text_processing import extract_pdf_text, chunk_text, clean_text
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse
+from ..config import settings
+from ..services.vector_store import get_collection_stats
+from ..services.doc_store import count_documents, find_document_by_hash, claim_upload, release_upload, DOC_LIMIT
+from ..services.executor import run_cpu, run_io
+from ..services.ingest import ingest_document, IngestError
+from ..services.ingest_jobs import job_queue, get_job, count_pending_jobs, find_pending_job_by_hash, QueueFullError
+from ..utils.uploads import save_upload
 import uuid
 import os
 
 router = APIRouter(prefix="/upload", tags=["Document Upload"])
 
-@router.post("")
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and process a PDF document with limits enforcement"""
-    
-    # Check document limit
-    current_count = count_documents()
+async def _check_document_limit():
+    # Queued jobs will become documents too
+    current_count = await run_io(count_documents) + await run_io(count_pending_jobs)
     if current_count >= DOC_LIMIT:
         raise HTTPException(
             status_code=400, 
             detail=f"Document limit reached. Maximum {DOC_LIMIT} documents allowed. Currently have {current_count} documents."
         )
+
+def _duplicate_response(content_hash: str, existing: Optional[dict], pending: Optional[dict]):
+    if existing:
+        return {
+            "document_id": existing["doc_id"],
+            "filename": existing["filename"],
+            "chunks_created": existing["chunks"],
+            "text_length": existing["text_length"],
+            "pages": existing["pages"],
+            "content_hash": content_hash,
+            "status": "duplicate"
+        }
+    return JSONResponse(status_code=202, content={
+        **pending,
+        "status_url": f"/upload/jobs/{pending['job_id']}",
+        "duplicate": True
+    })
+
+@router.post("")
+async def upload_document(
+    file: UploadFile = File(...),
+    background: bool = False,
+    force: bool = False,
+    chunk_tokens: Optional[int] = Query(None, ge=16),
+    chunk_overlap: Optional[int] = Query(None, ge=0)
+):
+    """Upload and process a PDF document with limits enforcement.
+
+    With ?background=true the file is saved and queued for ingestion and a
+    job id is returned immediately; poll /upload/jobs/{job_id} for progress.
+
+    Uploads are keyed by content hash: a byte-identical file returns the
+    existing document_id without re-processing. ?force=true re-ingests it
+    under the same document_id.
+
+    ?chunk_tokens and ?chunk_overlap override the chunk size and overlap
+    (in embedding-model tokens) for this document."""
     
     # Validate file type
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    # Validate file size (max 50MB)
-    file_content = await file.read()
-    if len(file_content) > 50 * 1024 * 1024:  # 50MB
-        raise HTTPException(status_code=400, detail="File too large. Maximum size is 50MB")
-    
+    temp_path = None
+    enqueued = False
+    claimed = False
     try:
         # Generate unique document ID
         doc_id = str(uuid.uuid4())
         
-        # Save file temporarily
-        temp_path = f"/app/uploads/{doc_id}_{file.filename}"
-        os.makedirs("/app/uploads", exist_ok=True)
-        
-        with open(temp_path, "wb") as f:
-            f.write(file_content)
-        
-        # Extract text from PDF
-        text_content = extract_pdf_text(temp_path)
-        
-        if not text_content:
-            raise HTTPException(status_code=400, detail="Could not extract text from PDF")
-        
-        # Count pages (approximate based on text length)
-        estimated_pages = max(1, len(text_content) // 2000)  # Rough estimate
-        
-        # Check page limit
-        if estimated_pages > 1000:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Document too large. Maximum 1000 pages allowed. This document has approximately {estimated_pages} pages."
-            )
+        # Stream the file to disk block by block: size limit, PDF magic
+        # bytes and content hash are all checked as the data arrives
+        temp_path = os.path.join(settings.UPLOAD_DIR, f"{doc_id}_{file.filename}")
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
         
-        # Clean and chunk the text
-        cleaned_text = clean_text(text_content)
-        chunks = chunk_text(cleaned_text)
-        
-        if not chunks:
-            raise HTTPException(status_code=400, detail="No text content found in document")
-        
-        # Add chunks to vector database
-        success = add_document_chunks(doc_id, chunks)
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to process document")
-        
-        # Save metadata to database
-        metadata_saved = save_metadata(
-            doc_id=doc_id,
-            filename=file.filename,
-            pages=estimated_pages,
-            chunks=len(chunks),
-            text_length=len(cleaned_text)
+        file_size, content_hash = await save_upload(
+            file, temp_path,
+            max_bytes=settings.MAX_UPLOAD_BYTES,
+            block_size=settings.UPLOAD_BLOCK_SIZE
         )
+
+        # Same bytes already ingested (or being ingested)?
+        existing = await run_io(find_document_by_hash, content_hash)
+        pending = None if existing else await run_io(find_pending_job_by_hash, content_hash)
+        if not force and (existing or pending):
+            return _duplicate_response(content_hash, existing, pending)
+
+        if existing:
+            # Forced re-ingest replaces the document in place
+            doc_id = existing["doc_id"]
+        else:
+            await _check_document_limit()
+            if not force:
+                # Identical bytes uploaded at the same time: only one is ingested
+                holder = await run_io(claim_upload, content_hash, doc_id)
+                if holder:
+                    existing = await run_io(find_document_by_hash, content_hash)
+                    pending = None if existing else await run_io(find_pending_job_by_hash, content_hash)
+                    if existing or pending:
+                        return _duplicate_response(content_hash, existing, pending)
+                    return JSONResponse(status_code=202, content={
+                        "document_id": holder,
+                        "filename": file.filename,
+                        "content_hash": content_hash,
+                        "status": "processing",
+                        "duplicate": True
+                    })
+                claimed = True
+
+        if background:
+            # Hand off to the ingestion workers; the job owns the file now
+            try:
+                job = await run_io(
+                    job_queue.enqueue, doc_id, file.filename, temp_path, content_hash,
+                    chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap
+                )
+            except QueueFullError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            enqueued = True
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "job_id": job["job_id"],
+                    "document_id": doc_id,
+                    "filename": file.filename,
+                    "status": job["status"],
+                    "content_hash": content_hash,
+                    "status_url": f"/upload/jobs/{job['job_id']}"
+                }
+            )
         
-        if not metadata_saved:
-            print(f"Warning: Failed to save metadata for document {doc_id}")
-        
-        # Clean up temporary file
-        os.remove(temp_path)
+        # Extract, clean, chunk, embed and store
+        try:
+            result = await run_cpu(
+                ingest_document, doc_id, temp_path, file.filename,
+                content_hash=content_hash, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap
+            )
+        except IngestError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
         
-        return {
-            "document_id": doc_id,
-            "filename": file.filename,
-            "chunks_created": len(chunks),
-            "text_length": len(cleaned_text),
-            "estimated_pages": estimated_pages,
-            "status": "success"
-        }
+        if existing:
+            result["status"] = "reingested"
+        return {**result, "file_size": file_size, "content_hash": content_hash}
         
     except HTTPException:
         raise
     except Exception as e:
-        # Clean up temp file if it exists
-        if 'temp_path' in locals() and os.path.exists(temp_path):
-            os.remove(temp_path)
-        
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    finally:
+        # Clean up the temporary file, unless a queued job owns it now
+        if temp_path and not enqueued and os.path.exists(temp_path):
+            os.remove(temp_path)
+        # The document row or queued job stands for the content from here on
+        if claimed:
+            await run_io(release_upload, content_hash, doc_id)
+
+@router.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Background ingestion job status: stage, chunk progress, failure reason"""
+    job = await run_io(get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @router.get("/stats")
 async def get_upload_stats():
     """Get statistics about uploaded documents"""
     from ..services.doc_store import get_document_stats
     
-    stats = get_document_stats()
-    vector_stats = get_collection_stats()
+    stats = await run_io(get_document_stats)
+    vector_stats = await run_io(get_collection_stats)
     
     return {
         **stats,
-        "vector_chunks": vector_stats.get("total_chunks", 0)
+        "vector_chunks": vector_stats.get("total_chunks", 0),
+        "ingest_queue_depth": job_queue.depth(),
+        "pending_jobs": await run_io(count_pending_jobs)
     }
@@ -1,19 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 from .config import settings
-from .api import upload, query, metadata
+from .api import upload, query, metadata, index
+from .utils.uploads import UploadSizeLimitMiddleware, MULTIPART_OVERHEAD
+from .services.startup import readiness, start_warm_up
+from .services.metrics import MetricsMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create tables and start ingestion workers (resuming unfinished jobs;
+    re-index jobs whose worker is gone are marked failed), then warm up the
+    embedding model and vector store in the background so the server
+    accepts connections straight away"""
+    from .services.doc_store import init_db
+    from .services.ingest_jobs import job_queue
+    from .services.index_versions import fail_interrupted_builds
+    from .services.executor import run_io
+
+    await run_io(init_db)
+    await run_io(fail_interrupted_builds)
+    await run_io(job_queue.start)
+    if settings.WARMUP_ON_STARTUP:
+        start_warm_up()
+    yield
 
 app = FastAPI(
     title="RAG Pipeline API",
     description="Document upload and intelligent querying system with metadata management",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Cut off oversized upload bodies while they stream in
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_bytes=settings.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+)
+
+# Request latency and in-flight gauge for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include API routers
 app.include_router(upload.router)
 app.include_router(query.router)
 app.include_router(metadata.router)
+app.include_router(index.router)
 
 @app.get("/")
 async def root():
@@ -26,7 +60,12 @@ async def root():
             "/upload - Upload PDF documents",
             "/query - Query documents",
             "/metadata - Document metadata",
-            "/health - Health check"
+            "/index - Index versions, background re-indexing and rollback",
+            "/health - Health check",
+            "/live - Liveness probe",
+            "/ready - Readiness probe (200 once warmed up)",
+            "/health/providers - LLM provider health",
+            "/metrics - Prometheus metrics"
         ]
     }
 
@@ -36,9 +75,10 @@ async def health():
     try:
         from .services.doc_store import get_document_stats
         from .services.vector_store import get_collection_stats
+        from .services.executor import run_io
         
-        doc_stats = get_document_stats()
-        vector_stats = get_collection_stats()
+        doc_stats = await run_io(get_document_stats)
+        vector_stats = await run_io(get_collection_stats)
         
         return {
             "status": "healthy",
@@ -59,6 +99,37 @@ async def health():
             "error": str(e)
         }
 
+@app.get("/live")
+async def live():
+    """Liveness probe: the process is up and serving"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the database, vector store and embedding
+    model are initialized"""
+    state = readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+@app.get("/health/providers")
+async def providers_health():
+    """LLM provider circuit breaker state and rolling latency/error stats"""
+    from .services.llm_providers import provider_health
+    return provider_health()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus exposition: per-stage latency histograms, provider
+    failures/fallbacks, collection size and in-flight requests"""
+    if not settings.METRICS_ENABLED:
+        return JSONResponse(status_code=404, content={"detail": "Metrics are disabled"})
+    from .services.metrics import render
+    from .services.executor import run_io
+
+    # Gauges read the stores at scrape time
+    body, content_type = await run_io(render)
+    return Response(content=body, media_type=content_type)
+
 @app.get("/config-test")
 async def config_test():
     """Test configuration and API keys"""
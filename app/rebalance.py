@@ -0,0 +1,21 @@
+"""Split the vector store into another number of shards.
+
+    python -m app.rebalance --shards 8
+
+Every chunk is copied into the new shards, then the store switches to them
+and the old ones are deleted. Stop the API (and ingestion) first: chunks
+written meanwhile would stay behind in the old shards. Set VECTOR_SHARDS to
+the new count afterwards; it only decides the count of a new store.
+"""
+import json
+import argparse
+from .services.vector_store import rebalance_shards
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, required=True, help="new shard count")
+    args = parser.parse_args(argv)
+    print(json.dumps(rebalance_shards(args.shards), indent=2))
+
+if __name__ == "__main__":
+    main()
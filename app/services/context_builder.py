@@ -0,0 +1,168 @@
+"""Context assembly between retrieval and generation.
+
+Retrieved chunks overlap (consecutive chunks of a document share text) and
+often repeat each other, so joining them as-is wastes prompt tokens. The
+builder merges adjacent chunks of the same document, picks a diverse subset
+with maximal marginal relevance (MMR) over the embeddings retrieval already
+computed, and packs the result into each provider's token budget.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+import numpy as np
+from ..utils.text_processing import approx_token_count
+
+@dataclass
+class Passage:
+    """One or more consecutive chunks of a document, merged"""
+    document_id: Optional[str]
+    chunk_ids: list
+    text: str
+    rank: int  # best retrieval rank among the merged chunks
+    embeddings: list = field(default_factory=list)
+    last_index: Optional[int] = None
+    last_end: Optional[int] = None
+
+    @property
+    def embedding(self) -> Optional[np.ndarray]:
+        if not self.embeddings or any(e is None for e in self.embeddings):
+            return None
+        vector = np.mean(np.asarray(self.embeddings, dtype=np.float32), axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+def _word_overlap(left: str, right: str, max_words: int = 400) -> int:
+    """Number of leading words of right that repeat the trailing words of left"""
+    left_words = left.split()[-max_words:]
+    right_words = right.split()[:max_words]
+    for size in range(min(len(left_words), len(right_words)), 0, -1):
+        if left_words[-size:] == right_words[:size]:
+            return size
+    return 0
+
+def _append(passage: Passage, text: str, metadata: dict):
+    """Append the next chunk's text to a passage without the repeated part"""
+    start, end = metadata.get("start_char"), metadata.get("end_char")
+    overlap = passage.last_end - start if passage.last_end is not None and start is not None else None
+    if overlap is not None and 0 < overlap < len(text) and passage.text.endswith(text[:overlap]):
+        # Character offsets into the document say exactly how much is shared
+        text = text[overlap:].lstrip()
+    elif overlap is None or overlap > 0:
+        words = _word_overlap(passage.text, text)
+        text = " ".join(text.split()[words:])
+    if text:
+        passage.text = f"{passage.text} {text}"
+    passage.last_end = end
+
+def merge_adjacent(hits: list[dict]) -> list[Passage]:
+    """Merge hits that are consecutive chunks (by chunk_index) of the same
+    document into passages, ordered by their best retrieval rank"""
+    ranked = []
+    for rank, hit in enumerate(hits):
+        metadata = hit.get("metadata") or {}
+        ranked.append((metadata.get("document_id"), metadata.get("chunk_index"), rank, hit))
+
+    # Walk each document's hits in chunk order; hits without a position stay alone
+    ranked.sort(key=lambda r: (r[0] is None, str(r[0]), r[1] is None, r[1] or 0, r[2]))
+    passages = []
+    current = None
+    for document_id, chunk_index, rank, hit in ranked:
+        metadata = hit.get("metadata") or {}
+        adjacent = (
+            current is not None and document_id is not None and chunk_index is not None
+            and current.document_id == document_id and current.last_index == chunk_index - 1
+        )
+        if adjacent:
+            _append(current, hit["text"], metadata)
+            current.chunk_ids.append(hit["id"])
+            current.embeddings.append(hit.get("embedding"))
+            current.rank = min(current.rank, rank)
+            current.last_index = chunk_index
+            continue
+        current = Passage(
+            document_id=document_id,
+            chunk_ids=[hit["id"]],
+            text=hit["text"],
+            rank=rank,
+            embeddings=[hit.get("embedding")],
+            last_index=chunk_index,
+            last_end=metadata.get("end_char")
+        )
+        passages.append(current)
+    passages.sort(key=lambda p: p.rank)
+    return passages
+
+def select_mmr(passages: list[Passage], query_embedding: Optional[list[float]],
+               lambda_: float = 0.7, duplicate_threshold: float = 0.95) -> list[Passage]:
+    """Order passages by maximal marginal relevance: each pick maximises
+    lambda * sim(query) - (1 - lambda) * max sim(already picked). Passages
+    at least duplicate_threshold similar to a picked one are dropped. Without
+    embeddings the retrieval order is kept."""
+    vectors = [p.embedding for p in passages]
+    if query_embedding is None or len(passages) < 2 or any(v is None for v in vectors):
+        return list(passages)
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    matrix = np.vstack(vectors)
+    relevance = matrix @ (query / query_norm if query_norm else query)
+    similarity = matrix @ matrix.T
+
+    remaining = list(range(len(passages)))
+    selected = []
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_ * relevance[remaining] - (1 - lambda_) * redundancy
+        best = remaining.pop(int(np.argmax(scores)))
+        if selected and similarity[best, selected].max() >= duplicate_threshold:
+            continue
+        selected.append(best)
+    return [passages[i] for i in selected]
+
+def _truncate(text: str, budget: int, count_tokens: Callable[[str], int]) -> str:
+    """Longest word prefix of text within the token budget"""
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+def pack_context(passages: list[Passage], budget: int,
+                 count_tokens: Callable[[str], int] = approx_token_count) -> tuple[str, int]:
+    """Greedily fit passages (in order) into a token budget: (context, tokens).
+    Passages that do not fit are skipped so later, shorter ones can still be
+    used; if none fits, the first one is truncated."""
+    parts, used = [], 0
+    for passage in passages:
+        tokens = count_tokens(passage.text)
+        if used + tokens <= budget:
+            parts.append(passage.text)
+            used += tokens
+    if not parts and passages:
+        text = _truncate(passages[0].text, budget, count_tokens)
+        if text:
+            parts, used = [text], count_tokens(text)
+    return "\n\n".join(parts), used
+
+class ContextBuilder:
+    """Merged, diversity-ordered passages for one query's retrieved hits,
+    packed on demand per token budget"""
+    def __init__(self, hits: list[dict], query_embedding: Optional[list[float]] = None,
+                 lambda_: float = 0.7, duplicate_threshold: float = 0.95,
+                 count_tokens: Callable[[str], int] = approx_token_count):
+        self.count_tokens = count_tokens
+        # What joining every retrieved chunk would have sent
+        self.tokens_retrieved = sum(count_tokens(hit["text"]) for hit in hits)
+        self.passages = select_mmr(merge_adjacent(hits), query_embedding, lambda_, duplicate_threshold)
+        self._packed = {}
+
+    def pack(self, budget: int) -> tuple[str, int]:
+        if budget not in self._packed:
+            self._packed[budget] = pack_context(self.passages, budget, self.count_tokens)
+        return self._packed[budget]
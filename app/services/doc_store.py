@@ -1,17 +1,77 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime
+from sqlalchemy import (create_engine, event, Column, String, Integer, BigInteger, DateTime, Index,
+                        LargeBinary, func, insert, inspect, text, update, and_, or_)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, sessionmaker
 from datetime import datetime
+from typing import Optional
 import os
+import json
+import time
+import zlib
+import base64
+import threading
+from ..config import settings
+from ..utils.processes import owner_gone, process_owner
+from .semantic_cache import bump_corpus_version
+from .startup import timed_init
+from . import metrics
 
 # Database configuration
-DB_URL = "sqlite:///./data/metadata.db"
-DOC_LIMIT = 20
+DB_URL = settings.DATABASE_URL
+DOC_LIMIT = settings.DOCUMENT_QUOTA
+
+# Applied to every new SQLite connection. WAL lets readers run alongside
+# the single writer; synchronous=NORMAL is durable in WAL mode except for
+# the last transactions on power loss (not on a crash of the app)
+SQLITE_PRAGMAS = [
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "busy_timeout=5000",     # wait for the write lock instead of failing
+    "cache_size=-32000",     # 32 MB page cache
+    "temp_store=MEMORY",
+    "mmap_size=268435456",   # 256 MB memory-mapped reads
+]
+
+def _create_engine(url: str):
+    """SQLite with tuned pragmas, or a pooled engine for server databases"""
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(f"PRAGMA {pragma}")
+            cursor.close()
+
+        return engine
+    return create_engine(
+        url,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=True
+    )
 
 # SQLAlchemy setup
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+engine = _create_engine(DB_URL)
+
+@event.listens_for(engine, "before_cursor_execute")
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info["statement_start"] = time.perf_counter()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    metrics.record_db(statement, time.perf_counter() - conn.info.pop("statement_start", time.perf_counter()))
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Columns added to tables after they were first released: table -> {name: DDL type}
+_added_columns = {}
+_initialized_tables = set()
+_init_lock = threading.Lock()
+
 class DocumentMetadata(Base):
     __tablename__ = "documents"
     
@@ -21,30 +81,175 @@ class DocumentMetadata(Base):
     chunks = Column(Integer, nullable=False)
     text_length = Column(Integer, nullable=False)
     upload_time = Column(DateTime, default=datetime.utcnow)
+    content_hash = Column(String, nullable=True, index=True)  # sha256 of the PDF bytes
+
+    # Keyset pagination: sort column + doc_id tie-breaker
+    __table_args__ = (
+        Index("ix_documents_upload_time_doc_id", "upload_time", "doc_id"),
+        Index("ix_documents_filename_doc_id", "filename", "doc_id"),
+    )
+
+class DocumentCounters(Base):
+    """Running corpus totals in a single row (id 1), updated in the same
+    transaction as every insert, replace and delete of a document, so stats
+    never scan the documents table"""
+    __tablename__ = "document_counters"
+
+    id = Column(Integer, primary_key=True)
+    documents = Column(BigInteger, nullable=False, default=0)
+    pages = Column(BigInteger, nullable=False, default=0)
+    chunks = Column(BigInteger, nullable=False, default=0)
+    text_length = Column(BigInteger, nullable=False, default=0)
+
+class DocumentText(Base):
+    """Cleaned page texts of a document (paragraph breaks kept, as the
+    chunker reads them), zlib-compressed, so the corpus can be re-chunked
+    and re-embedded without the PDFs"""
+    __tablename__ = "document_texts"
+
+    doc_id = Column(String, primary_key=True)
+    pages = Column(Integer, nullable=False)
+    text_length = Column(Integer, nullable=False)  # characters before compression
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class UploadClaim(Base):
+    """Content hash of an upload being processed, held until its document
+    row or queued job exists; the primary key lets only one of several
+    identical uploads arriving together go ahead"""
+    __tablename__ = "upload_claims"
+
+    content_hash = Column(String, primary_key=True)
+    doc_id = Column(String, nullable=False)
+    owner = Column(String, nullable=False)  # "host:pid" of the process handling the upload
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Between pages in the stored text; cleaning collapses every whitespace
+# character, so it never occurs inside a page
+PAGE_SEPARATOR = "\f"
+TEXT_COMPRESSION_LEVEL = 6
+
+def register_added_columns(table: str, columns: dict):
+    """Declare columns init_db() must add to existing tables
+    (create_all never alters existing tables)"""
+    _added_columns.setdefault(table, {}).update(columns)
+
+def ensure_columns(table: str, columns: dict):
+    """Add any of the given columns missing from an existing table"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table)}
+    with engine.begin() as conn:
+        for name, ddl in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{name} ON {table} ({name})"))
+
+register_added_columns("documents", {"content_hash": "VARCHAR"})
+
+def _create_tables():
+    if engine.url.get_backend_name() == "sqlite" and engine.url.database:
+        os.makedirs(os.path.dirname(os.path.abspath(engine.url.database)), exist_ok=True)
+    # Create tables
+    Base.metadata.create_all(bind=engine)
+    for table, columns in _added_columns.items():
+        ensure_columns(table, columns)
+    # create_all skips indexes of tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # Counters row, backfilled from existing documents on first start
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO document_counters (id, documents, pages, chunks, text_length) "
+            "SELECT 1, COUNT(*), COALESCE(SUM(pages), 0), COALESCE(SUM(chunks), 0), "
+            "COALESCE(SUM(text_length), 0) FROM documents "
+            "WHERE NOT EXISTS (SELECT 1 FROM document_counters WHERE id = 1)"
+        ))
+
+def init_db():
+    """Create tables (and add new columns) for every registered model.
+    Runs at startup or on first use; cheap no-op once done."""
+    if _initialized_tables.issuperset(Base.metadata.tables):
+        return
+    with _init_lock:
+        tables = set(Base.metadata.tables)
+        if not _initialized_tables.issuperset(tables):
+            timed_init("database", _create_tables)
+            _initialized_tables.update(tables)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+def get_session():
+    """New database session (tables are created on first use)"""
+    init_db()
+    return SessionLocal()
+
+def _doc_to_dict(doc: DocumentMetadata) -> dict:
+    return {
+        "doc_id": doc.doc_id,
+        "filename": doc.filename,
+        "pages": doc.pages,
+        "chunks": doc.chunks,
+        "text_length": doc.text_length,
+        "upload_time": doc.upload_time.isoformat(),
+        "content_hash": doc.content_hash
+    }
 
 def get_db():
     """Get database session"""
-    db = SessionLocal()
+    db = get_session()
     try:
         yield db
     finally:
         db.close()
 
-def save_metadata(doc_id: str, filename: str, pages: int, chunks: int, text_length: int):
-    """Save document metadata to database"""
-    db = SessionLocal()
+def _bump_counters(db, documents: int = 0, pages: int = 0, chunks: int = 0, text_length: int = 0):
+    """Add deltas to the counters row within the caller's transaction
+    (x = x + delta, so concurrent writers cannot lose updates)"""
+    db.execute(
+        update(DocumentCounters)
+        .where(DocumentCounters.id == 1)
+        .values(
+            documents=DocumentCounters.documents + documents,
+            pages=DocumentCounters.pages + pages,
+            chunks=DocumentCounters.chunks + chunks,
+            text_length=DocumentCounters.text_length + text_length
+        )
+    )
+
+def save_metadata(doc_id: str, filename: str, pages: int, chunks: int, text_length: int,
+                  content_hash: Optional[str] = None, page_texts: Optional[list] = None):
+    """Save document metadata to database (replaces the row on re-ingest),
+    with the cleaned page_texts when given"""
+    db = get_session()
     try:
-        doc_meta = DocumentMetadata(
-            doc_id=doc_id,
-            filename=filename,
-            pages=pages,
-            chunks=chunks,
-            text_length=text_length
+        # Row lock (server databases) so a concurrent replace or delete of
+        # the same document cannot count it twice
+        doc_meta = (
+            db.query(DocumentMetadata)
+            .filter(DocumentMetadata.doc_id == doc_id)
+            .with_for_update()
+            .first()
         )
-        db.add(doc_meta)
+        if doc_meta:
+            _bump_counters(db, 0, pages - doc_meta.pages, chunks - doc_meta.chunks,
+                           text_length - doc_meta.text_length)
+        else:
+            doc_meta = DocumentMetadata(doc_id=doc_id)
+            db.add(doc_meta)
+            _bump_counters(db, 1, pages, chunks, text_length)
+        doc_meta.filename = filename
+        doc_meta.pages = pages
+        doc_meta.chunks = chunks
+        doc_meta.text_length = text_length
+        doc_meta.upload_time = datetime.utcnow()
+        doc_meta.content_hash = content_hash
+        if page_texts is not None:
+            joined = PAGE_SEPARATOR.join(page_texts)
+            db.merge(DocumentText(
+                doc_id=doc_id,
+                pages=len(page_texts),
+                text_length=len(joined),
+                data=zlib.compress(joined.encode("utf-8"), TEXT_COMPRESSION_LEVEL),
+                updated_at=datetime.utcnow()
+            ))
         db.commit()
         return True
     except Exception as e:
@@ -54,70 +259,299 @@ def save_metadata(doc_id: str, filename: str, pages: int, chunks: int, text_leng
     finally:
         db.close()
 
+def load_document_text(doc_id: str) -> Optional[list]:
+    """Cleaned page texts kept for a document (None for documents ingested
+    before texts were kept)"""
+    db = get_session()
+    try:
+        row = db.get(DocumentText, doc_id)
+        if row is None:
+            return None
+        return zlib.decompress(row.data).decode("utf-8").split(PAGE_SEPARATOR)
+    finally:
+        db.close()
+
+def document_text_times() -> dict:
+    """{doc_id: when its kept text was last saved} for every document (None
+    for documents without a kept text)"""
+    db = get_session()
+    try:
+        rows = (
+            db.query(DocumentMetadata.doc_id, DocumentText.updated_at)
+            .outerjoin(DocumentText, DocumentText.doc_id == DocumentMetadata.doc_id)
+            .all()
+        )
+        return {doc_id: updated_at for doc_id, updated_at in rows}
+    finally:
+        db.close()
+
+def get_document_text_stats() -> dict:
+    """Documents with a kept text and its size before/after compression"""
+    db = get_session()
+    try:
+        documents, characters, stored = db.query(
+            func.count(DocumentText.doc_id), func.sum(DocumentText.text_length),
+            func.sum(func.length(DocumentText.data))
+        ).one()
+        return {"documents": documents, "text_length": characters or 0, "compressed_bytes": stored or 0}
+    finally:
+        db.close()
+
+def set_chunk_counts(counts: dict):
+    """Record new chunk counts {doc_id: chunks} (after a re-index)"""
+    db = get_session()
+    try:
+        rows = (
+            db.query(DocumentMetadata)
+            .filter(DocumentMetadata.doc_id.in_(list(counts)))
+            .with_for_update()
+            .all()
+        )
+        delta = 0
+        for row in rows:
+            delta += counts[row.doc_id] - row.chunks
+            row.chunks = counts[row.doc_id]
+        _bump_counters(db, chunks=delta)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
 def count_documents() -> int:
     """Count total documents in database"""
-    db = SessionLocal()
+    db = get_session()
     try:
-        return db.query(DocumentMetadata).count()
+        return db.get(DocumentCounters, 1).documents
     except Exception:
         return 0
     finally:
         db.close()
 
 def list_documents() -> list:
-    """List all documents with metadata"""
-    db = SessionLocal()
+    """List all documents with metadata (every row; the API pages through
+    list_documents_page instead)"""
+    db = get_session()
     try:
         docs = db.query(DocumentMetadata).all()
-        return [
-            {
-                "doc_id": doc.doc_id,
-                "filename": doc.filename,
-                "pages": doc.pages,
-                "chunks": doc.chunks,
-                "text_length": doc.text_length,
-                "upload_time": doc.upload_time.isoformat()
-            }
-            for doc in docs
-        ]
+        return [_doc_to_dict(doc) for doc in docs]
     except Exception as e:
         print(f"Error listing documents: {e}")
         return []
     finally:
         db.close()
 
+# GET /metadata sort keys
+SORT_COLUMNS = {
+    "upload_time": DocumentMetadata.upload_time,
+    "filename": DocumentMetadata.filename,
+    "pages": DocumentMetadata.pages,
+    "chunks": DocumentMetadata.chunks,
+    "text_length": DocumentMetadata.text_length,
+    "doc_id": DocumentMetadata.doc_id,
+}
+
+def _encode_cursor(doc: DocumentMetadata, sort: str) -> str:
+    value = getattr(doc, sort)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, doc.doc_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    """(sort value, doc_id) of the last row of the previous page"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, doc_id = json.loads(raw)
+        if sort == "upload_time":
+            value = datetime.fromisoformat(value)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError("Cursor was issued for a different sort")
+    return value, doc_id
+
+def list_documents_page(limit: int = 100, cursor: Optional[str] = None,
+                        sort: str = "upload_time", descending: bool = True) -> dict:
+    """One page of documents: {"documents", "next_cursor"}. Keyset
+    pagination on (sort column, doc_id): each page costs an index range
+    scan however deep it is, and rows added or deleted between pages do
+    not shift later pages. next_cursor is None on the last page."""
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort field: {sort}")
+    column = SORT_COLUMNS[sort]
+    key = DocumentMetadata.doc_id
+    db = get_session()
+    try:
+        query = db.query(DocumentMetadata)
+        if cursor:
+            value, doc_id = _decode_cursor(cursor, sort)
+            if sort == "doc_id":
+                query = query.filter(key < doc_id if descending else key > doc_id)
+            # The outer bound gives the planner an index range to seek to
+            elif descending:
+                query = query.filter(and_(column <= value, or_(column < value, key < doc_id)))
+            else:
+                query = query.filter(and_(column >= value, or_(column > value, key > doc_id)))
+        if descending:
+            query = query.order_by(column.desc(), key.desc())
+        else:
+            query = query.order_by(column.asc(), key.asc())
+        docs = query.limit(limit + 1).all()
+        next_cursor = _encode_cursor(docs[limit - 1], sort) if len(docs) > limit else None
+        return {
+            "documents": [_doc_to_dict(doc) for doc in docs[:limit]],
+            "next_cursor": next_cursor
+        }
+    finally:
+        db.close()
+
+def find_document_by_hash(content_hash: str) -> Optional[dict]:
+    """Find an already ingested document with identical content"""
+    db = get_session()
+    try:
+        doc = (
+            db.query(DocumentMetadata)
+            .filter(DocumentMetadata.content_hash == content_hash)
+            .order_by(DocumentMetadata.upload_time.desc())
+            .first()
+        )
+        return _doc_to_dict(doc) if doc else None
+    finally:
+        db.close()
+
+def claim_upload(content_hash: str, doc_id: str) -> Optional[str]:
+    """Claim identical content for doc_id: None when claimed, else the
+    doc_id of the upload already holding the claim"""
+    db = get_session()
+    try:
+        while True:
+            try:
+                db.execute(insert(UploadClaim).values(content_hash=content_hash, doc_id=doc_id,
+                                                      owner=process_owner(), created_at=datetime.utcnow()))
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+            held = db.query(UploadClaim).filter(UploadClaim.content_hash == content_hash).first()
+            if held is None:
+                continue
+            if not owner_gone(held.owner):
+                return held.doc_id
+            # Left behind by a process that died mid-upload
+            db.query(UploadClaim).filter(
+                UploadClaim.content_hash == content_hash, UploadClaim.owner == held.owner
+            ).delete(synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+
+def release_upload(content_hash: str, doc_id: str):
+    """Drop doc_id's claim on the content (once its document or job exists, or it failed)"""
+    db = get_session()
+    try:
+        db.query(UploadClaim).filter(
+            UploadClaim.content_hash == content_hash, UploadClaim.doc_id == doc_id
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def _glob_to_like(pattern: str) -> str:
+    """Filename glob (* and ?) to a SQL LIKE pattern with \\ as escape"""
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%").replace("?", "_")
+
+def find_document_ids(doc_ids: Optional[list] = None, filename_pattern: Optional[str] = None,
+                      uploaded_after: Optional[datetime] = None,
+                      uploaded_before: Optional[datetime] = None) -> list:
+    """Ids of documents matching every given filter (filename_pattern is a
+    case-insensitive glob, upload times are UTC and inclusive)"""
+    db = get_session()
+    try:
+        query = db.query(DocumentMetadata.doc_id)
+        if doc_ids is not None:
+            query = query.filter(DocumentMetadata.doc_id.in_(doc_ids))
+        if filename_pattern:
+            query = query.filter(DocumentMetadata.filename.ilike(_glob_to_like(filename_pattern), escape="\\"))
+        if uploaded_after is not None:
+            query = query.filter(DocumentMetadata.upload_time >= uploaded_after)
+        if uploaded_before is not None:
+            query = query.filter(DocumentMetadata.upload_time <= uploaded_before)
+        return [row.doc_id for row in query.all()]
+    finally:
+        db.close()
+
 def delete_document(doc_id: str) -> bool:
     """Delete document metadata"""
-    db = SessionLocal()
+    db = get_session()
     try:
-        doc = db.query(DocumentMetadata).filter(DocumentMetadata.doc_id == doc_id).first()
+        doc = db.query(DocumentMetadata).filter(DocumentMetadata.doc_id == doc_id).with_for_update().first()
         if doc:
+            _bump_counters(db, -1, -doc.pages, -doc.chunks, -doc.text_length)
+            db.query(DocumentText).filter(DocumentText.doc_id == doc_id).delete(synchronize_session=False)
             db.delete(doc)
             db.commit()
+            bump_corpus_version()
             return True
         return False
     except Exception as e:
+        db.rollback()
         print(f"Error deleting document: {e}")
         return False
     finally:
         db.close()
 
+def delete_documents(doc_ids: list, batch_size: int = 500) -> list:
+    """Delete the metadata of several documents in one transaction; returns
+    the ids that had a row"""
+    db = get_session()
+    try:
+        deleted = []
+        for start in range(0, len(doc_ids), batch_size):
+            batch = doc_ids[start:start + batch_size]
+            rows = (
+                db.query(DocumentMetadata.doc_id, DocumentMetadata.pages,
+                         DocumentMetadata.chunks, DocumentMetadata.text_length)
+                .filter(DocumentMetadata.doc_id.in_(batch))
+                .with_for_update()
+                .all()
+            )
+            if rows:
+                found = [row.doc_id for row in rows]
+                db.query(DocumentMetadata).filter(DocumentMetadata.doc_id.in_(found)).delete(synchronize_session=False)
+                db.query(DocumentText).filter(DocumentText.doc_id.in_(found)).delete(synchronize_session=False)
+                _bump_counters(db, -len(rows), -sum(row.pages for row in rows),
+                               -sum(row.chunks for row in rows), -sum(row.text_length for row in rows))
+                deleted.extend(found)
+        db.commit()
+        if deleted:
+            bump_corpus_version()
+        return deleted
+    except Exception as e:
+        db.rollback()
+        print(f"Error deleting documents: {e}")
+        raise
+    finally:
+        db.close()
+
 def get_document_stats():
-    """Get document statistics"""
-    db = SessionLocal()
+    """Get document statistics (from the counters row, O(1))"""
+    db = get_session()
     try:
-        total_docs = db.query(DocumentMetadata).count()
-        total_pages = db.query(db.func.sum(DocumentMetadata.pages)).scalar() or 0
-        total_chunks = db.query(db.func.sum(DocumentMetadata.chunks)).scalar() or 0
-        
+        counters = db.get(DocumentCounters, 1)
         return {
-            "total_documents": total_docs,
-            "total_pages": total_pages,
-            "total_chunks": total_chunks,
-            "documents_remaining": DOC_LIMIT - total_docs
+            "total_documents": counters.documents,
+            "total_pages": counters.pages,
+            "total_chunks": counters.chunks,
+            "total_text_length": counters.text_length,
+            "documents_remaining": DOC_LIMIT - counters.documents
         }
     except Exception as e:
         print(f"Error getting stats: {e}")
         return {"error": str(e)}
     finally:
         db.close()
+
+metrics.gauge_from(metrics.DOCUMENTS, lambda: get_document_stats()["total_documents"])
@@ -0,0 +1,129 @@
+import os
+import re
+import hashlib
+from typing import List
+import numpy as np
+from ..utils.text_processing import approx_token_count
+
+class Embedder:
+    """Turns text into fixed-size vectors. model_id and dimension are stored
+    with the vector collection so vectors from different models never mix.
+    max_tokens is how many text tokens fit the model window (special tokens
+    excluded); count_tokens measures text the way the model will see it."""
+    model_id: str
+    dimension: int
+    max_tokens: int = 254
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        return approx_token_count(text)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        return [self.count_tokens(text) for text in texts]
+
+class SentenceTransformerEmbedder(Embedder):
+    """sentence-transformers model (downloaded from the HF hub on first use)"""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.model_id = f"sentence-transformers/{model_name}"
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        # [CLS] and [SEP] take two positions of the window
+        self.max_tokens = self.model.max_seq_length - 2
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(texts).tolist()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.model.tokenizer.tokenize(text))
+
+class OnnxEmbedder(Embedder):
+    """Sentence-transformers style model exported to ONNX (e.g. int8-quantized)
+    run with onnxruntime on CPU: no torch, smaller and faster on GPU-less nodes.
+    Expects tokenizer.json next to the .onnx file; mean pooling + L2 normalize."""
+
+    def __init__(self, model_path: str, max_length: int = 256):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"ONNX model not found: {model_path}")
+        model_dir = os.path.dirname(os.path.abspath(model_path))
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        # Untruncated copy for counting
+        self.counter = Tokenizer.from_str(self.tokenizer.to_str())
+        self.counter.no_truncation()
+        self.counter.no_padding()
+        self.max_tokens = max_length - 2
+
+        self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.model_id = f"onnx/{os.path.basename(model_dir)}/{os.path.basename(model_path)}"
+
+        dimension = self.session.get_outputs()[0].shape[-1]
+        if not isinstance(dimension, int):
+            # Symbolic output shape: find out from a real run
+            dimension = len(self.encode(["dimension probe"])[0])
+        self.dimension = dimension
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]
+        # Mean pooling over real (non-padding) tokens
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return _normalize(pooled).tolist()
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.counter.encode(text, add_special_tokens=False).ids)
+
+TOKEN_RE = re.compile(r"\w+")
+
+class HashingEmbedder(Embedder):
+    """Deterministic feature-hashing embedder (signed token counts, L2
+    normalized). No model, no download: for tests and benchmarks. Texts
+    sharing words get similar vectors, so retrieval still behaves sensibly."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.model_id = f"hashing-{dimension}"
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in TOKEN_RE.findall(text.lower()):
+                h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+                vectors[row, h % self.dimension] += 1.0 if h >> 63 else -1.0
+        return _normalize(vectors).tolist()
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+EMBEDDER_BACKENDS = ["sentence-transformers", "onnx", "hashing"]
+
+def create_embedder(settings) -> Embedder:
+    """Build the embedder selected by EMBEDDER_BACKEND"""
+    backend = settings.EMBEDDER_BACKEND
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbedder(settings.EMBEDDER_MODEL)
+    if backend == "onnx":
+        if not settings.EMBEDDER_MODEL_PATH:
+            raise ValueError("EMBEDDER_BACKEND=onnx requires EMBEDDER_MODEL_PATH")
+        return OnnxEmbedder(settings.EMBEDDER_MODEL_PATH)
+    if backend == "hashing":
+        return HashingEmbedder(settings.EMBEDDER_DIMENSION)
+    raise ValueError(f"Unknown EMBEDDER_BACKEND {backend!r}, expected one of {EMBEDDER_BACKENDS}")
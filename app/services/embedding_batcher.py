@@ -0,0 +1,80 @@
+import asyncio
+from typing import Callable, Optional
+from .executor import run_cpu
+
+class EmbeddingBatcher:
+    """Coalesce concurrent single-text encode requests into batched calls.
+
+    Requests are collected until max_batch_size texts are waiting or
+    max_wait_ms has passed since the first one arrived, then encoded in one
+    call on the CPU pool; each caller gets back its own vector. When no
+    batch is running the wait is skipped (only same-tick arrivals are
+    grouped), so a lone request pays no batching latency."""
+
+    def __init__(self, encode_batch: Callable[[list[str]], list], max_batch_size: int, max_wait_ms: float):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []  # (text, future)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = 0
+        self._tasks = set()  # the loop only keeps weak references to tasks
+        self.batches = 0
+        self.items = 0
+
+    async def encode(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Pending work belongs to the loop it was queued on
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+            self._running = 0
+            self._tasks = set()
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            delay = self.max_wait if self._running else 0
+            self._timer = loop.call_later(delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list):
+        self.batches += 1
+        self.items += len(batch)
+        self._running += 1
+        try:
+            vectors = await run_cpu(self.encode_batch, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._running -= 1
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
@@ -0,0 +1,26 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from ..config import settings
+
+# Bounded pools so blocking work never runs on the event loop.
+# CPU-bound stages (embedding, PDF parsing, chunking) and blocking I/O
+# (SQLite, ChromaDB, file writes) get separate pools so a burst of slow
+# queries can't starve cheap calls like /health.
+# Calls run in a copy of the caller's context (like asyncio.to_thread), so
+# per-request state such as the timing breakdown follows the work.
+cpu_pool = ThreadPoolExecutor(max_workers=settings.CPU_POOL_SIZE, thread_name_prefix="rag-cpu")
+io_pool = ThreadPoolExecutor(max_workers=settings.IO_POOL_SIZE, thread_name_prefix="rag-io")
+
+async def run_cpu(func, *args, **kwargs):
+    """Run a CPU-bound callable on the CPU pool"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(cpu_pool, partial(context.run, func, *args, **kwargs))
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking I/O callable on the I/O pool"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(io_pool, partial(context.run, func, *args, **kwargs))
@@ -0,0 +1,422 @@
+"""Versioned indexes: a background job rebuilds the vector store and the
+lexical index from the kept document texts, with new chunking or embedding
+settings, as a new version beside the active one. Queries switch to it in
+one step once it is complete; earlier versions stay on disk for rollback
+until deleted.
+
+Version 1 is the index at the configured paths; version N lives at the
+same paths with a "-vN" suffix.
+"""
+import json
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from ..config import settings
+from ..utils.processes import owner_gone, process_owner
+from ..utils.text_processing import chunk_document
+from .doc_store import (Base, get_session, load_document_text, document_text_times, register_added_columns,
+                        set_chunk_counts)
+from .ingest import EMBED_BATCH_SIZE, chunk_budget
+from .lexical_index import LexicalIndex
+from .vector_store import (IndexSnapshot, activate_index, create_index_embedder, default_index_config,
+                           document_filter, embed_chunks, index_snapshot, index_writes, indexed_documents,
+                           open_local_collection, remove_chunks, store_chunks)
+
+# Version states
+BUILDING = "building"
+READY = "ready"          # built, not switched to yet
+ACTIVATING = "activating"  # catching up before queries switch to it
+ACTIVE = "active"
+RETIRED = "retired"      # switched away from; kept for rollback
+FAILED = "failed"
+CANCELLED = "cancelled"
+DELETED = "deleted"      # data removed (the row keeps the number taken)
+
+# What a re-index may change; the rest of a version's config is where it lives
+REINDEX_OPTIONS = ["embedder_backend", "embedder_model", "embedder_model_path", "embedder_dimension",
+                   "chunk_max_tokens", "chunk_overlap_tokens"]
+
+# Catch-up passes over documents added, deleted or re-ingested while a
+# version was built, before the last one that runs with ingestion held off
+SYNC_PASSES = 3
+
+class IndexVersion(Base):
+    """One build of the vector store and lexical index"""
+    __tablename__ = "index_versions"
+
+    version = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False, index=True)
+    config = Column(Text, nullable=False)  # JSON: paths, embedder and chunking
+    documents_total = Column(Integer, default=0)
+    documents_done = Column(Integer, default=0)
+    documents_copied = Column(Integer, default=0)  # no kept text: chunks re-embedded as they were
+    chunks = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    activated_at = Column(DateTime, nullable=True)
+    retired_at = Column(DateTime, nullable=True)
+    owner = Column(String, nullable=True)  # "host:pid" of the process running its build or activation
+
+register_added_columns("index_versions", {"owner": "VARCHAR"})
+
+class IndexVersionError(Exception):
+    """Request conflicts with the versions' state; carries the HTTP status to report"""
+    def __init__(self, detail: str, status_code: int = 409):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+class _Cancelled(Exception):
+    pass
+
+_job_lock = threading.Lock()
+_activate_lock = threading.Lock()
+
+def _version_to_dict(row: IndexVersion) -> dict:
+    return {
+        "version": row.version,
+        "status": row.status,
+        "config": json.loads(row.config),
+        "documents_total": row.documents_total,
+        "documents_done": row.documents_done,
+        "progress": round(row.documents_done / row.documents_total, 4) if row.documents_total else None,
+        "documents_copied": row.documents_copied,
+        "chunks": row.chunks,
+        "error": row.error,
+        "created_at": row.created_at.isoformat(),
+        "updated_at": row.updated_at.isoformat(),
+        "activated_at": row.activated_at.isoformat() if row.activated_at else None,
+        "retired_at": row.retired_at.isoformat() if row.retired_at else None
+    }
+
+def _ensure_versions(db):
+    # The index at the configured paths is version 1 until the first re-index
+    if db.query(IndexVersion).first() is None:
+        db.add(IndexVersion(version=1, status=ACTIVE, config=json.dumps(default_index_config()),
+                            activated_at=datetime.utcnow()))
+        db.commit()
+
+def _update_version(version: int, **fields):
+    db = get_session()
+    try:
+        row = db.get(IndexVersion, version)
+        if row:
+            for name, value in fields.items():
+                setattr(row, name, value)
+            row.updated_at = datetime.utcnow()
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error updating index version {version}: {e}")
+    finally:
+        db.close()
+
+def _load_version(version: int) -> IndexVersion:
+    db = get_session()
+    try:
+        _ensure_versions(db)
+        row = db.get(IndexVersion, version)
+        if row is None or row.status == DELETED:
+            raise IndexVersionError(f"Index version {version} not found", status_code=404)
+        db.expunge(row)
+        return row
+    finally:
+        db.close()
+
+def list_versions() -> list:
+    """Every index version, newest first"""
+    db = get_session()
+    try:
+        _ensure_versions(db)
+        rows = (
+            db.query(IndexVersion)
+            .filter(IndexVersion.status != DELETED)
+            .order_by(IndexVersion.version.desc())
+            .all()
+        )
+        return [_version_to_dict(row) for row in rows]
+    finally:
+        db.close()
+
+def get_version(version: int) -> dict:
+    """One index version with its build progress"""
+    return _version_to_dict(_load_version(version))
+
+class _Throttle:
+    """Pauses after each piece of work so the job works at most `duty` of
+    the time (the rest is left to live queries)"""
+
+    def __init__(self, duty: float, clock=time.perf_counter, sleep=time.sleep):
+        self.duty = min(max(duty, 0.01), 1.0)
+        self.clock = clock
+        self.sleep = sleep
+        self.started = clock()
+
+    def pause(self):
+        worked = self.clock() - self.started
+        if self.duty < 1.0:
+            self.sleep(worked * (1.0 - self.duty) / self.duty)
+        self.started = self.clock()
+
+def _timestamp(moment: Optional[datetime]) -> float:
+    # Stored times are naive UTC
+    return moment.replace(tzinfo=timezone.utc).timestamp() if moment else 0.0
+
+def _rebuild_document(doc_id: str, target: IndexSnapshot, budget: tuple, throttle: _Throttle) -> Optional[bool]:
+    """Chunk and embed a document into a version from its kept text; True if
+    it had none and its chunks in the active version were re-embedded as
+    they are, None if there was nothing to index"""
+    pages = load_document_text(doc_id)
+    if pages is not None:
+        chunks = list(chunk_document(pages, max_tokens=budget[0], overlap_tokens=budget[1],
+                                     count_tokens_batch=target.embedder.count_tokens_batch))
+        texts = [c.text for c in chunks]
+        metadatas = [
+            {"start_char": c.start, "end_char": c.end, "page_start": c.page_start, "page_end": c.page_end}
+            for c in chunks
+        ]
+    else:
+        # Ingested before texts were kept
+        stored = index_snapshot().collection.get(where=document_filter([doc_id]), include=["documents", "metadatas"])
+        order = sorted(range(len(stored["ids"])), key=lambda i: (stored["metadatas"][i] or {}).get("chunk_index", 0))
+        texts = [stored["documents"][i] for i in order]
+        metadatas = [
+            {key: value for key, value in (stored["metadatas"][i] or {}).items()
+             if key not in ("document_id", "chunk_index", "indexed_at")}
+            for i in order
+        ]
+    if not texts:
+        return None
+
+    embeddings = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        embeddings.extend(embed_chunks(texts[start:start + EMBED_BATCH_SIZE], target.embedder))
+        throttle.pause()
+    remove_chunks(target.collection, target.lexical, [doc_id])
+    store_chunks(target.collection, target.lexical, doc_id, texts, embeddings, metadatas)
+    throttle.pause()
+    return pages is None
+
+def _sync(version: int, target: IndexSnapshot, budget: tuple, since: float, throttle: _Throttle,
+          check_cancelled: bool = True) -> int:
+    """Bring a version up to date with the documents: index the ones it is
+    missing or holds an older text of (re-ingested after its chunks were
+    stored, or after `since`), drop deleted ones. Returns how many were indexed."""
+    indexed = indexed_documents(collection=target.collection, lexical=target.lexical)
+    current = document_text_times()
+    removed = [doc_id for doc_id in indexed if doc_id not in current]
+    if removed:
+        remove_chunks(target.collection, target.lexical, removed)
+    pending = [
+        doc_id for doc_id, saved_at in current.items()
+        if doc_id not in indexed
+        or _timestamp(saved_at) > max(indexed[doc_id]["indexed_at"] or 0.0, since)
+    ]
+    done = len(current) - len(pending)
+    _update_version(version, documents_total=len(current), documents_done=done)
+    copied = 0
+    for doc_id in pending:
+        if check_cancelled and _load_version(version).status == CANCELLED:
+            raise _Cancelled()
+        if _rebuild_document(doc_id, target, budget, throttle):
+            copied += 1
+        done += 1
+        _update_version(version, documents_done=done)
+    if copied:
+        row = _load_version(version)
+        _update_version(version, documents_copied=row.documents_copied + copied)
+    return len(pending)
+
+def _open_version(config: dict) -> tuple:
+    # (IndexSnapshot, chunk budget) of a version, opened in this process
+    embedder = create_index_embedder(config)
+    budget = chunk_budget(embedder=embedder, config=config)
+    collection = open_local_collection(embedder, config["vector_path"])
+    return IndexSnapshot(0, config, collection, embedder, LexicalIndex(config["lexical_path"])), budget
+
+def _activate(version: int, target: IndexSnapshot, budget: tuple):
+    """Catch an activating version up with the documents and switch queries to it"""
+    with _activate_lock:
+        row = _load_version(version)
+        since = _timestamp(row.retired_at)
+        throttle = _Throttle(settings.REINDEX_DUTY_CYCLE)
+        for _ in range(SYNC_PASSES):
+            if not _sync(version, target, budget, since, throttle, check_cancelled=False):
+                break
+        # Ingestion (in every worker process) waits while the last changes are
+        # applied and the version switched
+        with index_writes(exclusive=True):
+            _sync(version, target, budget, since, _Throttle(1.0), check_cancelled=False)
+            counts = {doc_id: entry["chunks"] for doc_id, entry in
+                      indexed_documents(collection=target.collection, lexical=target.lexical).items()}
+            activate_index(target.config, target.collection, target.embedder, target.lexical)
+            set_chunk_counts(counts)
+            now = datetime.utcnow()
+            db = get_session()
+            try:
+                for previous in db.query(IndexVersion).filter(IndexVersion.status == ACTIVE).all():
+                    previous.status, previous.retired_at, previous.updated_at = RETIRED, now, now
+                current = db.get(IndexVersion, version)
+                current.status, current.activated_at, current.updated_at = ACTIVE, now, now
+                current.retired_at, current.error = None, None
+                current.chunks = sum(counts.values())
+                db.commit()
+            finally:
+                db.close()
+        print(f"Switched to index version {version}")
+
+def _build(version: int, activate: bool):
+    try:
+        target, budget = _open_version(json.loads(_load_version(version).config))
+        throttle = _Throttle(settings.REINDEX_DUTY_CYCLE)
+        for _ in range(SYNC_PASSES):
+            if not _sync(version, target, budget, 0.0, throttle):
+                break
+        _update_version(version, status=READY, chunks=target.collection.count())
+    except _Cancelled:
+        print(f"Re-index to version {version} cancelled")
+        return
+    except Exception as e:
+        print(f"Re-index to version {version} failed: {e}")
+        _update_version(version, status=FAILED, error=str(e))
+        return
+    if activate:
+        try:
+            _begin_activation(version)
+        except IndexVersionError as e:
+            # Built; stays ready to be activated by hand
+            print(f"Switching to index version {version} failed: {e}")
+            _update_version(version, error=e.detail)
+            return
+        _switch(version, (target, budget))
+
+def _begin_activation(version: int) -> dict:
+    """Mark a ready or retired version activating (one at a time); returns its config"""
+    with _job_lock:
+        db = get_session()
+        try:
+            _ensure_versions(db)
+            row = db.get(IndexVersion, version)
+            if row is None or row.status == DELETED:
+                raise IndexVersionError(f"Index version {version} not found", status_code=404)
+            if row.status not in (READY, RETIRED):
+                raise IndexVersionError(f"Index version {version} is {row.status}; only ready or retired versions "
+                                        f"can be activated")
+            activating = db.query(IndexVersion).filter(IndexVersion.status == ACTIVATING).first()
+            if activating:
+                raise IndexVersionError(f"Index version {activating.version} is still being activated")
+            row.status, row.error, row.owner, row.updated_at = ACTIVATING, None, process_owner(), datetime.utcnow()
+            db.commit()
+            return json.loads(row.config)
+        finally:
+            db.close()
+
+def _inactive_status(row: IndexVersion) -> str:
+    # What an activation that did not finish leaves the version as
+    return RETIRED if row.retired_at else READY
+
+def _switch(version: int, opened: Optional[tuple] = None):
+    try:
+        target, budget = opened or _open_version(json.loads(_load_version(version).config))
+        _activate(version, target, budget)
+    except Exception as e:
+        print(f"Switching to index version {version} failed: {e}")
+        _update_version(version, status=_inactive_status(_load_version(version)), error=str(e))
+
+def start_reindex(options: dict, activate: bool = True) -> dict:
+    """Start building a new index version in the background with the active
+    version's settings changed by options (REINDEX_OPTIONS); it is switched
+    to when complete unless activate is False"""
+    unknown = sorted(set(options) - set(REINDEX_OPTIONS))
+    if unknown:
+        raise IndexVersionError(f"Unknown re-index options {unknown}, expected some of {REINDEX_OPTIONS}",
+                                status_code=400)
+    with _job_lock:
+        db = get_session()
+        try:
+            _ensure_versions(db)
+            building = db.query(IndexVersion).filter(IndexVersion.status == BUILDING).first()
+            if building:
+                raise IndexVersionError(f"Index version {building.version} is still building")
+            version = max(row.version for row in db.query(IndexVersion.version).all()) + 1
+            base = default_index_config()
+            config = {
+                **index_snapshot().config,
+                **options,
+                "vector_path": f"{base['vector_path']}-v{version}",
+                "lexical_path": f"{base['lexical_path']}-v{version}"
+            }
+            db.add(IndexVersion(version=version, status=BUILDING, config=json.dumps(config), owner=process_owner()))
+            db.commit()
+        finally:
+            db.close()
+    threading.Thread(target=_build, args=(version, activate), name=f"reindex-v{version}", daemon=True).start()
+    return get_version(version)
+
+def activate_version(version: int) -> dict:
+    """Start switching queries to a ready or retired version in the background:
+    it is caught up with documents changed since it was built or retired
+    (progress in documents_done), then becomes active"""
+    _begin_activation(version)
+    threading.Thread(target=_switch, args=(version,), name=f"activate-v{version}", daemon=True).start()
+    return get_version(version)
+
+def rollback() -> dict:
+    """Switch back to the most recently retired version"""
+    db = get_session()
+    try:
+        previous = (
+            db.query(IndexVersion)
+            .filter(IndexVersion.status == RETIRED)
+            .order_by(IndexVersion.retired_at.desc())
+            .first()
+        )
+    finally:
+        db.close()
+    if previous is None:
+        raise IndexVersionError("No retired index version to roll back to")
+    return activate_version(previous.version)
+
+def cancel_reindex(version: int) -> dict:
+    """Stop a version being built (the build notices before its next document)"""
+    row = _load_version(version)
+    if row.status != BUILDING:
+        raise IndexVersionError(f"Index version {version} is {row.status}, not building")
+    _update_version(version, status=CANCELLED)
+    return get_version(version)
+
+def delete_version(version: int) -> dict:
+    """Remove an inactive version's vector store and lexical index from disk"""
+    row = _load_version(version)
+    if row.status in (ACTIVE, BUILDING, ACTIVATING):
+        raise IndexVersionError(f"Index version {version} is {row.status}; cancel or switch away from it first")
+    config = json.loads(row.config)
+    base = default_index_config()
+    if config["vector_path"] == base["vector_path"]:
+        raise IndexVersionError(f"Index version {version} lives at the configured paths and cannot be deleted")
+    for path in (config["vector_path"], config["lexical_path"]):
+        shutil.rmtree(path, ignore_errors=True)
+    _update_version(version, status=DELETED)
+    return {"version": version, "status": DELETED}
+
+def fail_interrupted_builds() -> int:
+    """Mark builds whose process is gone as failed, and put back activations
+    it left unfinished (startup); jobs of live workers are left alone"""
+    db = get_session()
+    try:
+        rows = [
+            row for row in db.query(IndexVersion).filter(IndexVersion.status.in_([BUILDING, ACTIVATING])).all()
+            if owner_gone(row.owner)
+        ]
+        now = datetime.utcnow()
+        for row in rows:
+            row.status = FAILED if row.status == BUILDING else _inactive_status(row)
+            row.error, row.updated_at = "Interrupted by a restart", now
+        db.commit()
+        return len(rows)
+    finally:
+        db.close()
@@ -0,0 +1,160 @@
+import time
+from typing import Callable, Iterable, Iterator, Optional
+from ..config import settings
+from .embedders import Embedder
+from .vector_store import (add_document_chunks, delete_document_chunks, embed_chunks, index_snapshot,
+                           index_writes)
+from .doc_store import save_metadata
+from ..utils.text_processing import open_pdf_pages, chunk_document, clean_page, clean_text, PageLimitExceeded
+from . import metrics
+
+MAX_PAGES = 1000
+EMBED_BATCH_SIZE = 64
+
+# Pipeline stages, in order, as reported to progress callbacks.
+# "extract" also covers cleaning and chunking, which consume pages as
+# they stream out of the extractor.
+STAGES = ["extract", "embed", "store"]
+
+class IngestError(Exception):
+    """Document could not be ingested; carries the HTTP status to report"""
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+def _measured_pages(pages: Iterable[str], totals: dict) -> Iterator[str]:
+    """Clean pages (paragraph breaks intact for the chunker), keeping them
+    in totals["pages"] and tracking the cleaned text length (and the time
+    spent cleaning)"""
+    for page in pages:
+        start = time.perf_counter()
+        page = clean_page(page)
+        cleaned = clean_text(page)
+        totals["clean"] += time.perf_counter() - start
+        totals["pages"].append(page)
+        if cleaned:
+            # Pages are joined with a single space in the cleaned text
+            totals["text_length"] += len(cleaned) + (1 if totals["text_length"] else 0)
+        yield page
+
+def chunk_budget(chunk_tokens: Optional[int] = None, chunk_overlap: Optional[int] = None,
+                 embedder: Optional[Embedder] = None, config: Optional[dict] = None) -> tuple:
+    """(max_tokens, overlap_tokens) for an upload; IngestError if the
+    requested size does not fit the embedding model's window. Defaults come
+    from the active index version (or the given embedder and config)."""
+    if embedder is None or config is None:
+        index = index_snapshot()
+        embedder, config = embedder or index.embedder, config or index.config
+    window = embedder.max_tokens
+    max_tokens = chunk_tokens or config["chunk_max_tokens"] or window
+    if max_tokens > window:
+        raise IngestError(f"Chunk size {max_tokens} exceeds the embedding model's {window}-token window")
+    overlap = config["chunk_overlap_tokens"] if chunk_overlap is None else chunk_overlap
+    if overlap >= max_tokens:
+        raise IngestError(f"Chunk overlap {overlap} must be smaller than the chunk size {max_tokens}")
+    return max_tokens, overlap
+
+def ingest_document(doc_id: str, file_path: str, filename: str,
+                    progress: Optional[Callable[..., None]] = None,
+                    content_hash: Optional[str] = None,
+                    chunk_tokens: Optional[int] = None,
+                    chunk_overlap: Optional[int] = None) -> dict:
+    """Run extract -> clean -> chunk -> embed -> store for a saved PDF.
+
+    `progress(stage, **info)` is called as each stage starts and while
+    embedding (with chunks_done), so callers can report live status.
+    chunk_tokens/chunk_overlap override the chunk budget (in embedder tokens).
+    Re-ingesting an existing doc_id replaces its chunks and metadata; the
+    cleaned pages are kept for re-indexing."""
+    report = progress or (lambda stage, **info: None)
+    index = index_snapshot()
+    embedder = index.embedder
+    max_tokens, overlap = chunk_budget(chunk_tokens, chunk_overlap, embedder, index.config)
+
+    try:
+        # Extract pages in parallel and clean/chunk them as they arrive;
+        # raises PageLimitExceeded before extracting anything
+        page_count, pages = open_pdf_pages(
+            file_path,
+            max_pages=MAX_PAGES,
+            workers=settings.PDF_WORKERS,
+            pages_per_task=settings.PDF_PAGES_PER_TASK
+        )
+        report("extract", pages=page_count)
+        # The stages are interleaved; time each one's share of the pass
+        totals = {"text_length": 0, "extract": 0.0, "clean": 0.0, "pages": []}
+        start = time.perf_counter()
+        chunks = list(chunk_document(
+            _measured_pages(metrics.timed_iter(pages, totals, "extract"), totals),
+            max_tokens=max_tokens,
+            overlap_tokens=overlap,
+            count_tokens_batch=embedder.count_tokens_batch
+        ))
+        metrics.record_stage("extract", totals["extract"])
+        metrics.record_stage("clean", totals["clean"])
+        metrics.record_stage("chunk", time.perf_counter() - start - totals["extract"] - totals["clean"])
+    except PageLimitExceeded as e:
+        raise IngestError(
+            f"Document too large. Maximum {MAX_PAGES} pages allowed. This document has {e.page_count} pages."
+        )
+    except Exception as e:
+        print(f"Error extracting PDF text: {e}")
+        raise IngestError("Could not extract text from PDF")
+    
+    if not chunks:
+        raise IngestError("Could not extract text from PDF")
+    
+    while True:
+        # Embed in batches so progress can be reported
+        embeddings = []
+        report("embed", chunks_total=len(chunks), chunks_done=0)
+        with metrics.timed("embed"):
+            for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+                embeddings.extend(embed_chunks([c.text for c in chunks[start:start + EMBED_BATCH_SIZE]], embedder))
+                report("embed", chunks_done=len(embeddings))
+
+        # Add chunks to vector database (dropping any from a previous ingest),
+        # with their position in the document
+        report("store")
+        with index_writes():
+            if index_snapshot().generation == index.generation:
+                delete_document_chunks(doc_id)
+                metadatas = [
+                    {"start_char": c.start, "end_char": c.end, "page_start": c.page_start, "page_end": c.page_end}
+                    for c in chunks
+                ]
+                if not add_document_chunks(doc_id, [c.text for c in chunks], embeddings, metadatas):
+                    raise IngestError("Failed to process document", status_code=500)
+
+                # Save metadata (and the cleaned text) to database
+                metadata_saved = save_metadata(
+                    doc_id=doc_id,
+                    filename=filename,
+                    pages=page_count,
+                    chunks=len(chunks),
+                    text_length=totals["text_length"],
+                    content_hash=content_hash,
+                    page_texts=totals["pages"]
+                )
+                break
+
+        # A re-index switched versions meanwhile: chunk and embed for the new one
+        index = index_snapshot()
+        embedder = index.embedder
+        max_tokens, overlap = chunk_budget(chunk_tokens, chunk_overlap, embedder, index.config)
+        chunks = list(chunk_document(totals["pages"], max_tokens=max_tokens, overlap_tokens=overlap,
+                                     count_tokens_batch=embedder.count_tokens_batch))
+
+    if not metadata_saved:
+        print(f"Warning: Failed to save metadata for document {doc_id}")
+    
+    return {
+        "document_id": doc_id,
+        "filename": filename,
+        "chunks_created": len(chunks),
+        "text_length": totals["text_length"],
+        "pages": page_count,
+        "estimated_pages": page_count,  # kept for existing clients
+        "status": "success"
+    }
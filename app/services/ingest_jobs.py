@@ -0,0 +1,245 @@
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Column, String, Integer, DateTime, Text
+from ..config import settings
+from ..utils.processes import owner_gone, process_owner
+from .doc_store import Base, get_session, register_added_columns
+from .ingest import ingest_document, IngestError
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class IngestJob(Base):
+    """Background ingestion job, persisted next to document metadata so
+    queued/running jobs survive a restart"""
+    __tablename__ = "ingest_jobs"
+
+    job_id = Column(String, primary_key=True, index=True)
+    doc_id = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True, index=True)
+    chunk_tokens = Column(Integer, nullable=True)
+    chunk_overlap = Column(Integer, nullable=True)
+    status = Column(String, nullable=False, default=QUEUED, index=True)
+    stage = Column(String, nullable=True)
+    pages = Column(Integer, nullable=True)
+    chunks_total = Column(Integer, nullable=True)
+    chunks_done = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    owner = Column(String, nullable=True)  # "host:pid" of the process running it
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+register_added_columns("ingest_jobs", {
+    "content_hash": "VARCHAR",
+    "chunk_tokens": "INTEGER",
+    "chunk_overlap": "INTEGER",
+    "owner": "VARCHAR"
+})
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue is at INGEST_QUEUE_DEPTH"""
+
+def _job_to_dict(job: IngestJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "document_id": job.doc_id,
+        "filename": job.filename,
+        "content_hash": job.content_hash,
+        "status": job.status,
+        "stage": job.stage,
+        "pages": job.pages,
+        "chunks_total": job.chunks_total,
+        "chunks_done": job.chunks_done,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat()
+    }
+
+def _update_job(job_id: str, **fields):
+    db = get_session()
+    try:
+        job = db.query(IngestJob).filter(IngestJob.job_id == job_id).first()
+        if job:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = datetime.utcnow()
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error updating ingest job {job_id}: {e}")
+    finally:
+        db.close()
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Get job status, or None if unknown"""
+    db = get_session()
+    try:
+        job = db.query(IngestJob).filter(IngestJob.job_id == job_id).first()
+        return _job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+def find_pending_job_by_hash(content_hash: str) -> Optional[dict]:
+    """A queued or running job for identical content, if any"""
+    db = get_session()
+    try:
+        job = (
+            db.query(IngestJob)
+            .filter(IngestJob.content_hash == content_hash, IngestJob.status.in_([QUEUED, RUNNING]))
+            .first()
+        )
+        return _job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+def count_pending_jobs() -> int:
+    """Jobs queued or running (documents that will soon exist)"""
+    db = get_session()
+    try:
+        return db.query(IngestJob).filter(IngestJob.status.in_([QUEUED, RUNNING])).count()
+    except Exception:
+        return 0
+    finally:
+        db.close()
+
+class IngestJobQueue:
+    """Bounded queue of ingestion jobs drained by a fixed pool of worker threads"""
+
+    def __init__(self, workers: int, max_depth: int):
+        self.workers = workers
+        self.max_depth = max_depth
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start workers (idempotent) and requeue jobs left over from a restart:
+        queued ones, and running ones whose process is gone (every worker
+        process queues them; the first to claim a job runs it)"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        db = get_session()
+        try:
+            unfinished = (
+                db.query(IngestJob)
+                .filter(IngestJob.status.in_([QUEUED, RUNNING]))
+                .order_by(IngestJob.created_at)
+                .all()
+            )
+            for job in unfinished:
+                if job.status == RUNNING:
+                    if not owner_gone(job.owner):
+                        continue
+                    # Only one process puts an orphaned job back
+                    released = (
+                        db.query(IngestJob)
+                        .filter(IngestJob.job_id == job.job_id, IngestJob.status == RUNNING,
+                                IngestJob.owner == job.owner)
+                        .update({"status": QUEUED, "owner": None}, synchronize_session=False)
+                    )
+                    db.commit()
+                    if not released:
+                        continue
+                print(f"Resuming ingest job {job.job_id} ({job.filename})")
+                self._queue.put(job.job_id)
+        finally:
+            db.close()
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, doc_id: str, filename: str, file_path: str, content_hash: Optional[str] = None,
+                chunk_tokens: Optional[int] = None, chunk_overlap: Optional[int] = None) -> dict:
+        """Persist a new job and queue it; raises QueueFullError when saturated"""
+        self.start()
+        if self._queue.qsize() >= self.max_depth:
+            raise QueueFullError(f"Ingestion queue is full ({self.max_depth} jobs)")
+
+        job = IngestJob(
+            job_id=str(uuid.uuid4()),
+            doc_id=doc_id,
+            filename=filename,
+            file_path=file_path,
+            content_hash=content_hash,
+            chunk_tokens=chunk_tokens,
+            chunk_overlap=chunk_overlap,
+            status=QUEUED
+        )
+        db = get_session()
+        try:
+            db.add(job)
+            db.commit()
+            result = _job_to_dict(job)
+        finally:
+            db.close()
+
+        self._queue.put(result["job_id"])
+        return result
+
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            except Exception as e:
+                print(f"Ingest worker error on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _claim(self, job_id: str) -> Optional[IngestJob]:
+        # Queued -> running in one UPDATE, so a job queued in several worker
+        # processes runs in only one of them
+        db = get_session()
+        try:
+            claimed = (
+                db.query(IngestJob)
+                .filter(IngestJob.job_id == job_id, IngestJob.status == QUEUED)
+                .update({"status": RUNNING, "owner": process_owner(), "error": None,
+                         "updated_at": datetime.utcnow()}, synchronize_session=False)
+            )
+            db.commit()
+            if not claimed:
+                return None
+            job = db.query(IngestJob).filter(IngestJob.job_id == job_id).first()
+            db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def _run(self, job_id: str):
+        job = self._claim(job_id)
+        if job is None:
+            return
+        doc_id, filename, file_path, content_hash = job.doc_id, job.filename, job.file_path, job.content_hash
+        chunking = {"chunk_tokens": job.chunk_tokens, "chunk_overlap": job.chunk_overlap}
+
+        def progress(stage: str, **info):
+            _update_job(job_id, stage=stage, **info)
+
+        try:
+            ingest_document(doc_id, file_path, filename, progress=progress, content_hash=content_hash, **chunking)
+            _update_job(job_id, status=DONE, stage=None)
+        except IngestError as e:
+            _update_job(job_id, status=FAILED, error=e.detail)
+        except Exception as e:
+            _update_job(job_id, status=FAILED, error=f"Processing failed: {str(e)}")
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+job_queue = IngestJobQueue(workers=settings.INGEST_WORKERS, max_depth=settings.INGEST_QUEUE_DEPTH)
@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import math
+import time
+import heapq
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Keep identifiers such as "XK-4821", "v2.3.1" or "ISO/IEC" as single terms
+TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+
+# Replaced after every segment change, so other processes notice it
+MANIFEST = "MANIFEST"
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    # Files are written by os.replace, so every write gets a new inode
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+class LexicalIndex:
+    """BM25 inverted index over chunks.
+
+    Held in memory and persisted as one JSON segment per document under
+    `path`, so adding or removing a document only rewrites that document's
+    segment. Segments are loaded on first use; when another process has
+    changed any (the MANIFEST file was replaced), the added, replaced and
+    removed segments are picked up on the next use."""
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}  # term -> {chunk_id: tf}
+        self._lengths: Dict[str, int] = {}               # chunk_id -> tokens
+        self._doc_chunks: Dict[str, Dict[str, Dict[str, int]]] = {}  # doc_id -> {chunk_id: term counts}
+        self._total_length = 0
+        self._segment_stamps: Dict[str, Tuple[int, int]] = {}  # doc_id -> stamp of the loaded segment
+        self._manifest_stamp = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _segment_path(self, doc_id: str) -> str:
+        return os.path.join(self.path, f"{doc_id}.json")
+
+    def _ensure_loaded(self):
+        stamp = _stamp(os.path.join(self.path, MANIFEST))
+        if self._loaded and stamp == self._manifest_stamp:
+            return
+        with self._lock:
+            if self._loaded and stamp == self._manifest_stamp:
+                return
+            # Taken before the scan: a change made during it is seen next time
+            self._manifest_stamp = stamp
+            self._sync_segments()
+            self._loaded = True
+
+    def _sync_segments(self):
+        """Bring the in-memory index in line with the segments on disk,
+        reading only the ones that changed since they were loaded"""
+        on_disk = set()
+        names = os.listdir(self.path) if os.path.isdir(self.path) else []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            doc_id = name[:-len(".json")]
+            stamp = _stamp(os.path.join(self.path, name))
+            if stamp is None:
+                continue
+            on_disk.add(doc_id)
+            if stamp == self._segment_stamps.get(doc_id):
+                continue
+            try:
+                with open(os.path.join(self.path, name)) as f:
+                    segment = json.load(f)
+            except FileNotFoundError:
+                on_disk.discard(doc_id)
+                continue
+            self._unindex(doc_id)
+            self._index(doc_id, segment["chunks"])
+            self._segment_stamps[doc_id] = stamp
+        for doc_id in set(self._doc_chunks) - on_disk:
+            self._unindex(doc_id)
+
+    def _touch_manifest(self):
+        tmp_path = os.path.join(self.path, f"{MANIFEST}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST))
+
+    def _index(self, doc_id: str, chunks: Dict[str, Dict[str, int]]):
+        self._doc_chunks[doc_id] = chunks
+        for chunk_id, counts in chunks.items():
+            length = sum(counts.values())
+            self._lengths[chunk_id] = length
+            self._total_length += length
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[chunk_id] = tf
+
+    def _unindex(self, doc_id: str):
+        self._segment_stamps.pop(doc_id, None)
+        for chunk_id, counts in self._doc_chunks.pop(doc_id, {}).items():
+            self._total_length -= self._lengths.pop(chunk_id, 0)
+            for term in counts:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def add_document(self, doc_id: str, chunk_ids: List[str], chunks: List[str]):
+        """Index (or re-index) every chunk of a document"""
+        segment = {chunk_id: dict(Counter(tokenize(text))) for chunk_id, text in zip(chunk_ids, chunks)}
+        self._ensure_loaded()
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = self._segment_path(doc_id) + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"doc_id": doc_id, "chunks": segment}, f)
+            os.replace(tmp_path, self._segment_path(doc_id))
+            self._unindex(doc_id)
+            self._index(doc_id, segment)
+            self._segment_stamps[doc_id] = _stamp(self._segment_path(doc_id))
+            self._touch_manifest()
+
+    def remove_document(self, doc_id: str):
+        """Drop a document's chunks from the index"""
+        self._ensure_loaded()
+        with self._lock:
+            self._unindex(doc_id)
+            try:
+                os.remove(self._segment_path(doc_id))
+            except FileNotFoundError:
+                return
+            self._touch_manifest()
+
+    def search(self, query: str, k: int = 5, doc_ids: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, BM25 score), best first. With doc_ids only those
+        documents' chunks are scored (corpus statistics stay global)."""
+        self._ensure_loaded()
+        with self._lock:
+            n = len(self._lengths)
+            if n == 0:
+                return []
+            avg_length = self._total_length / n
+            idf = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if postings:
+                    idf[term] = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+
+            def bm25(tf: int, chunk_id: str) -> float:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                return tf * (self.k1 + 1) / (tf + norm)
+
+            scores: Dict[str, float] = {}
+            if doc_ids is None:
+                for term, weight in idf.items():
+                    for chunk_id, tf in self._postings[term].items():
+                        scores[chunk_id] = scores.get(chunk_id, 0.0) + weight * bm25(tf, chunk_id)
+            else:
+                # Walk only the selected documents' chunks instead of whole posting lists
+                for doc_id in set(doc_ids):
+                    for chunk_id, counts in self._doc_chunks.get(doc_id, {}).items():
+                        score = sum(weight * bm25(counts[term], chunk_id) for term, weight in idf.items() if term in counts)
+                        if score:
+                            scores[chunk_id] = score
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def document_ids(self) -> List[str]:
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._doc_chunks)
+
+    def stats(self) -> dict:
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                "documents": len(self._doc_chunks),
+                "chunks": len(self._lengths),
+                "terms": len(self._postings)
+            }
+
+def reciprocal_rank_fusion(rankings: List[Tuple[List[str], float]], k: int, rrf_k: int = 60) -> List[str]:
+    """Merge ranked id lists: score(id) = sum(weight / (rrf_k + rank)).
+    rankings is [(ids best first, weight), ...]; returns the top-k ids."""
+    scores: Dict[str, float] = {}
+    for ids, weight in rankings:
+        if weight <= 0:
+            continue
+        for rank, chunk_id in enumerate(ids, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (rrf_k + rank)
+    return [chunk_id for chunk_id, _ in heapq.nlargest(k, scores.items(), key=lambda item: item[1])]
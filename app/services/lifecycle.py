@@ -0,0 +1,81 @@
+from datetime import datetime
+import time
+from typing import Optional
+from ..config import settings
+from .doc_store import delete_documents as delete_metadata, find_document_ids
+from .vector_store import delete_documents_chunks, indexed_documents, index_disk_usage, compact_vector_store
+
+# Document lifecycle across the stores. The metadata row goes first, so a
+# deleted document immediately stops matching filters and listings; its
+# chunks follow. Queries already past retrieval finish with what they got
+# (missing chunks are skipped) and cannot cache their answer, as every
+# delete bumps the corpus version. Chunks a failed delete leaves behind are
+# orphans, which compact_index() removes.
+
+def delete_documents(doc_ids: list) -> dict:
+    """Delete documents everywhere: metadata, vectors, lexical index and
+    (through the corpus version) cached answers"""
+    doc_ids = list(dict.fromkeys(doc_ids))
+    deleted = delete_metadata(doc_ids) if doc_ids else []
+    # Chunks of ids without a row (orphans) are removed as well
+    chunks_deleted = delete_documents_chunks(doc_ids) if doc_ids else True
+    found = set(deleted)
+    return {
+        "deleted": deleted,
+        "not_found": [doc_id for doc_id in doc_ids if doc_id not in found],
+        "chunks_deleted": chunks_deleted
+    }
+
+def delete_matching(filename_pattern: Optional[str] = None,
+                    uploaded_after: Optional[datetime] = None,
+                    uploaded_before: Optional[datetime] = None) -> dict:
+    """Bulk delete of the documents matching every given filter (at least
+    one is required, so an empty call cannot wipe the corpus)"""
+    if filename_pattern is None and uploaded_after is None and uploaded_before is None:
+        raise ValueError("At least one filter is required for a bulk delete")
+    doc_ids = find_document_ids(
+        filename_pattern=filename_pattern,
+        uploaded_after=uploaded_after,
+        uploaded_before=uploaded_before
+    )
+    result = delete_documents(doc_ids)
+    del result["not_found"]
+    return result
+
+def find_orphans(min_age_seconds: Optional[float] = None) -> dict:
+    """Indexed documents without a metadata row: {doc_id: {"chunks", "indexed_at"}}.
+    Chunks newer than min_age_seconds are skipped: ingestion stores chunks
+    before the metadata row."""
+    min_age = settings.COMPACTION_MIN_AGE_SECONDS if min_age_seconds is None else min_age_seconds
+    cutoff = time.time() - min_age
+    indexed = indexed_documents()
+    known = set(find_document_ids())
+    return {
+        doc_id: entry for doc_id, entry in indexed.items()
+        if doc_id is not None and doc_id not in known
+        and (entry["indexed_at"] is None or entry["indexed_at"] <= cutoff)
+    }
+
+def compact_index(min_age_seconds: Optional[float] = None, dry_run: bool = False) -> dict:
+    """Remove orphaned chunks and reclaim index space; reports what was
+    (or, with dry_run, would be) removed and the bytes reclaimed"""
+    start = time.perf_counter()
+    orphans = find_orphans(min_age_seconds)
+    report = {
+        "orphaned_documents": sorted(orphans),
+        "orphaned_chunks": sum(entry["chunks"] for entry in orphans.values()),
+        "dry_run": dry_run
+    }
+    if dry_run:
+        return report
+
+    before = index_disk_usage()
+    if orphans:
+        delete_documents_chunks(list(orphans))
+    report["vector_store_compaction"] = compact_vector_store()
+    after = index_disk_usage()
+    report["bytes_before"] = before
+    report["bytes_after"] = after
+    report["bytes_reclaimed"] = sum(before.values()) - sum(after.values())
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    return report
@@ -1,67 +1,164 @@
 import os
-from typing import List
+import time
+import asyncio
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional
 from pydantic import BaseModel
-import google.generativeai as genai
-import openai
-import cohere
+from ..config import settings
+from .executor import run_io
+from .provider_health import ProviderStats, CircuitBreaker, CircuitOpenError, CLOSED
+from .startup import timed_init
+from . import metrics
 
-# Configure API clients
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API_KEY"))
-openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-cohere_client = cohere.Client(os.getenv("COHERE_API_KEY"))
+# API clients are built on first use (or by the startup warm-up); the SDKs
+# are imported lazily too since they are slow to import
+
+@lru_cache(maxsize=None)
+def gemini_model(name: str):
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API_KEY"))
+    return genai.GenerativeModel(name)
+
+@lru_cache(maxsize=None)
+def openai_clients():
+    """(sync, async) OpenAI clients"""
+    import openai
+    api_key = os.getenv("OPENAI_API_KEY")
+    return openai.OpenAI(api_key=api_key), openai.AsyncOpenAI(api_key=api_key)
+
+@lru_cache(maxsize=None)
+def cohere_clients():
+    """(sync, async) Cohere clients"""
+    import cohere
+    api_key = os.getenv("COHERE_API_KEY")
+    return cohere.Client(api_key), cohere.AsyncClient(api_key)
 
 class LLMRequest(BaseModel):
     query: str
     context: str
+    # Context packed for a specific provider's token budget, by provider name
+    provider_contexts: dict[str, str] = {}
+
+    def context_for(self, provider: str) -> str:
+        return self.provider_contexts.get(provider, self.context)
 
 class LLMProvider:
     def __init__(self, name: str, priority: int):
         self.name = name
         self.priority = priority
+        # Live latency/error stats and circuit breaker state
+        self.stats = ProviderStats()
+        self.breaker = CircuitBreaker()
+    
+    @property
+    def context_tokens(self) -> int:
+        """Token budget for the retrieved context in this provider's prompt"""
+        return settings.PROVIDER_CONTEXT_TOKENS.get(self.name, settings.CONTEXT_TOKEN_BUDGET)
+
+    def setup(self):
+        """Create API clients ahead of the first call (optional)"""
     
     def generate(self, request: LLMRequest) -> str:
         raise NotImplementedError
 
+    async def agenerate(self, request: LLMRequest) -> str:
+        """Async generate; falls back to the sync client on the I/O pool"""
+        return await run_io(self.generate, request)
+
+    async def astream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """Answer text as it is generated; by default the whole answer at once"""
+        yield await self.agenerate(request)
+
 class GeminiProvider(LLMProvider):
     def __init__(self):
         super().__init__("gemini", 1)  # Priority 1 (highest)
-        self.model = genai.GenerativeModel("gemini-2.0-flash-lite")
+
+    @property
+    def model(self):
+        return gemini_model("gemini-2.0-flash-lite")
+
+    def setup(self):
+        self.model
+
+    def _prompt(self, request: LLMRequest) -> str:
+        return f"Context: {request.context_for(self.name)}\n\nQuestion: {request.query}\n\nAnswer:"
     
     def generate(self, request: LLMRequest) -> str:
-        prompt = f"Context: {request.context}\n\nQuestion: {request.query}\n\nAnswer:"
-        response = self.model.generate_content(prompt)
+        response = self.model.generate_content(self._prompt(request))
+        return response.text
+
+    async def agenerate(self, request: LLMRequest) -> str:
+        response = await self.model.generate_content_async(self._prompt(request))
         return response.text
 
+    async def astream(self, request: LLMRequest) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(self._prompt(request), stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
 class OpenAIProvider(LLMProvider):
     def __init__(self):
         super().__init__("openai", 2)  # Priority 2
-    
-    def generate(self, request: LLMRequest) -> str:
+
+    def setup(self):
+        openai_clients()
+
+    def _params(self, request: LLMRequest) -> dict:
         messages = [
-            {"role": "user", "content": f"Context: {request.context}\n\nQuestion: {request.query}"}
+            {"role": "user", "content": f"Context: {request.context_for(self.name)}\n\nQuestion: {request.query}"}
         ]
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.2,
-            max_tokens=500
-        )
+        return {
+            "model": "gpt-3.5-turbo",
+            "messages": messages,
+            "temperature": 0.2,
+            "max_tokens": 500
+        }
+    
+    def generate(self, request: LLMRequest) -> str:
+        response = openai_clients()[0].chat.completions.create(**self._params(request))
         return response.choices[0].message.content
 
+    async def agenerate(self, request: LLMRequest) -> str:
+        response = await openai_clients()[1].chat.completions.create(**self._params(request))
+        return response.choices[0].message.content
+
+    async def astream(self, request: LLMRequest) -> AsyncIterator[str]:
+        stream = await openai_clients()[1].chat.completions.create(**self._params(request), stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
 class CohereProvider(LLMProvider):
     def __init__(self):
         super().__init__("cohere", 3)  # Priority 3
+
+    def setup(self):
+        cohere_clients()
+
+    def _params(self, request: LLMRequest) -> dict:
+        return {
+            "model": "command-r",
+            "prompt": f"Context: {request.context_for(self.name)}\n\nQuestion: {request.query}\n\nAnswer:",
+            "max_tokens": 400,
+            "temperature": 0.2
+        }
     
     def generate(self, request: LLMRequest) -> str:
-        prompt = f"Context: {request.context}\n\nQuestion: {request.query}\n\nAnswer:"
-        response = cohere_client.generate(
-            model="command-r",
-            prompt=prompt,
-            max_tokens=400,
-            temperature=0.2
-        )
+        response = cohere_clients()[0].generate(**self._params(request))
+        return response.generations[0].text
+
+    async def agenerate(self, request: LLMRequest) -> str:
+        response = await cohere_clients()[1].generate(**self._params(request))
         return response.generations[0].text
 
+    async def astream(self, request: LLMRequest) -> AsyncIterator[str]:
+        async for event in cohere_clients()[1].generate_stream(**self._params(request)):
+            if event.event_type == "text-generation" and event.text:
+                yield event.text
+            elif event.event_type == "stream-error":
+                raise RuntimeError(f"Cohere stream error: {event.finish_reason}")
+
 # Initialize providers in priority order
 PROVIDERS: List[LLMProvider] = [
     GeminiProvider(),
@@ -69,28 +166,278 @@ PROVIDERS: List[LLMProvider] = [
     CohereProvider()
 ]
 
-def generate_with_fallback(request: LLMRequest) -> dict:
+def setup_providers():
+    """Build every provider's API clients (startup warm-up)"""
+    def setup_all():
+        for provider in PROVIDERS:
+            provider.setup()
+    timed_init("llm_providers", setup_all)
+
+async def _timed_generate(provider: LLMProvider, request: LLMRequest,
+                          limits: Optional[dict] = None) -> str:
+    """Call a provider through its circuit breaker, with the configured
+    timeout, and feed the outcome into its rolling stats. limits maps
+    provider names to semaphores bounding concurrent calls."""
+    limit = limits.get(provider.name) if limits else None
+    if limit is None:
+        return await _call_provider(provider, request)
+    async with limit:
+        return await _call_provider(provider, request)
+
+async def _call_provider(provider: LLMProvider, request: LLMRequest) -> str:
+    provider.breaker.before_call()
+    start = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(
+            provider.agenerate(request),
+            timeout=settings.LLM_TIMEOUT_SECONDS
+        )
+    except asyncio.CancelledError:
+        # Lost a hedged race: not the provider's fault
+        provider.breaker.release()
+        raise
+    except Exception as e:
+        metrics.record_llm_call(provider.name, time.perf_counter() - start, success=False)
+        provider.stats.record_failure(_error_text(e))
+        provider.breaker.record_failure(provider.stats)
+        raise
+    metrics.record_llm_call(provider.name, time.perf_counter() - start, success=True)
+    provider.stats.record_success(time.perf_counter() - start)
+    provider.breaker.record_success()
+    return response
+
+def _error_text(e: BaseException) -> str:
+    return str(e) or type(e).__name__
+
+def _all_failed(last_error: Optional[str]) -> dict:
+    if last_error is None:
+        last_error = "No providers available (all circuits open)"
+    return {
+        "answer": "Sorry, all AI providers are currently unavailable.",
+        "provider_used": "none",
+        "success": False,
+        "error": last_error
+    }
+
+def ordered_providers() -> List[LLMProvider]:
+    """Providers to try, in order. Providers with an open circuit are skipped;
+    half-open ones (due a probe) go last. With PROVIDER_ORDERING="latency"
+    healthy providers are ordered by EWMA latency (unmeasured first so they
+    get sampled), otherwise by their fixed priority."""
+    available = [p for p in PROVIDERS if p.breaker.is_available()]
+    closed = [p for p in available if p.breaker.state == CLOSED]
+    probing = [p for p in available if p.breaker.state != CLOSED]
+
+    if settings.PROVIDER_ORDERING == "latency":
+        closed.sort(key=lambda p: (p.stats.ewma_latency or 0.0, p.priority))
+    else:
+        closed.sort(key=lambda p: p.priority)
+    probing.sort(key=lambda p: p.priority)
+    return closed + probing
+
+def hedge_delay_for(provider: LLMProvider) -> float:
+    """Delay before hedging: fixed if configured, else the provider's observed p90"""
+    if settings.HEDGE_DELAY_SECONDS is not None:
+        return settings.HEDGE_DELAY_SECONDS
+    if len(provider.stats.latencies) < settings.HEDGE_MIN_SAMPLES:
+        return settings.HEDGE_DEFAULT_DELAY_SECONDS
+    return provider.stats.latency_percentile(90)
+
+async def _generate_sequential(request: LLMRequest, providers: List[LLMProvider],
+                               limits: Optional[dict] = None) -> dict:
     """Try providers in order until one succeeds"""
     last_error = None
     
-    for provider in PROVIDERS:
+    for i, provider in enumerate(providers):
         try:
             print(f"Trying {provider.name}...")
-            response = provider.generate(request)
+            response = await _timed_generate(provider, request, limits)
             return {
                 "answer": response,
                 "provider_used": provider.name,
                 "success": True
             }
         except Exception as e:
-            print(f"{provider.name} failed: {str(e)}")
-            last_error = str(e)
+            print(f"{provider.name} failed: {_error_text(e)}")
+            last_error = _error_text(e)
+            if i + 1 < len(providers):
+                metrics.record_fallback(provider.name)
             continue
     
     # If all providers fail
+    return _all_failed(last_error)
+
+async def _generate_hedged(request: LLMRequest, providers: List[LLMProvider],
+                           limits: Optional[dict] = None) -> dict:
+    """Race providers: start the next one whenever the current ones are slower
+    than the hedge delay (or one fails), return the first success and cancel the rest"""
+    if not providers:
+        return _all_failed(None)
+
+    delay = hedge_delay_for(providers[0])
+    waiting = list(providers)
+    in_flight = {}
+    last_error = None
+
+    def launch_next():
+        provider = waiting.pop(0)
+        print(f"Trying {provider.name}...")
+        in_flight[asyncio.create_task(_timed_generate(provider, request, limits))] = provider
+
+    launch_next()
+    try:
+        while in_flight:
+            done, _ = await asyncio.wait(
+                in_flight,
+                timeout=delay if waiting else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # Nobody answered within the hedge delay: send a backup request
+                metrics.record_hedge()
+                launch_next()
+                continue
+
+            for task in done:
+                provider = in_flight.pop(task)
+                if task.exception() is None:
+                    return {
+                        "answer": task.result(),
+                        "provider_used": provider.name,
+                        "success": True,
+                        "hedge_delay": delay
+                    }
+                print(f"{provider.name} failed: {_error_text(task.exception())}")
+                last_error = _error_text(task.exception())
+                if waiting:
+                    metrics.record_fallback(provider.name)
+
+            # Replace failed attempts straight away instead of waiting out the delay
+            if waiting and not in_flight:
+                launch_next()
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+    result = _all_failed(last_error)
+    result["hedge_delay"] = delay
+    return result
+
+async def generate_with_fallback(request: LLMRequest, strategy: Optional[str] = None,
+                                 limits: Optional[dict] = None) -> dict:
+    """Generate an answer using the configured provider strategy
+    ("sequential" fallback chain or "hedged" racing). limits: optional
+    {provider name: asyncio.Semaphore} shared by concurrent calls (see
+    provider_limits)"""
+    strategy = strategy or settings.LLM_STRATEGY
+    providers = ordered_providers()
+    if strategy == "hedged":
+        return await _generate_hedged(request, providers, limits)
+    return await _generate_sequential(request, providers, limits)
+
+def provider_limits(concurrency: int) -> dict:
+    """A semaphore per provider allowing concurrency calls at a time"""
+    return {provider.name: asyncio.Semaphore(concurrency) for provider in PROVIDERS}
+
+async def stream_with_fallback(request: LLMRequest) -> AsyncIterator[dict]:
+    """Stream an answer from the first provider that produces a token.
+
+    Yields {"type": "provider", "provider", "time_to_first_token"} once a
+    provider has started answering, then {"type": "token", "text"} events,
+    and finally {"type": "done", "result"} with the same result dict as
+    generate_with_fallback. Providers are tried in order (no hedging) and a
+    failure only moves on to the next provider before the first token; a
+    stream that breaks later ends with an unsuccessful result holding the
+    partial answer. LLM_TIMEOUT_SECONDS bounds the wait for each token."""
+    last_error = None
+    providers = ordered_providers()
+
+    for i, provider in enumerate(providers):
+        try:
+            provider.breaker.before_call()
+        except CircuitOpenError as e:
+            last_error = _error_text(e)
+            continue
+        print(f"Streaming from {provider.name}...")
+        start = time.perf_counter()
+        stream = provider.astream(request)
+        parts = []
+        finished = False
+        try:
+            try:
+                first = await asyncio.wait_for(anext(stream), timeout=settings.LLM_TIMEOUT_SECONDS)
+            except StopAsyncIteration:
+                raise RuntimeError("empty response") from None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Nothing sent yet: fall back to the next provider
+                print(f"{provider.name} failed: {_error_text(e)}")
+                last_error = _error_text(e)
+                metrics.record_llm_call(provider.name, time.perf_counter() - start, success=False)
+                if i + 1 < len(providers):
+                    metrics.record_fallback(provider.name)
+                provider.stats.record_failure(last_error)
+                provider.breaker.record_failure(provider.stats)
+                finished = True
+                continue
+
+            yield {"type": "provider", "provider": provider.name, "time_to_first_token": time.perf_counter() - start}
+            parts.append(first)
+            yield {"type": "token", "text": first}
+            while True:
+                try:
+                    text = await asyncio.wait_for(anext(stream), timeout=settings.LLM_TIMEOUT_SECONDS)
+                except StopAsyncIteration:
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"{provider.name} stream broke: {_error_text(e)}")
+                    metrics.record_llm_call(provider.name, time.perf_counter() - start, success=False)
+                    provider.stats.record_failure(_error_text(e))
+                    provider.breaker.record_failure(provider.stats)
+                    finished = True
+                    yield {"type": "done", "result": {
+                        "answer": "".join(parts),
+                        "provider_used": provider.name,
+                        "success": False,
+                        "error": f"Stream interrupted: {_error_text(e)}"
+                    }}
+                    return
+                parts.append(text)
+                yield {"type": "token", "text": text}
+
+            metrics.record_llm_call(provider.name, time.perf_counter() - start, success=True)
+            provider.stats.record_success(time.perf_counter() - start)
+            provider.breaker.record_success()
+            finished = True
+            yield {"type": "done", "result": {
+                "answer": "".join(parts),
+                "provider_used": provider.name,
+                "success": True
+            }}
+            return
+        finally:
+            if not finished:
+                # Client went away (or cancelled) mid-stream: not the provider's fault
+                provider.breaker.release()
+            await stream.aclose()
+
+    yield {"type": "done", "result": _all_failed(last_error)}
+
+def provider_health() -> dict:
+    """Breaker state and rolling stats for every provider"""
     return {
-        "answer": "Sorry, all AI providers are currently unavailable.",
-        "provider_used": "none",
-        "success": False,
-        "error": last_error
+        "ordering": settings.PROVIDER_ORDERING,
+        "current_order": [p.name for p in ordered_providers()],
+        "providers": [
+            {
+                "name": p.name,
+                "priority": p.priority,
+                **p.breaker.to_dict(),
+                **p.stats.to_dict()
+            }
+            for p in PROVIDERS
+        ]
     }
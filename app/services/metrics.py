@@ -0,0 +1,169 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Iterator, Optional
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from ..config import settings
+
+# Prometheus metrics for every pipeline stage, served by GET /metrics.
+# Stage timings also go to the current request's breakdown (if one was
+# started with start_timings), which /query returns in debug mode.
+
+# Seconds; from sub-millisecond (lexical search, SQLite) to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Time spent per pipeline stage",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+EMBEDDING_SECONDS = Histogram(
+    "rag_embedding_seconds", "Embedding model call latency",
+    buckets=LATENCY_BUCKETS
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "rag_embedding_batch_size", "Texts per embedding model call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+LLM_SECONDS = Histogram(
+    "rag_llm_generate_seconds", "LLM provider call latency",
+    ["provider", "outcome"], buckets=LATENCY_BUCKETS
+)
+LLM_FAILURES = Counter("rag_llm_failures_total", "Failed LLM provider calls", ["provider"])
+LLM_FALLBACKS = Counter(
+    "rag_llm_fallbacks_total", "Times the next provider was tried after this one failed", ["provider"]
+)
+LLM_HEDGES = Counter("rag_llm_hedges_total", "Backup requests sent by the hedged strategy")
+DB_SECONDS = Histogram(
+    "rag_db_seconds", "Metadata database statement latency",
+    ["operation"], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "rag_http_request_seconds", "HTTP request latency (until the response starts)",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge("rag_http_requests_in_flight", "HTTP requests being served")
+COLLECTION_CHUNKS = Gauge("rag_vector_collection_chunks", "Chunks in the vector collection")
+DOCUMENTS = Gauge("rag_documents", "Documents in the metadata store")
+
+_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+# Labelled children, looked up once (labels() takes a lock on every call)
+_stage_children = {}
+
+def start_timings() -> dict:
+    """Collect stage timings of the current request (and the pool work it
+    starts) into the returned dict"""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+def add_timing(name: str, seconds: float):
+    """Add to the current request's breakdown only"""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+def record_stage(stage: str, seconds: float):
+    if not settings.METRICS_ENABLED:
+        return
+    child = _stage_children.get(stage)
+    if child is None:
+        child = _stage_children[stage] = STAGE_SECONDS.labels(stage)
+    child.observe(seconds)
+    add_timing(stage, seconds)
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def timed_iter(items: Iterable, totals: dict, key: str) -> Iterator:
+    """Pass items through, adding the time spent producing each one to totals[key]"""
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            totals[key] = totals.get(key, 0.0) + time.perf_counter() - start
+            return
+        totals[key] = totals.get(key, 0.0) + time.perf_counter() - start
+        yield item
+
+def record_embedding(batch_size: int, seconds: float):
+    if not settings.METRICS_ENABLED:
+        return
+    EMBEDDING_SECONDS.observe(seconds)
+    EMBEDDING_BATCH_SIZE.observe(batch_size)
+
+def record_llm_call(provider: str, seconds: float, success: bool):
+    if not settings.METRICS_ENABLED:
+        return
+    LLM_SECONDS.labels(provider, "success" if success else "failure").observe(seconds)
+    if not success:
+        LLM_FAILURES.labels(provider).inc()
+    add_timing(f"llm_{provider}", seconds)
+
+def record_fallback(provider: str):
+    if settings.METRICS_ENABLED:
+        LLM_FALLBACKS.labels(provider).inc()
+
+def record_hedge():
+    if settings.METRICS_ENABLED:
+        LLM_HEDGES.inc()
+
+def record_db(statement: str, seconds: float):
+    if not settings.METRICS_ENABLED:
+        return
+    DB_SECONDS.labels(statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER").observe(seconds)
+    add_timing("db", seconds)
+
+def gauge_from(gauge: Gauge, read: Callable[[], float]):
+    """Read a gauge's value at scrape time (NaN when it cannot be read)"""
+    def value():
+        try:
+            return float(read())
+        except Exception:
+            return float("nan")
+    gauge.set_function(value)
+
+def render() -> tuple[bytes, str]:
+    """(exposition body, content type) for GET /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """In-flight gauge and per-route latency for every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        observed = False
+
+        def observe():
+            nonlocal observed
+            if not observed:
+                observed = True
+                # Route template (not the raw path) keeps label cardinality bounded
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_SECONDS.labels(scope["method"], route).observe(time.perf_counter() - start)
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                observe()
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            observe()
+            REQUESTS_IN_FLIGHT.dec()
@@ -0,0 +1,476 @@
+import os
+import json
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+import numpy as np
+
+VECTORS_FILE = "vectors.f16"  # float16 rows, append-only
+TEXTS_FILE = "texts.bin"      # chunk texts (utf-8), append-only
+LOG_FILE = "rows.jsonl"       # side table: one record per add/delete/metadata change
+LOCK_FILE = "write.lock"
+
+def data_file(name: str, generation: int) -> str:
+    """Data file name for a compaction generation (0: the plain name)"""
+    if not generation:
+        return name
+    base, ext = os.path.splitext(name)
+    return f"{base}.{generation}{ext}"
+
+class NumpyVectorIndex:
+    """Exact-search vector store on a memory-mapped float16 matrix.
+
+    Embeddings are normalized and appended to VECTORS_FILE; chunk texts to
+    TEXTS_FILE. LOG_FILE is the side table: each "add" record maps a run of
+    rows to chunk ids, a document id and text offsets, "delete" records
+    tombstone a document's rows. A log record is written only after its rows,
+    so readers never see partial data. Other processes can open the same
+    directory with read_only=True; they map the files read-only and pick up
+    new records on each call.
+
+    compact() rewrites the live rows into a new generation of data files
+    and atomically replaces the log; readers notice the new log and reload,
+    and keep reading the old generation through open handles until then.
+
+    Implements the subset of the Chroma collection API vector_store uses
+    (add / delete / query / get / count / peek / metadata / modify), with
+    distances as squared L2 between unit vectors (2 - 2 * cosine)."""
+
+    name = "documents"
+
+    def __init__(self, path: str, read_only: bool = False, block_rows: int = 65536):
+        self.path = path
+        self.read_only = read_only
+        self.block_rows = block_rows
+        self._texts_fd = None
+        self._log_inode = None
+        self._lock = threading.RLock()
+        self._reset()
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self._refresh()
+
+    def _reset(self):
+        """Forget the replayed state (the log was replaced by compaction)"""
+        self.metadata = None
+        self.dimension = None
+        self._generation = 0
+        self._rows = 0
+        self._ids: List[str] = []
+        self._docs: List[str] = []
+        self._metadatas: List[dict] = []
+        self._text_spans: List[tuple] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_of = {}     # chunk id -> row
+        self._doc_rows = {}   # doc id -> rows
+        self._vectors = None  # memmap (rows, dimension)
+        self._log_offset = 0
+        if self._texts_fd is not None:
+            os.close(self._texts_fd)
+            self._texts_fd = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _data_path(self, name: str) -> str:
+        return self._file(data_file(name, self._generation))
+
+    # Side table replay
+
+    def _refresh(self):
+        """Apply log records written since the last call (by any process)"""
+        while True:
+            try:
+                with open(self._file(LOG_FILE), "rb") as f:
+                    inode = os.fstat(f.fileno()).st_ino
+                    if inode != self._log_inode:
+                        # First load, or compaction replaced the log: replay from scratch
+                        if self._log_inode is not None:
+                            self._reset()
+                        self._log_inode = inode
+                    f.seek(self._log_offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            end = data.rfind(b"\n") + 1  # ignore a record still being written
+            for line in data[:end].splitlines():
+                self._apply(json.loads(line))
+            self._log_offset += end
+            try:
+                self._open_texts()
+                self._map_vectors()
+                return
+            except FileNotFoundError:
+                # Compacted again since the log was read: start over
+                self._reset()
+                self._log_inode = None
+
+    def _open_texts(self):
+        if self._texts_fd is None and os.path.exists(self._file(LOG_FILE)) and self._rows:
+            self._texts_fd = os.open(self._data_path(TEXTS_FILE), os.O_RDONLY)
+
+    def _apply(self, record: dict):
+        op = record["op"]
+        if op == "generation":
+            self._generation = record["generation"]
+        elif op == "metadata":
+            self.metadata = record["metadata"]
+            self.dimension = record.get("dimension", self.dimension)
+        elif op == "add":
+            start = record["row"]
+            count = len(record["ids"])
+            self._ensure_capacity(start + count)
+            for i, chunk_id in enumerate(record["ids"]):
+                previous = self._row_of.get(chunk_id)
+                if previous is not None:
+                    self._alive[previous] = False
+                self._row_of[chunk_id] = start + i
+            self._ids.extend(record["ids"])
+            self._docs.extend([record["doc"]] * count)
+            self._metadatas.extend(record["metadatas"])
+            self._text_spans.extend(tuple(span) for span in record["texts"])
+            self._alive[start:start + count] = True
+            self._doc_rows.setdefault(record["doc"], []).extend(range(start, start + count))
+            self._rows = start + count
+        elif op == "delete":
+            for row in self._doc_rows.pop(record["doc"], []):
+                if self._alive[row]:
+                    self._alive[row] = False
+                    del self._row_of[self._ids[row]]
+
+    def _ensure_capacity(self, rows: int):
+        if rows > len(self._alive):
+            alive = np.zeros(max(rows, 2 * len(self._alive), 1024), dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+
+    def _map_vectors(self):
+        if self.dimension is None or self._rows == 0:
+            self._vectors = None
+            return
+        if self._vectors is None or len(self._vectors) != self._rows:
+            self._vectors = np.memmap(
+                self._data_path(VECTORS_FILE), dtype=np.float16, mode="r",
+                shape=(self._rows, self.dimension)
+            )
+
+    # Writes
+
+    @contextmanager
+    def _write_lock(self):
+        """Serialize writers across threads and processes, on fresh state"""
+        if self.read_only:
+            raise PermissionError(f"Vector index at {self.path} is opened read-only")
+        with self._lock:
+            with open(self._file(LOCK_FILE), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _append_log(self, record: dict):
+        with open(self._file(LOG_FILE), "ab") as f:
+            f.write(json.dumps(record).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _truncate_to_log(self):
+        """Drop vector/text bytes a crashed writer left past the last record"""
+        if self.dimension is None:
+            return
+        vectors_size = self._rows * self.dimension * 2
+        path = self._data_path(VECTORS_FILE)
+        if os.path.exists(path) and os.path.getsize(path) > vectors_size:
+            os.truncate(path, vectors_size)
+
+    def modify(self, metadata: Optional[dict] = None):
+        with self._write_lock():
+            record = {"op": "metadata", "metadata": metadata}
+            if self.dimension is None and metadata and "embedding_dimension" in metadata:
+                record["dimension"] = metadata["embedding_dimension"]
+            self._append_log(record)
+            self._refresh()
+
+    def add(self, ids: List[str], embeddings, documents: List[str], metadatas: Optional[List[dict]] = None):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms == 0, 1.0, norms)).astype(np.float16)
+        metadatas = metadatas or [{} for _ in ids]
+        doc_ids = {m.get("document_id") for m in metadatas}
+        if len(doc_ids) != 1:
+            raise ValueError("Every chunk in one add() must belong to the same document")
+
+        with self._write_lock():
+            if self.dimension is None:
+                self._append_log({"op": "metadata", "metadata": self.metadata, "dimension": vectors.shape[1]})
+                self._refresh()
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dim embeddings, got {vectors.shape[1]}")
+            self._truncate_to_log()
+
+            spans = []
+            with open(self._data_path(TEXTS_FILE), "ab") as f:
+                offset = f.tell()
+                for text in documents:
+                    data = text.encode("utf-8")
+                    f.write(data)
+                    spans.append((offset, len(data)))
+                    offset += len(data)
+            with open(self._data_path(VECTORS_FILE), "ab") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._append_log({
+                "op": "add",
+                "doc": doc_ids.pop(),
+                "row": self._rows,
+                "ids": list(ids),
+                "texts": spans,
+                "metadatas": metadatas
+            })
+            self._refresh()
+
+    def delete(self, where: dict):
+        """Tombstone every chunk of the where filter's documents (space is
+        reclaimed by compact())"""
+        with self._write_lock():
+            for doc_id in self._where_doc_ids(where) or []:
+                if doc_id in self._doc_rows:
+                    self._append_log({"op": "delete", "doc": doc_id})
+            self._refresh()
+
+    def compact(self) -> dict:
+        """Rewrite the index without deleted rows. The live rows go to a new
+        generation of data files and a new log, which atomically replaces
+        the old one; the old generation's files are then removed."""
+        with self._write_lock():
+            before = sum(self.disk_usage().values())
+            rows_before = self._rows
+            live = {doc: [row for row in rows if self._alive[row]] for doc, rows in self._doc_rows.items()}
+            live_rows = sum(len(rows) for rows in live.values())
+            if live_rows == rows_before:
+                return {"rows_before": rows_before, "rows_after": rows_before,
+                        "bytes_before": before, "bytes_after": before, "bytes_reclaimed": 0}
+
+            old_generation = self._generation
+            generation = old_generation + 1
+            records = [
+                {"op": "generation", "generation": generation},
+                {"op": "metadata", "metadata": self.metadata, "dimension": self.dimension}
+            ]
+            row = 0
+            text_offset = 0
+            with open(self._file(data_file(VECTORS_FILE, generation)), "wb") as vectors_file, \
+                    open(self._file(data_file(TEXTS_FILE, generation)), "wb") as texts_file:
+                for doc, rows in live.items():
+                    if not rows:
+                        continue
+                    for start in range(0, len(rows), self.block_rows):
+                        vectors_file.write(np.asarray(self._vectors[rows[start:start + self.block_rows]]).tobytes())
+                    spans = []
+                    for text in self._texts(rows):
+                        data = text.encode("utf-8")
+                        texts_file.write(data)
+                        spans.append((text_offset, len(data)))
+                        text_offset += len(data)
+                    records.append({
+                        "op": "add",
+                        "doc": doc,
+                        "row": row,
+                        "ids": [self._ids[r] for r in rows],
+                        "texts": spans,
+                        "metadatas": [self._metadatas[r] for r in rows]
+                    })
+                    row += len(rows)
+                for f in (vectors_file, texts_file):
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            tmp_path = self._file(LOG_FILE + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(json.dumps(record).encode() + b"\n" for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._file(LOG_FILE))
+            for name in (VECTORS_FILE, TEXTS_FILE):
+                try:
+                    os.remove(self._file(data_file(name, old_generation)))
+                except FileNotFoundError:
+                    pass
+            self._refresh()
+            after = sum(self.disk_usage().values())
+            return {"rows_before": rows_before, "rows_after": self._rows,
+                    "bytes_before": before, "bytes_after": after, "bytes_reclaimed": before - after}
+
+    # Reads
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+    def _texts(self, rows) -> List[str]:
+        if not len(rows):
+            return []
+        self._open_texts()
+        texts = []
+        for row in rows:
+            offset, length = self._text_spans[row]
+            texts.append(os.pread(self._texts_fd, length, offset).decode("utf-8"))
+        return texts
+
+    def _result(self, rows, include: List[str]) -> dict:
+        result = {"ids": [self._ids[row] for row in rows]}
+        if "documents" in include:
+            result["documents"] = self._texts(rows)
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[row] for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [np.asarray(self._vectors[row], dtype=np.float32) for row in rows]
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None,
+            limit: Optional[int] = None, offset: int = 0) -> dict:
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            self._refresh()
+            if ids is None:
+                rows = np.flatnonzero(self._alive[:self._rows])
+                rows = rows[offset:offset + limit if limit is not None else None].tolist()
+            else:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+            return self._result(rows, include)
+
+    def peek(self, limit: int = 10) -> dict:
+        with self._lock:
+            self._refresh()
+            rows = np.flatnonzero(self._alive[:self._rows])[:limit].tolist()
+            return self._result(rows, ["documents", "metadatas", "embeddings"])
+
+    def _where_doc_ids(self, where: Optional[dict]) -> Optional[List[str]]:
+        """Document ids selected by a Chroma-style where filter (None: all)"""
+        if not where:
+            return None
+        if set(where) != {"document_id"}:
+            raise ValueError(f"Unsupported filter {where!r}: only document_id is indexed")
+        condition = where["document_id"]
+        if isinstance(condition, dict):
+            if set(condition) != {"$in"}:
+                raise ValueError(f"Unsupported document_id condition {condition!r}")
+            return list(condition["$in"])
+        return [condition]
+
+    def _score_top_k(self, queries: np.ndarray, vectors: np.ndarray, rows: np.ndarray, k: int,
+                     best_rows: np.ndarray, best_scores: np.ndarray):
+        """Merge the scores of `vectors` (matrix rows `rows`) into the running top-k"""
+        scores = queries @ np.asarray(vectors, dtype=np.float32).T
+        scores = np.concatenate([best_scores, scores], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(rows, (len(queries), len(rows)))], axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            rows = np.take_along_axis(rows, keep, axis=1)
+        return rows, scores
+
+    def top_k(self, queries: np.ndarray, k: int, doc_ids: Optional[List[str]] = None):
+        """Exact top-k by dot product for a (q, dim) batch of queries,
+        optionally restricted to some documents. Returns (rows, scores) lists
+        per query, best first.
+
+        Unfiltered (or broad) searches scan the matrix once in blocks
+        converted to float32, so all queries share one matrix multiply per
+        block; a selective doc_ids filter gathers and scores only its rows."""
+        return self._top_k(queries, k, doc_ids)[:2]
+
+    def _top_k(self, queries: np.ndarray, k: int, doc_ids: Optional[List[str]] = None):
+        # Also returns the generation the rows refer to (the scan runs unlocked)
+        with self._lock:
+            self._refresh()
+            generation = self._generation
+            if self._vectors is None or k <= 0:
+                return [[] for _ in queries], [[] for _ in queries], generation
+            alive = self._alive[:self._rows]
+            selected = None
+            if doc_ids is not None:
+                selected = np.array(
+                    sorted(row for d in set(doc_ids) for row in self._doc_rows.get(d, ()) if alive[row]),
+                    dtype=np.int64
+                )
+            vectors = self._vectors
+
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        if selected is not None and len(selected) <= self.block_rows:
+            if len(selected):
+                best_rows, best_scores = self._score_top_k(
+                    queries, vectors[selected], selected, k, best_rows, best_scores
+                )
+        else:
+            if selected is not None:
+                mask = np.zeros(len(alive), dtype=bool)
+                mask[selected] = True
+                alive = mask
+            for start in range(0, len(vectors), self.block_rows):
+                block_alive = alive[start:start + self.block_rows]
+                if not block_alive.any():
+                    continue
+                rows = np.arange(start, start + len(block_alive))
+                if not block_alive.all():
+                    rows = rows[block_alive]
+                    block = vectors[rows]
+                else:
+                    block = vectors[start:start + self.block_rows]
+                best_rows, best_scores = self._score_top_k(queries, block, rows, k, best_rows, best_scores)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return best_rows.tolist(), best_scores.tolist(), generation
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[dict] = None,
+              include: Optional[List[str]] = None) -> dict:
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+        doc_ids = self._where_doc_ids(where)
+        while True:
+            all_rows, all_scores, generation = self._top_k(queries, n_results, doc_ids=doc_ids)
+            self._lock.acquire()
+            if generation == self._generation:
+                break
+            # Compacted while scanning: row numbers changed, search again
+            self._lock.release()
+
+        results = {"ids": []}
+        for key in ("documents", "metadatas", "embeddings", "distances"):
+            if key in include:
+                results[key] = []
+        try:
+            for rows, scores in zip(all_rows, all_scores):
+                part = self._result(rows, include)
+                results["ids"].append(part["ids"])
+                for key in ("documents", "metadatas", "embeddings"):
+                    if key in include:
+                        results[key].append(part[key])
+                if "distances" in include:
+                    results["distances"].append([2.0 - 2.0 * s for s in scores])
+        finally:
+            self._lock.release()
+        return results
+
+    def disk_usage(self) -> dict:
+        sizes = {}
+        for name in (VECTORS_FILE, TEXTS_FILE, LOG_FILE):
+            path = self._file(name) if name == LOG_FILE else self._data_path(name)
+            try:
+                sizes[name] = os.path.getsize(path)
+            except FileNotFoundError:
+                sizes[name] = 0
+        return sizes
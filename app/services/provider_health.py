@@ -0,0 +1,130 @@
+import time
+import threading
+from collections import deque
+from typing import Optional
+from ..config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised when a call is attempted on a provider whose circuit is open"""
+
+class ProviderStats:
+    """Rolling latency and error statistics for one provider"""
+
+    def __init__(self, alpha: Optional[float] = None):
+        self.alpha = alpha if alpha is not None else settings.PROVIDER_EWMA_ALPHA
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.calls = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        # Recent successful call latencies (seconds), used for percentiles
+        self.latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.calls += 1
+            self.consecutive_failures = 0
+            self.latencies.append(latency)
+            self.error_rate = (1 - self.alpha) * self.error_rate
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+
+    def record_failure(self, error: str):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        """Observed latency at the given percentile, or None without samples"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> dict:
+        return {
+            "ewma_latency": self.ewma_latency,
+            "p90_latency": self.latency_percentile(90),
+            "error_rate": round(self.error_rate, 4),
+            "consecutive_failures": self.consecutive_failures,
+            "calls": self.calls,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures; open -> half-open after a
+    cool-down, letting a single probe call through to decide the next state"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _cooled_down(self) -> bool:
+        return self.clock() - self.opened_at >= settings.BREAKER_RESET_SECONDS
+
+    def is_available(self) -> bool:
+        """Whether a call could be made right now (no state change)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return self._cooled_down()
+            return not self.probe_in_flight
+
+    def before_call(self):
+        """Claim permission for a call, raising CircuitOpenError if refused"""
+        with self._lock:
+            if self.state == OPEN and self._cooled_down():
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == OPEN:
+                raise CircuitOpenError("circuit open")
+            if self.state == HALF_OPEN:
+                if self.probe_in_flight:
+                    raise CircuitOpenError("circuit half-open, probe in flight")
+                self.probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(self, stats: ProviderStats):
+        with self._lock:
+            tripped = (
+                stats.consecutive_failures >= settings.BREAKER_FAILURE_THRESHOLD
+                or (stats.calls >= settings.BREAKER_MIN_CALLS
+                    and stats.error_rate >= settings.BREAKER_ERROR_RATE_THRESHOLD)
+            )
+            if self.state == HALF_OPEN or tripped:
+                self.state = OPEN
+                self.opened_at = self.clock()
+            self.probe_in_flight = False
+
+    def release(self):
+        """Give back a half-open probe slot without recording an outcome"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def to_dict(self) -> dict:
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = max(0.0, settings.BREAKER_RESET_SECONDS - (self.clock() - self.opened_at))
+        return {"state": self.state, "retry_in_seconds": retry_in}
@@ -0,0 +1,153 @@
+import os
+import time
+import fcntl
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from ..config import settings
+
+# The corpus version (at CORPUS_VERSION_PATH) is shared by every worker
+# process; bumped whenever documents are added or deleted so cached answers
+# never outlive the corpus they saw
+_version_lock = threading.Lock()
+
+def get_corpus_version() -> int:
+    """Current corpus version (0 if nothing has been ingested yet)"""
+    try:
+        with open(settings.CORPUS_VERSION_PATH) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def bump_corpus_version() -> int:
+    """Advance the corpus version, invalidating all cached answers"""
+    path = settings.CORPUS_VERSION_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Serialize the read-modify-write across threads and worker processes
+    with _version_lock, open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            version = get_corpus_version() + 1
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(version))
+            os.replace(tmp_path, path)
+            return version
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+class SemanticCache:
+    """LRU + TTL cache of answers keyed by query embedding.
+
+    A lookup hits when a previously answered query with the same retrieval
+    key (max_chunks, document filter and retrieval mode/weights, as built by
+    the query API) and corpus version has cosine similarity >= threshold
+    with the new one."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (embedding, retrieval key, payload, stored_at)
+        self._next_key = 0
+        self._version = get_corpus_version()
+        self._matrix = None  # stacked embeddings, rebuilt lazily after changes
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self):
+        version = get_corpus_version()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _evict(self, key):
+        del self._entries[key]
+        self._matrix = None
+
+    def lookup(self, embedding, k: int) -> Optional[dict]:
+        """Return the cached payload for a similar enough query, or None"""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version()
+
+            # Drop expired entries
+            now = self.clock()
+            for key in [key for key, entry in self._entries.items() if now - entry[3] > self.ttl_seconds]:
+                self._evict(key)
+                self.evictions += 1
+
+            if self._entries:
+                if self._matrix is None or self._matrix.shape[1] != len(query):
+                    # Entries embedded by another model (an index version switch) never match
+                    self._matrix_keys = [key for key, entry in self._entries.items() if len(entry[0]) == len(query)]
+                    self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys]) \
+                        if self._matrix_keys else np.zeros((0, len(query)), dtype=np.float32)
+                scores = self._matrix @ query
+                for index in np.argsort(-scores):
+                    if scores[index] < self.threshold:
+                        break
+                    key = self._matrix_keys[index]
+                    if self._entries[key][1] == k:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return self._entries[key][2]
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding, k: int, payload: dict, corpus_version: Optional[int] = None):
+        """Cache an answer. Pass the corpus version seen before retrieval so
+        an answer computed while documents changed is not cached."""
+        with self._lock:
+            self._check_version()
+            if corpus_version is not None and corpus_version != self._version:
+                return
+            self._entries[self._next_key] = (self._normalize(embedding), k, payload, self.clock())
+            self._next_key += 1
+            self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": settings.SEMANTIC_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "corpus_version": self._version,
+                "threshold": self.threshold
+            }
+
+semantic_cache = SemanticCache(
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD
+)
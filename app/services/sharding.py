@@ -0,0 +1,303 @@
+"""Vector store sharding: chunks are split across N shards (a Chroma
+collection or a NumPy index each, in its own directory) by a hash of their
+document id, so a document lives in exactly one shard.
+
+The layout is recorded in shards.json at the store root:
+{"shards": N, "generation": G}. Generation 0 is the unsharded layout (the
+single store at the root, as before sharding); generation G >= 1 keeps its
+shards in g<G>/shard_<i>. The shard count is fixed when a store is created;
+rebalance() copies everything into a new generation with another count.
+"""
+import os
+import json
+import heapq
+import shutil
+import hashlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+MANIFEST = "shards.json"
+
+def shard_of(doc_id: str, shard_count: int) -> int:
+    """Shard of a document (stable across processes, unlike hash())"""
+    digest = hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+def chunk_document(chunk_id: str) -> str:
+    """Document id of a "<doc_id>_chunk_<i>" chunk id"""
+    return chunk_id.rsplit("_chunk_", 1)[0]
+
+def where_doc_ids(where: Optional[dict]) -> Optional[List[str]]:
+    """Document ids a where filter is limited to (None: not limited by document)"""
+    if not where or set(where) != {"document_id"}:
+        return None
+    condition = where["document_id"]
+    if isinstance(condition, dict):
+        if set(condition) != {"$in"}:
+            return None
+        return list(condition["$in"])
+    return [condition]
+
+def _document_filter(doc_ids: List[str]) -> dict:
+    if len(doc_ids) == 1:
+        return {"document_id": doc_ids[0]}
+    return {"document_id": {"$in": doc_ids}}
+
+# Layout
+
+def read_manifest(root: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_manifest(root: str, manifest: dict):
+    """Replace the manifest atomically"""
+    os.makedirs(root, exist_ok=True)
+    tmp_path = os.path.join(root, MANIFEST + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, MANIFEST))
+
+def load_manifest(root: str, shard_count: int, create: bool = True) -> dict:
+    """The store's layout. A new store gets shard_count shards; a store
+    from before sharding is one shard at the root. An existing store keeps
+    its count whatever shard_count says (see rebalance)."""
+    manifest = read_manifest(root)
+    if manifest is not None:
+        if manifest["shards"] != shard_count:
+            print(f"Vector store {root} has {manifest['shards']} shards (VECTOR_SHARDS={shard_count}); "
+                  f"rebalance it to change the count")
+        return manifest
+    existing = os.path.isdir(root) and any(name != MANIFEST for name in os.listdir(root))
+    if existing or shard_count == 1:
+        manifest = {"shards": 1, "generation": 0}
+    else:
+        manifest = {"shards": shard_count, "generation": 1}
+    if create:
+        write_manifest(root, manifest)
+    return manifest
+
+def shard_paths(root: str, manifest: dict) -> List[str]:
+    if manifest["generation"] == 0:
+        return [root]
+    generation = os.path.join(root, f"g{manifest['generation']}")
+    return [os.path.join(generation, f"shard_{i:03d}") for i in range(manifest["shards"])]
+
+# Collection API over the shards
+
+class ShardedCollection:
+    """The collection API (add/delete/get/query/count) over shards holding
+    disjoint documents. Writes go to the owning shard only; a query runs
+    on every shard that can match (all of them, or those of the filtered
+    documents) in parallel and the per-shard top-k lists, each sorted by
+    distance, are merged with a heap."""
+
+    name = "documents"
+
+    def __init__(self, shards: list):
+        self.shards = shards
+        self._pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="vector-shard")
+
+    @property
+    def metadata(self) -> Optional[dict]:
+        return self.shards[0].metadata
+
+    @property
+    def read_only(self) -> bool:
+        return any(getattr(shard, "read_only", False) for shard in self.shards)
+
+    def modify(self, metadata: Optional[dict] = None):
+        for shard in self.shards:
+            shard.modify(metadata=metadata)
+
+    def shard_of(self, doc_id: str) -> int:
+        return shard_of(doc_id, len(self.shards))
+
+    def _each(self, calls: dict) -> dict:
+        """{shard: fn} -> {shard: fn(that shard)}, in parallel when several"""
+        if len(calls) == 1:
+            (i, call), = calls.items()
+            return {i: call(self.shards[i])}
+        futures = {i: self._pool.submit(call, self.shards[i]) for i, call in calls.items()}
+        return {i: future.result() for i, future in futures.items()}
+
+    def _route(self, where: Optional[dict]) -> dict:
+        """{shard: where clause} for the shards that can hold matches, each
+        filter narrowed to that shard's documents"""
+        doc_ids = where_doc_ids(where)
+        if doc_ids is None:
+            return {i: where for i in range(len(self.shards))}
+        groups = {}
+        for doc_id in dict.fromkeys(doc_ids):
+            groups.setdefault(self.shard_of(doc_id), []).append(doc_id)
+        return {i: _document_filter(ids) for i, ids in groups.items()}
+
+    def _group_ids(self, ids: List[str]) -> dict:
+        groups = {}
+        for chunk_id in ids:
+            groups.setdefault(self.shard_of(chunk_document(chunk_id)), []).append(chunk_id)
+        return groups
+
+    # Writes
+
+    def add(self, ids: List[str], embeddings, documents: List[str], metadatas: Optional[List[dict]] = None):
+        rows = {}
+        for row, chunk_id in enumerate(ids):
+            metadata = metadatas[row] if metadatas else None
+            doc_id = (metadata or {}).get("document_id") or chunk_document(chunk_id)
+            rows.setdefault(self.shard_of(doc_id), []).append(row)
+
+        def add_rows(rows):
+            def add(shard):
+                shard.add(
+                    ids=[ids[row] for row in rows],
+                    embeddings=[embeddings[row] for row in rows],
+                    documents=[documents[row] for row in rows],
+                    metadatas=[metadatas[row] for row in rows] if metadatas else None
+                )
+            return add
+        self._each({i: add_rows(group) for i, group in rows.items()})
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None):
+        if ids is not None:
+            self._each({i: (lambda shard, group=group: shard.delete(ids=group))
+                        for i, group in self._group_ids(ids).items()})
+        else:
+            self._each({i: (lambda shard, clause=clause: shard.delete(where=clause))
+                        for i, clause in self._route(where).items()})
+
+    def compact(self) -> Optional[dict]:
+        """Compact every shard (NumPy index; None for Chroma), totals summed"""
+        if not hasattr(self.shards[0], "compact"):
+            return None
+        reports = [shard.compact() for shard in self.shards]
+        return {key: sum(report[key] for report in reports) for key in reports[0]}
+
+    # Reads
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards)
+
+    @staticmethod
+    def _concat(parts: list, include: List[str]) -> dict:
+        result = {"ids": [chunk_id for part in parts for chunk_id in part["ids"]]}
+        for key in ("documents", "metadatas", "embeddings"):
+            if key in include:
+                result[key] = [value for part in parts for value in part[key]]
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None,
+            limit: Optional[int] = None, offset: int = 0, where: Optional[dict] = None) -> dict:
+        include = include if include is not None else ["documents", "metadatas"]
+        if ids is not None:
+            parts = self._each({i: (lambda shard, group=group: shard.get(ids=group, include=include))
+                                for i, group in self._group_ids(ids).items()})
+            return self._concat(list(parts.values()), include)
+        if where is not None:
+            parts = self._each({i: (lambda shard, clause=clause: shard.get(where=clause, include=include))
+                                for i, clause in self._route(where).items()})
+            result = self._concat([parts[i] for i in sorted(parts)], include)
+            end = offset + limit if limit is not None else None
+            return {key: values[offset:end] for key, values in result.items()}
+        # Pages run through the shards in order
+        parts = []
+        remaining = limit
+        for shard in self.shards:
+            if remaining is not None and remaining <= 0:
+                break
+            if offset:
+                size = shard.count()
+                if offset >= size:
+                    offset -= size
+                    continue
+            part = shard.get(include=include, limit=remaining, offset=offset)
+            offset = 0
+            parts.append(part)
+            if remaining is not None:
+                remaining -= len(part["ids"])
+        return self._concat(parts, include)
+
+    def peek(self, limit: int = 10) -> dict:
+        return self.get(include=["documents", "metadatas", "embeddings"], limit=limit)
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[dict] = None,
+              include: Optional[List[str]] = None) -> dict:
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        # Distances are needed to merge
+        shard_include = list(include) + ([] if "distances" in include else ["distances"])
+        parts = self._each({
+            i: (lambda shard, clause=clause: shard.query(
+                query_embeddings=query_embeddings, n_results=n_results, where=clause, include=shard_include))
+            for i, clause in self._route(where).items()
+        })
+        keys = [key for key in ("documents", "metadatas", "embeddings", "distances") if key in include]
+        results = {"ids": [], **{key: [] for key in keys}}
+        for row in range(len(query_embeddings)):
+            # Each shard's list is sorted by distance: k-way merge, first n_results
+            ranked = heapq.merge(
+                *[[(distance, i, position) for position, distance in enumerate(part["distances"][row])]
+                  for i, part in parts.items()]
+            )
+            top = list(itertools.islice(ranked, n_results))
+            results["ids"].append([parts[i]["ids"][row][position] for _, i, position in top])
+            for key in keys:
+                results[key].append([parts[i][key][row][position] for _, i, position in top])
+        return results
+
+# Rebalancing
+
+def rebalance(root: str, shard_count: int, open_shard: Callable[[str], object],
+              drop_shard: Callable[[str], None], page_size: int = 2000) -> dict:
+    """Copy every chunk into a new generation of shard_count shards, switch
+    the manifest to it, then drop the old generation. Run it with the API
+    stopped: writes made meanwhile go to the old shards and are lost."""
+    if shard_count < 1:
+        raise ValueError("shard_count must be at least 1")
+    manifest = read_manifest(root) or load_manifest(root, 1)
+    target_manifest = {"shards": shard_count, "generation": manifest["generation"] + 1}
+    target_paths = shard_paths(root, target_manifest)
+    # Leftovers of an interrupted run
+    shutil.rmtree(os.path.dirname(target_paths[0]), ignore_errors=True)
+    target = ShardedCollection([open_shard(path) for path in target_paths])
+
+    chunks = 0
+    metadata = {}
+    for path in shard_paths(root, manifest):
+        source = open_shard(path)
+        # The embedder record carries over
+        metadata = metadata or {key: value for key, value in (source.metadata or {}).items()
+                                if key in ("embedding_model", "embedding_dimension")}
+        offset = 0
+        while True:
+            page = source.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            # One add() per document (the NumPy index takes one at a time)
+            documents = {}
+            for row, chunk_id in enumerate(page["ids"]):
+                doc_id = (page["metadatas"][row] or {}).get("document_id") or chunk_document(chunk_id)
+                documents.setdefault(doc_id, []).append(row)
+            for rows in documents.values():
+                target.add(ids=[page["ids"][row] for row in rows],
+                           embeddings=[page["embeddings"][row] for row in rows],
+                           documents=[page["documents"][row] for row in rows],
+                           metadatas=[page["metadatas"][row] for row in rows])
+            chunks += len(page["ids"])
+            offset += page_size
+    if metadata:
+        target.modify(metadata=metadata)
+    counts = [shard.count() for shard in target.shards]
+    target._pool.shutdown()
+
+    write_manifest(root, target_manifest)
+    for path in shard_paths(root, manifest):
+        drop_shard(path)
+    if manifest["generation"]:
+        shutil.rmtree(os.path.join(root, f"g{manifest['generation']}"), ignore_errors=True)
+    return {"shards_before": manifest["shards"], "shards_after": shard_count,
+            "chunks": chunks, "chunks_per_shard": counts}
@@ -0,0 +1,366 @@
+"""Embedding (and vector store) sidecar: one process loads the model and
+optionally opens the vector store, and the API workers reach both over a
+Unix domain socket instead of each keeping its own copy.
+
+Every message is one frame: a header (op or reply status, JSON length,
+matrix rows, matrix columns), a UTF-8 JSON part and a little-endian
+float32 matrix. Vectors travel in the matrix, never as JSON numbers: the
+embeddings of collection results too (split_embeddings/join_embeddings).
+"""
+import os
+import json
+import time
+import socket
+import struct
+import asyncio
+import threading
+from typing import Callable, List, Optional
+import numpy as np
+from ..config import settings
+from .embedders import Embedder
+from .embedding_batcher import EmbeddingBatcher
+from .executor import run_cpu, run_io
+
+HEADER = struct.Struct("!BIII")
+INFO, ENCODE, TOKENS, COLLECTION = 0, 1, 2, 3
+OK, ERROR = 0, 1
+
+# Collection calls a worker may make; "metadata" reads the attribute
+COLLECTION_METHODS = {"add", "delete", "get", "query", "count", "peek", "modify", "compact", "metadata"}
+
+class SidecarError(RuntimeError):
+    """The sidecar is unreachable or failed the request"""
+
+class SidecarUnavailable(SidecarError):
+    """The sidecar could not be reached"""
+
+def pack_frame(op: int, payload=None, matrix=None) -> bytes:
+    data = json.dumps(payload, default=lambda value: value.tolist()).encode() if payload is not None else b""
+    if matrix is None:
+        rows, columns, raw = 0, 0, b""
+    else:
+        matrix = np.ascontiguousarray(matrix, dtype="<f4").reshape(len(matrix), -1)
+        rows, columns = matrix.shape
+        raw = matrix.tobytes()
+    return HEADER.pack(op, len(data), rows, columns) + data + raw
+
+def unpack_frame(header: bytes, body: bytes) -> tuple:
+    """(op, payload, matrix) of a frame split after its header"""
+    op, size, rows, columns = HEADER.unpack(header)
+    payload = json.loads(body[:size]) if size else None
+    matrix = np.frombuffer(body[size:], dtype="<f4").reshape(rows, columns) if rows else None
+    return op, payload, matrix
+
+def body_size(header: bytes) -> int:
+    _, size, rows, columns = HEADER.unpack(header)
+    return size + rows * columns * 4
+
+def split_embeddings(method: str, result) -> tuple:
+    """(result, matrix) of a collection call with its embeddings moved to
+    the matrix; "embedding_rows" keeps how many there were (per query for
+    query results)"""
+    if not isinstance(result, dict) or result.get("embeddings") is None:
+        return result, None
+    result = dict(result)
+    embeddings = result.pop("embeddings")
+    if method == "query":
+        result["embedding_rows"] = [len(rows) for rows in embeddings]
+        embeddings = [vector for rows in embeddings for vector in rows]
+    else:
+        result["embedding_rows"] = len(embeddings)
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1) if len(embeddings) else None
+    return result, matrix
+
+def join_embeddings(method: str, result, matrix):
+    """Undo split_embeddings: one float32 vector per row, as the local stores return them"""
+    if not isinstance(result, dict) or "embedding_rows" not in result:
+        return result
+    rows = result.pop("embedding_rows")
+    vectors = list(matrix) if matrix is not None else []
+    if method == "query":
+        offsets = np.cumsum([0] + rows)
+        result["embeddings"] = [vectors[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    else:
+        result["embeddings"] = vectors
+    return result
+
+# Worker side
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("sidecar closed the connection")
+        received += n
+    return bytes(buffer)
+
+class SidecarClient:
+    """Blocking client, one connection per thread"""
+
+    def __init__(self, path: str, timeout: float):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.info = self.call(INFO)[0]
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    def call(self, op: int, payload=None, matrix=None) -> tuple:
+        """(reply, matrix) of one request"""
+        frame = pack_frame(op, payload, matrix)
+        while True:
+            sock = getattr(self._local, "sock", None)
+            reused = sock is not None
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                sock.sendall(frame)
+                header = _recv_exactly(sock, HEADER.size)
+                status, reply, vectors = unpack_frame(header, _recv_exactly(sock, body_size(header)))
+                break
+            except OSError as e:
+                if sock is not None:
+                    sock.close()
+                self._local.sock = None
+                # A kept-alive connection may have gone stale (sidecar restarted): one retry
+                if not reused:
+                    raise SidecarUnavailable(f"Sidecar at {self.path} unreachable: {e}") from e
+        if status == ERROR:
+            raise SidecarError(f"{reply['type']}: {reply['error']}")
+        return reply, vectors
+
+def call_collection(collection, method: str, kwargs: dict):
+    """One collection call made through the sidecar protocol"""
+    if method not in COLLECTION_METHODS:
+        raise ValueError(f"Unknown collection method {method!r}")
+    if method == "metadata":
+        return collection.metadata
+    if method == "compact" and not hasattr(collection, "compact"):
+        return None
+    return getattr(collection, method)(**kwargs)
+
+class _Fallback:
+    """This process's own copy of what the sidecar serves, opened the first
+    time the sidecar cannot be reached and used until it can again (tried
+    every EMBEDDING_SIDECAR_RETRY_SECONDS)"""
+
+    def __init__(self, open_local: Optional[Callable]):
+        self.open_local = open_local
+        self.local = None
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+
+    def run(self, remote: Callable, local: Callable):
+        """remote() through the sidecar, or local(own copy) while it is down"""
+        if time.monotonic() >= self.retry_at:
+            try:
+                result = remote()
+            except SidecarUnavailable as e:
+                if self.open_local is None:
+                    raise
+                self.retry_at = time.monotonic() + settings.EMBEDDING_SIDECAR_RETRY_SECONDS
+                print(f"{e}; working in-process until it is back")
+            else:
+                self.local = None  # back up: free the copy
+                return result
+        with self.lock:
+            if self.local is None:
+                self.local = self.open_local()
+            own = self.local
+        return local(own)
+
+class SidecarEmbedder(Embedder):
+    """The sidecar's embedding model; with load_local, a model of this
+    process's own stands in while the sidecar is unreachable"""
+
+    def __init__(self, client: SidecarClient, load_local: Optional[Callable[[], Embedder]] = None):
+        self.client = client
+        self.model_id = client.info["model_id"]
+        self.dimension = client.info["dimension"]
+        self.max_tokens = client.info["max_tokens"]
+        self._load_local = load_local
+        self._fallback = _Fallback(load_local and self._open_local)
+
+    def _open_local(self) -> Embedder:
+        embedder = self._load_local()
+        if (embedder.model_id, embedder.dimension) != (self.model_id, self.dimension):
+            raise SidecarError(f"The sidecar serves {self.model_id} (dim {self.dimension}) but this "
+                               f"process would load {embedder.model_id} (dim {embedder.dimension})")
+        return embedder
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._fallback.run(lambda: self.client.call(ENCODE, list(texts))[1].tolist(),
+                                  lambda local: local.encode(texts))
+
+    def count_tokens(self, text: str) -> int:
+        return self.count_tokens_batch([text])[0]
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        # One round trip for the lot
+        if not texts:
+            return []
+        return self._fallback.run(lambda: self.client.call(TOKENS, list(texts))[0],
+                                  lambda local: local.count_tokens_batch(texts))
+
+class SidecarCollection:
+    """The sidecar's vector collection, same API; with open_local, this
+    process opens the store itself for reads while the sidecar is
+    unreachable. Writes always go to the sidecar (and fail while it is
+    down): a worker writing the store itself would make it one of several
+    writers, and the sidecar would not see the change."""
+
+    name = "documents"
+
+    def __init__(self, client: SidecarClient, open_local: Optional[Callable] = None):
+        self.client = client
+        self._fallback = _Fallback(open_local)
+
+    def _call(self, method: str, vectors: Optional[str] = None, **kwargs):
+        # Defaults are left to the collection (the NumPy index takes fewer arguments)
+        kwargs = {key: value for key, value in kwargs.items() if value is not None}
+        return self._fallback.run(lambda: self._remote(method, vectors, dict(kwargs)),
+                                  lambda local: call_collection(local, method, kwargs))
+
+    def _write(self, method: str, vectors: Optional[str] = None, **kwargs):
+        kwargs = {key: value for key, value in kwargs.items() if value is not None}
+        return self._remote(method, vectors, kwargs)
+
+    def _remote(self, method: str, vectors: Optional[str], kwargs: dict):
+        matrix = None
+        if vectors is not None:
+            matrix = np.asarray(kwargs.pop(vectors), dtype=np.float32)
+        request = {"method": method, "kwargs": kwargs, "vectors": vectors}
+        return join_embeddings(method, *self.client.call(COLLECTION, request, matrix))
+
+    @property
+    def metadata(self) -> Optional[dict]:
+        return self._call("metadata")
+
+    def modify(self, metadata: Optional[dict] = None):
+        self._write("modify", metadata=metadata)
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        self._write("add", "embeddings", ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None):
+        self._write("delete", ids=ids, where=where)
+
+    def compact(self) -> Optional[dict]:
+        return self._write("compact")
+
+    def count(self) -> int:
+        return self._call("count")
+
+    def get(self, ids=None, include=None, limit=None, offset=None, where=None) -> dict:
+        return self._call("get", ids=ids, include=include, limit=limit, offset=offset, where=where)
+
+    def peek(self, limit: int = 10) -> dict:
+        return self._call("peek", limit=limit)
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, include=None) -> dict:
+        return self._call("query", "query_embeddings", query_embeddings=query_embeddings,
+                          n_results=n_results, where=where, include=include)
+
+_client: Optional[SidecarClient] = None
+_client_retry_at = 0.0
+_client_lock = threading.Lock()
+
+def sidecar_client() -> Optional[SidecarClient]:
+    """Client of the sidecar at EMBEDDING_SIDECAR_SOCKET, None when none is
+    configured or it is not running (the worker then loads its own model);
+    a missing sidecar is looked for again every EMBEDDING_SIDECAR_RETRY_SECONDS"""
+    global _client, _client_retry_at
+    path = settings.EMBEDDING_SIDECAR_SOCKET
+    if _client is not None or not path or time.monotonic() < _client_retry_at:
+        return _client
+    with _client_lock:
+        if _client is None and time.monotonic() >= _client_retry_at:
+            try:
+                _client = SidecarClient(path, settings.EMBEDDING_SIDECAR_TIMEOUT_SECONDS)
+            except SidecarError as e:
+                _client_retry_at = time.monotonic() + settings.EMBEDDING_SIDECAR_RETRY_SECONDS
+                print(f"{e}; using the in-process embedding model")
+        return _client
+
+# Sidecar side
+
+class SidecarServer:
+    """Serves an embedder of its own (and the vector store with index).
+    Short encode requests from all workers are micro-batched together."""
+
+    def __init__(self, path: str, index: bool = False):
+        self.path = path
+        self.index = index
+        self.embedder = None
+        self.collection = None
+        self.batcher = None
+        self.requests = 0
+
+    async def _dispatch(self, op: int, payload, matrix) -> tuple:
+        if op == INFO:
+            return {"model_id": self.embedder.model_id, "dimension": self.embedder.dimension,
+                    "max_tokens": self.embedder.max_tokens, "index": self.index, "pid": os.getpid()}, None
+        if op == ENCODE:
+            if len(payload) >= self.batcher.max_batch_size:
+                vectors = await run_cpu(self.embedder.encode, payload)
+            else:
+                vectors = await asyncio.gather(*(self.batcher.encode(text) for text in payload))
+            return None, np.asarray(vectors, dtype=np.float32).reshape(len(payload), -1)
+        if op == TOKENS:
+            return await run_cpu(self.embedder.count_tokens_batch, payload), None
+        if op == COLLECTION and self.index:
+            kwargs = payload["kwargs"]
+            if payload["vectors"]:
+                kwargs[payload["vectors"]] = matrix
+            return await run_io(self._collection_call, payload["method"], kwargs)
+        raise ValueError(f"Unsupported sidecar op {op}" + (" (started without --index)" if op == COLLECTION else ""))
+
+    def _collection_call(self, method: str, kwargs: dict) -> tuple:
+        return split_embeddings(method, call_collection(self.collection, method, kwargs))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                    op, payload, matrix = unpack_frame(header, await reader.readexactly(body_size(header)))
+                except asyncio.IncompleteReadError:
+                    break  # worker disconnected
+                self.requests += 1
+                try:
+                    reply, vectors = await self._dispatch(op, payload, matrix)
+                    status = OK
+                except Exception as e:
+                    status, reply, vectors = ERROR, {"type": type(e).__name__, "error": str(e)}, None
+                writer.write(pack_frame(status, reply, vectors))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, ready: Optional[threading.Event] = None):
+        from .vector_store import load_local_embedder, open_local_collection
+        # Load before accepting connections
+        self.embedder = load_local_embedder()
+        self.embedder.encode(["warm-up"])
+        self.batcher = EmbeddingBatcher(self.embedder.encode, settings.EMBED_BATCH_MAX_SIZE,
+                                        settings.EMBED_BATCH_MAX_WAIT_MS)
+        if self.index:
+            self.collection = open_local_collection(self.embedder)
+        if os.path.exists(self.path):
+            os.remove(self.path)  # left by a previous run
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        print(f"Sidecar serving {self.embedder.model_id}"
+              f"{' and the vector store' if self.index else ''} on {self.path}")
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,74 @@
+import time
+import threading
+from typing import Callable
+
+# Components that must be initialized before the API reports ready
+REQUIRED_COMPONENTS = ["database", "vector_store", "embedder"]
+
+_components = {}  # name -> {"status", "seconds", "error"}
+_lock = threading.Lock()
+_warm_up_thread = None
+
+def timed_init(name: str, init: Callable):
+    """Run one heavy initialization step, recording its status and duration"""
+    with _lock:
+        _components[name] = {"status": "starting"}
+    start = time.perf_counter()
+    try:
+        result = init()
+    except Exception as e:
+        with _lock:
+            _components[name] = {
+                "status": "failed",
+                "seconds": round(time.perf_counter() - start, 4),
+                "error": str(e)
+            }
+        raise
+    with _lock:
+        _components[name] = {"status": "ready", "seconds": round(time.perf_counter() - start, 4)}
+    return result
+
+def component_status() -> dict:
+    with _lock:
+        return {name: dict(info) for name, info in _components.items()}
+
+def readiness() -> dict:
+    """Ready once every required component has been initialized"""
+    components = component_status()
+    ready = all(components.get(name, {}).get("status") == "ready" for name in REQUIRED_COMPONENTS)
+    return {
+        "ready": ready,
+        "warming_up": _warm_up_thread is not None and _warm_up_thread.is_alive(),
+        "components": components
+    }
+
+def warm_up():
+    """Initialize heavy resources ahead of the first request"""
+    from .doc_store import init_db
+    from .vector_store import get_collection, embed_chunks, backfill_lexical_index
+    from .llm_providers import setup_providers
+
+    steps = [
+        ("database", init_db),
+        # Loads the model and runs one dummy encode so the first query is fast
+        ("embedder", lambda: embed_chunks(["warm-up"])),
+        # Refuses to open if the collection was built with another embedder
+        ("vector_store", get_collection),
+        # Documents ingested before the BM25 index existed
+        ("lexical_index", lambda: timed_init("lexical_index", backfill_lexical_index)),
+        ("llm_providers", setup_providers),
+    ]
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}")
+
+def start_warm_up():
+    """Run warm_up() in a background thread (idempotent)"""
+    global _warm_up_thread
+    with _lock:
+        if _warm_up_thread is not None:
+            return
+        _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    _warm_up_thread.start()
@@ -1,60 +1,647 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+import json
+import fcntl
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
 import os
+from ..config import settings
+from .semantic_cache import bump_corpus_version
+from .embedding_batcher import EmbeddingBatcher
+from .embedders import Embedder, create_embedder
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .numpy_index import NumpyVectorIndex
+from .sharding import MANIFEST, ShardedCollection, load_manifest, shard_paths, rebalance
+from .sidecar import SidecarCollection, SidecarEmbedder, sidecar_client
+from .startup import timed_init
+from . import metrics
 
-# Initialize ChromaDB with persistent storage
-client = chromadb.PersistentClient(path="/app/chroma_data")
-collection = client.get_or_create_collection("documents")
+# Vector collection (ChromaDB or the NumPy index, split into shards when VECTOR_SHARDS > 1) and
+# the embedding model are created on first use (or by the startup warm-up), not at import time
+_collection = None
+_embedder = None
+_collection_lock = threading.Lock()
+_embedder_lock = threading.Lock()
 
-# Initialize local embedding model (free)
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+RETRIEVAL_MODES = ["dense", "lexical", "hybrid"]
 
-def add_document_chunks(doc_id: str, chunks: list[str]) -> bool:
-    """Add document chunks to vector database"""
+# BM25 index over the same chunks, kept in step with the collection
+lexical_index = LexicalIndex(settings.LEXICAL_INDEX_PATH)
+
+# Index version in use (see index_versions): where its vector store and
+# lexical index live and the embedder and chunking it was built with. None
+# is the configured default. Switched together with the collection, the
+# embedder and the lexical index under _switch_lock; index_writes() keeps a
+# switch from landing between chunks being built and stored.
+_index_config = None
+_index_generation = 0
+_switch_lock = threading.Lock()
+_write_lock = threading.RLock()
+_write_depth = 0      # nesting of index_writes() in the thread holding _write_lock
+_write_file = None    # its WRITE_LOCK file, flocked by the outermost one
+
+# Written in the default vector store directory by a switch so every
+# worker process follows it (checked on each use, like the corpus version)
+ACTIVE_INDEX = "active_index.json"
+_active_stamp = None
+# Beside it: flocked shared by chunk writes, exclusively by a switch
+WRITE_LOCK = "index_writes.lock"
+
+class EmbedderMismatchError(RuntimeError):
+    """The configured embedder is not the one the collection was built with"""
+
+def check_embedder(collection, embedder: Embedder):
+    """Refuse to use a collection built by a different embedding model.
+    Collections without a record (new, or from before it was kept) get the
+    current model recorded, after checking a stored vector's dimension."""
+    metadata = collection.metadata or {}
+    expected = {"embedding_model": embedder.model_id, "embedding_dimension": embedder.dimension}
+    if "embedding_model" in metadata:
+        recorded = {key: metadata.get(key) for key in expected}
+        if recorded != expected:
+            raise EmbedderMismatchError(
+                f"Collection '{collection.name}' was built with {recorded['embedding_model']} "
+                f"(dim {recorded['embedding_dimension']}) but EMBEDDER_BACKEND gives "
+                f"{embedder.model_id} (dim {embedder.dimension}). Re-index the documents "
+                f"or point CHROMA_PATH at a fresh directory."
+            )
+        return
+
+    if collection.count() > 0:
+        stored = collection.peek(1)["embeddings"][0]
+        if len(stored) != embedder.dimension:
+            raise EmbedderMismatchError(
+                f"Collection '{collection.name}' holds {len(stored)}-dim vectors but "
+                f"{embedder.model_id} produces {embedder.dimension}-dim vectors"
+            )
+    if getattr(collection, "read_only", False):
+        return  # a read/write process records it
+    collection.modify(metadata={**metadata, **expected})
+
+def _vector_root() -> str:
+    return settings.NUMPY_INDEX_PATH if settings.VECTOR_BACKEND == "numpy" else settings.CHROMA_PATH
+
+def default_index_config() -> dict:
+    """The index version described by the settings"""
+    return {
+        "vector_path": _vector_root(),
+        "lexical_path": settings.LEXICAL_INDEX_PATH,
+        "embedder_backend": settings.EMBEDDER_BACKEND,
+        "embedder_model": settings.EMBEDDER_MODEL,
+        "embedder_model_path": settings.EMBEDDER_MODEL_PATH,
+        "embedder_dimension": settings.EMBEDDER_DIMENSION,
+        "chunk_max_tokens": settings.CHUNK_MAX_TOKENS,
+        "chunk_overlap_tokens": settings.CHUNK_OVERLAP_TOKENS
+    }
+
+def index_config() -> dict:
+    """The active index version's paths, embedder and chunking"""
+    _check_active_index()
+    return dict(_index_config) if _index_config is not None else default_index_config()
+
+def create_index_embedder(config: dict) -> Embedder:
+    """The embedder an index version was built with"""
+    return create_embedder(settings.model_copy(update={
+        "EMBEDDER_BACKEND": config["embedder_backend"],
+        "EMBEDDER_MODEL": config["embedder_model"],
+        "EMBEDDER_MODEL_PATH": config["embedder_model_path"],
+        "EMBEDDER_DIMENSION": config["embedder_dimension"]
+    }))
+
+def _open_shard(path: str):
+    """The VECTOR_BACKEND store in one directory"""
+    if settings.VECTOR_BACKEND == "numpy":
+        # Memory-mapped float16 matrix, exact search (same collection API)
+        return NumpyVectorIndex(path, read_only=settings.NUMPY_INDEX_READ_ONLY)
+    import chromadb
+    # Initialize ChromaDB with persistent storage
+    return chromadb.PersistentClient(path=path).get_or_create_collection("documents")
+
+def _drop_shard(path: str):
+    """Delete one shard's data (after a rebalance copied it)"""
+    if settings.VECTOR_BACKEND == "numpy":
+        for name in os.listdir(path):
+            if name not in (MANIFEST, ACTIVE_INDEX, WRITE_LOCK) and os.path.isfile(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+    else:
+        import chromadb
+        chromadb.PersistentClient(path=path).delete_collection("documents")
+
+def open_local_collection(embedder: Embedder, root: Optional[str] = None):
+    """The vector store of this process (the sidecar's when it serves one);
+    root: an index version's directory (default: the active version's)"""
+    if settings.VECTOR_BACKEND not in ("chroma", "numpy"):
+        raise ValueError(f"Unknown VECTOR_BACKEND {settings.VECTOR_BACKEND!r}, expected 'chroma' or 'numpy'")
+    root = root or index_config()["vector_path"]
+    read_only = settings.VECTOR_BACKEND == "numpy" and settings.NUMPY_INDEX_READ_ONLY
+    manifest = load_manifest(root, settings.VECTOR_SHARDS, create=not read_only)
+    paths = shard_paths(root, manifest)
+    if len(paths) == 1:
+        collection = _open_shard(paths[0])
+    else:
+        collection = ShardedCollection([_open_shard(path) for path in paths])
+    check_embedder(collection, embedder)
+    return collection
+
+def _open_collection():
+    # The sidecar serves the default index version only
+    client = sidecar_client() if _index_config is None else None
+    if client is not None and client.info["index"]:
+        # Opened (and checked) by the sidecar; by this process while it is down
+        return _sidecar_collection(client)
+    return open_local_collection(get_embedder())
+
+def _sidecar_collection(client) -> SidecarCollection:
+    return SidecarCollection(client, lambda: open_local_collection(get_embedder(), default_index_config()["vector_path"]))
+
+def load_local_embedder() -> Embedder:
+    # Backend chosen by EMBEDDER_BACKEND (local sentence-transformers by default)
+    if _index_config is not None:
+        return create_index_embedder(_index_config)
+    return create_embedder(settings)
+
+def _load_embedder() -> Embedder:
+    # The sidecar's model when one is running (and serves this version), else this process's own
+    client = sidecar_client() if _index_config is None else None
+    if client is not None:
+        return SidecarEmbedder(client, lambda: create_embedder(settings))
+    return load_local_embedder()
+
+def _attach_sidecar():
+    """Move a process that started without the sidecar over to it once it
+    is running"""
+    global _collection, _embedder
+    embedder = _embedder
+    if (embedder is None or isinstance(embedder, SidecarEmbedder) or _index_config is not None
+            or not settings.EMBEDDING_SIDECAR_SOCKET):
+        return
+    client = sidecar_client()
+    if client is None:
+        return
+    with _switch_lock:
+        if _embedder is not embedder or _index_config is not None:
+            return
+        _embedder = SidecarEmbedder(client, lambda: create_embedder(settings))
+        if client.info["index"] and _collection is not None:
+            _collection = _sidecar_collection(client)
+
+def _switch_to(config: Optional[dict], collection=None, embedder=None, lexical=None):
+    # Caller holds _switch_lock; collection/embedder None are opened on next use
+    global _index_config, _index_generation, _collection, _embedder, lexical_index
+    if config == default_index_config():
+        config = None
+    if collection is None and config == _index_config:
+        return
+    _index_config = config
+    _collection, _embedder = collection, embedder
+    lexical_index = lexical or LexicalIndex((config or default_index_config())["lexical_path"])
+    _index_generation += 1
+
+def _check_active_index():
+    """Follow a version switch made by another process"""
+    global _active_stamp
+    path = os.path.join(_vector_root(), ACTIVE_INDEX)
     try:
-        # Generate unique IDs for each chunk
-        chunk_ids = [f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
-        
-        # Generate embeddings for chunks
-        embeddings = embedder.encode(chunks).tolist()
-        
-        # Create metadata for each chunk
-        metadatas = [{"document_id": doc_id, "chunk_index": i} for i in range(len(chunks))]
-        
-        # Add to ChromaDB
-        collection.add(
-            ids=chunk_ids,
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=metadatas
-        )
+        stamp = os.stat(path).st_mtime_ns
+    except OSError:
+        stamp = None
+    if stamp == _active_stamp:
+        return
+    with _switch_lock:
+        if stamp == _active_stamp:
+            return
+        config = None
+        if stamp is not None:
+            try:
+                with open(path) as f:
+                    config = json.load(f)
+            except (OSError, ValueError):
+                return  # replaced while reading; next use retries
+        _active_stamp = stamp
+        _switch_to(config)
+
+def activate_index(config: dict, collection=None, embedder=None, lexical=None):
+    """Switch every worker process to an index version: this one at once
+    (to the given open collection, embedder and lexical index), the others
+    on their next use. Cached answers are invalidated."""
+    global _active_stamp
+    path = os.path.join(_vector_root(), ACTIVE_INDEX)
+    with _switch_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(config, f)
+        os.replace(tmp_path, path)
+        _active_stamp = os.stat(path).st_mtime_ns
+        _switch_to(config, collection, embedder, lexical)
+    bump_corpus_version()
+
+@contextmanager
+def index_writes(exclusive: bool = False):
+    """Lock held while storing or removing chunks, in every worker process:
+    a version switch (exclusive=True) waits for the writes in progress, and
+    writes after it see the new version (check index_snapshot().generation
+    inside it). Reentrant within a thread; the outermost use picks the mode."""
+    global _write_depth, _write_file
+    with _write_lock:
+        if _write_depth == 0:
+            path = os.path.join(_vector_root(), WRITE_LOCK)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_file = open(path, "a")
+            fcntl.flock(_write_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        _write_depth += 1
+        try:
+            yield
+        finally:
+            _write_depth -= 1
+            if _write_depth == 0:
+                fcntl.flock(_write_file, fcntl.LOCK_UN)
+                _write_file.close()
+                _write_file = None
+
+@dataclass
+class IndexSnapshot:
+    """The active index version's parts, taken together"""
+    generation: int
+    config: dict
+    collection: object
+    embedder: Embedder
+    lexical: LexicalIndex
+
+def index_snapshot() -> IndexSnapshot:
+    """Collection, embedder and lexical index of one index version, so a
+    switch in the middle of a request cannot mix two versions"""
+    while True:
+        generation = _index_generation
+        collection, embedder = get_collection(), get_embedder()
+        with _switch_lock:
+            if generation == _index_generation:
+                config = dict(_index_config) if _index_config is not None else default_index_config()
+                return IndexSnapshot(generation, config, collection, embedder, lexical_index)
+
+def get_collection():
+    """The "documents" collection of VECTOR_BACKEND (opened on first use; a
+    ShardedCollection over the shards when there are several)"""
+    global _collection
+    _check_active_index()
+    _attach_sidecar()
+    collection = _collection
+    while collection is None:
+        with _collection_lock:
+            collection = _collection
+            if collection is None:
+                generation = _index_generation
+                collection = timed_init("vector_store", _open_collection)
+                with _switch_lock:
+                    # Opened for a version switched away from meanwhile: open again
+                    if generation != _index_generation:
+                        collection = None
+                    else:
+                        _collection = collection
+    return collection
+
+def get_embedder() -> Embedder:
+    """The embedding model (loaded on first use)"""
+    global _embedder
+    _check_active_index()
+    _attach_sidecar()
+    embedder = _embedder
+    while embedder is None:
+        with _embedder_lock:
+            embedder = _embedder
+            if embedder is None:
+                generation = _index_generation
+                embedder = timed_init("embedder", _load_embedder)
+                with _switch_lock:
+                    if generation != _index_generation:
+                        embedder = None
+                    else:
+                        _embedder = embedder
+    return embedder
+
+def embed_chunks(chunks: list[str], embedder: Optional[Embedder] = None) -> list[list[float]]:
+    """Embed a batch of document chunks (with the active embedder by default)"""
+    embedder = embedder or get_embedder()
+    start = time.perf_counter()
+    embeddings = embedder.encode(chunks)
+    metrics.record_embedding(len(chunks), time.perf_counter() - start)
+    return embeddings
+
+def store_chunks(collection, lexical: LexicalIndex, doc_id: str, chunks: list[str],
+                 embeddings: list[list[float]], metadatas: Optional[list[dict]] = None):
+    """Add a document's chunks to one index version's vector store and lexical index"""
+    # Generate unique IDs for each chunk
+    chunk_ids = [f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
+
+    # Create metadata for each chunk
+    # indexed_at lets compaction tell orphans from documents still being ingested
+    indexed_at = time.time()
+    metadatas = [
+        {**(metadatas[i] if metadatas else {}), "document_id": doc_id, "chunk_index": i,
+         "indexed_at": indexed_at}
+        for i in range(len(chunks))
+    ]
+
+    collection.add(
+        ids=chunk_ids,
+        embeddings=embeddings,
+        documents=chunks,
+        metadatas=metadatas
+    )
+    lexical.add_document(doc_id, chunk_ids, chunks)
+
+def add_document_chunks(doc_id: str, chunks: list[str], embeddings: Optional[list[list[float]]] = None,
+                        metadatas: Optional[list[dict]] = None) -> bool:
+    """Add document chunks to vector database (metadatas: optional extra
+    per-chunk metadata, e.g. character offsets and pages)"""
+    try:
+        with index_writes():
+            index = index_snapshot()
+            # Generate embeddings for chunks (unless precomputed for this version's model)
+            if embeddings is None or (embeddings and len(embeddings[0]) != index.embedder.dimension):
+                embeddings = embed_chunks(chunks, index.embedder)
+
+            with metrics.timed("index"):
+                store_chunks(index.collection, index.lexical, doc_id, chunks, embeddings, metadatas)
+        bump_corpus_version()
         return True
     except Exception as e:
         print(f"Error adding chunks to vector store: {e}")
         return False
 
-def search_similar_chunks(query: str, k: int = 5) -> list[str]:
-    """Search for similar document chunks"""
+def delete_document_chunks(doc_id: str) -> bool:
+    """Remove every chunk of a document from the vector database"""
+    return delete_documents_chunks([doc_id])
+
+def delete_documents_chunks(doc_ids: list[str], batch_size: int = 500) -> bool:
+    """Remove every chunk of several documents from the vector database and
+    the lexical index (cached answers are invalidated)"""
     try:
-        # Generate query embedding
-        query_embedding = embedder.encode([query])[0].tolist()
-        
-        # Search in ChromaDB
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k
-        )
-        
-        # Return the document chunks
-        return results["documents"] if results["documents"] else []
+        with index_writes():
+            index = index_snapshot()
+            remove_chunks(index.collection, index.lexical, doc_ids, batch_size)
+        bump_corpus_version()
+        return True
+    except Exception as e:
+        print(f"Error deleting chunks from vector store: {e}")
+        return False
+
+def remove_chunks(collection, lexical: LexicalIndex, doc_ids: list[str], batch_size: int = 500):
+    """Remove documents from one index version's vector store and lexical index"""
+    for start in range(0, len(doc_ids), batch_size):
+        collection.delete(where=document_filter(doc_ids[start:start + batch_size]))
+    for doc_id in doc_ids:
+        lexical.remove_document(doc_id)
+
+def indexed_documents(page_size: int = 5000, collection=None, lexical: Optional[LexicalIndex] = None) -> dict:
+    """Every document with chunks in the vector or lexical index (of the
+    active version, or the given ones): {doc_id: {"chunks", "indexed_at"}}
+    (indexed_at: newest chunk's add time, None for chunks indexed before it
+    was recorded)"""
+    if collection is None:
+        index = index_snapshot()
+        collection, lexical = index.collection, index.lexical
+    documents = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for metadata in page["metadatas"]:
+            metadata = metadata or {}
+            entry = documents.setdefault(metadata.get("document_id"), {"chunks": 0, "indexed_at": None})
+            entry["chunks"] += 1
+            if metadata.get("indexed_at") is not None:
+                entry["indexed_at"] = max(entry["indexed_at"] or 0.0, metadata["indexed_at"])
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+    for doc_id in lexical.document_ids():
+        documents.setdefault(doc_id, {"chunks": 0, "indexed_at": None})
+    return documents
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                pass  # removed while walking
+    return total
+
+def index_disk_usage() -> dict:
+    """Bytes on disk of the active version's vector store and lexical index"""
+    config = index_config()
+    return {"vector_store": _dir_size(config["vector_path"]), "lexical_index": _dir_size(config["lexical_path"])}
+
+def compact_vector_store() -> Optional[dict]:
+    """Reclaim space of deleted chunks where the backend supports it (NumPy
+    index; Chroma manages its own storage)"""
+    collection = get_collection()
+    if hasattr(collection, "compact"):
+        return collection.compact()
+    return None
+
+def rebalance_shards(shard_count: int) -> dict:
+    """Split the vector store into shard_count shards (python -m app.rebalance);
+    the collection is reopened on next use"""
+    global _collection
+    with _collection_lock:
+        report = rebalance(index_config()["vector_path"], shard_count, _open_shard, _drop_shard)
+        _collection = None
+    return report
+
+def embed_query(query: str) -> list[float]:
+    """Embed a single query string"""
+    return get_embedder().encode([query])[0]
+
+# Shared micro-batcher: concurrent queries are embedded together
+query_batcher = EmbeddingBatcher(
+    embed_chunks,
+    max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+    max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS
+)
+
+async def embed_query_batched(query: str) -> list[float]:
+    """Embed a query through the shared micro-batcher"""
+    return await query_batcher.encode(query)
+
+def document_filter(doc_ids: Optional[list[str]]) -> Optional[dict]:
+    """Chroma where clause selecting the chunks of some documents"""
+    if doc_ids is None:
+        return None
+    if len(doc_ids) == 1:
+        return {"document_id": doc_ids[0]}
+    return {"document_id": {"$in": list(doc_ids)}}
+
+def retrieve_chunks(
+    query: str,
+    k: int = 5,
+    query_embedding: Optional[list[float]] = None,
+    mode: Optional[str] = None,
+    dense_weight: float = 1.0,
+    lexical_weight: float = 1.0,
+    doc_ids: Optional[list[str]] = None,
+    include_embeddings: bool = False
+) -> list[dict]:
+    """Search for similar document chunks, best first, as
+    {"id", "text", "metadata"} (+ "embedding") dicts.
+
+    mode (default RETRIEVAL_MODE): "dense" vector search, "lexical" BM25, or
+    "hybrid": both candidate lists merged by weighted reciprocal rank fusion.
+    doc_ids restricts the search to those documents inside both indexes."""
+    request = {
+        "query": query, "k": k, "query_embedding": query_embedding, "mode": mode,
+        "dense_weight": dense_weight, "lexical_weight": lexical_weight, "doc_ids": doc_ids
+    }
+    return retrieve_chunks_batch([request], include_embeddings=include_embeddings)[0]
+
+def retrieve_chunks_batch(requests: list[dict], include_embeddings: bool = False) -> list[list[dict]]:
+    """retrieve_chunks for several queries at once (each request holds its
+    keyword arguments). Missing query embeddings are computed in one batch
+    and the vector index is queried once per distinct document scope with
+    all of that scope's query vectors."""
+    plans = []
+    for request in requests:
+        mode = request.get("mode") or settings.RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}, expected one of {RETRIEVAL_MODES}")
+        k = request.get("k", 5)
+        doc_ids = request.get("doc_ids")
+        dense_weight = request.get("dense_weight", 1.0)
+        lexical_weight = request.get("lexical_weight", 1.0)
+        plans.append({
+            "query": request["query"],
+            "k": k,
+            "mode": mode,
+            "doc_ids": doc_ids,
+            "empty": doc_ids is not None and not doc_ids,
+            # Each side contributes a deeper candidate list than k so fusion can
+            # promote chunks ranked well by both
+            "candidates": k * settings.HYBRID_CANDIDATE_FACTOR if mode == "hybrid" else k,
+            "dense": mode == "dense" or (mode == "hybrid" and dense_weight > 0),
+            "lexical": mode == "lexical" or (mode == "hybrid" and lexical_weight > 0),
+            "dense_weight": dense_weight if mode == "hybrid" else 1.0,
+            "lexical_weight": lexical_weight if mode == "hybrid" else 1.0,
+            "embedding": request.get("query_embedding"),
+            "dense_ids": []
+        })
+    include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+    hits = {}
+
+    def collect(results: dict, nested: bool, row: int = 0):
+        def column(key):
+            values = results.get(key)
+            if values is None:
+                return [None] * len(ids)
+            return values[row] if nested else values
+        ids = results["ids"][row] if nested else results["ids"]
+        for chunk_id, text, metadata, embedding in zip(
+            ids, column("documents"), column("metadatas"), column("embeddings")
+        ):
+            hit = {"id": chunk_id, "text": text, "metadata": metadata or {}}
+            if include_embeddings:
+                hit["embedding"] = embedding
+            hits[chunk_id] = hit
+
+    try:
+        # One index version for the whole batch, even if a re-index switches meanwhile
+        index = index_snapshot()
+        collection = index.collection
+        dense = [plan for plan in plans if plan["dense"] and not plan["empty"]]
+
+        # Generate query embeddings (unless the caller already has them from this version's model)
+        unembedded = [plan for plan in dense
+                      if plan["embedding"] is None or len(plan["embedding"]) != index.embedder.dimension]
+        if unembedded:
+            embeddings = embed_chunks([plan["query"] for plan in unembedded], index.embedder)
+            for plan, embedding in zip(unembedded, embeddings):
+                plan["embedding"] = embedding
+
+        # One multi-vector query per document scope
+        scopes = {}
+        for plan in dense:
+            scope = tuple(plan["doc_ids"]) if plan["doc_ids"] is not None else None
+            scopes.setdefault(scope, []).append(plan)
+        for scope, group in scopes.items():
+            with metrics.timed("vector_search"):
+                results = collection.query(
+                    query_embeddings=[plan["embedding"] for plan in group],
+                    n_results=max(plan["candidates"] for plan in group),
+                    where=document_filter(group[0]["doc_ids"]),
+                    include=include
+                )
+            for row, plan in enumerate(group):
+                collect(results, nested=True, row=row)
+                plan["dense_ids"] = results["ids"][row][:plan["candidates"]]
+
+        ranked = []
+        for plan in plans:
+            if plan["empty"]:
+                ranked.append([])
+            elif plan["mode"] == "dense":
+                ranked.append(plan["dense_ids"][:plan["k"]])
+            else:
+                rankings = []
+                if plan["dense"]:
+                    rankings.append((plan["dense_ids"], plan["dense_weight"]))
+                if plan["lexical"]:
+                    with metrics.timed("lexical_search"):
+                        lexical_ids = [chunk_id for chunk_id, _ in
+                                       index.lexical.search(plan["query"], plan["candidates"], doc_ids=plan["doc_ids"])]
+                    rankings.append((lexical_ids, plan["lexical_weight"]))
+                ranked.append(reciprocal_rank_fusion(rankings, plan["k"], rrf_k=settings.RRF_K))
+
+        # Texts for lexical-only hits, fetched together
+        missing = list(dict.fromkeys(chunk_id for top_ids in ranked for chunk_id in top_ids if chunk_id not in hits))
+        if missing:
+            with metrics.timed("vector_search"):
+                collect(collection.get(ids=missing, include=include), nested=False)
+        return [[hits[chunk_id] for chunk_id in top_ids if chunk_id in hits] for top_ids in ranked]
     except Exception as e:
         print(f"Error searching vector store: {e}")
+        return [[] for _ in requests]
+
+def search_similar_chunks(
+    query: str,
+    k: int = 5,
+    query_embedding: Optional[list[float]] = None,
+    mode: Optional[str] = None,
+    dense_weight: float = 1.0,
+    lexical_weight: float = 1.0,
+    doc_ids: Optional[list[str]] = None
+) -> list[str]:
+    """Search for similar document chunks (texts only, nested like Chroma's
+    query results); see retrieve_chunks"""
+    if doc_ids is not None and not doc_ids:
         return []
+    hits = retrieve_chunks(query, k, query_embedding, mode, dense_weight, lexical_weight, doc_ids)
+    return [[hit["text"] for hit in hits]]
+
+def backfill_lexical_index() -> int:
+    """Index documents stored before the lexical index existed (startup);
+    returns the number of documents added"""
+    index = index_snapshot()
+    collection = index.collection
+    indexed = index.lexical.stats()["documents"]
+    if indexed or collection.count() == 0:
+        return 0
+    stored = collection.get(include=["documents", "metadatas"])
+    documents = {}
+    for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+        documents.setdefault(metadata["document_id"], []).append((metadata.get("chunk_index", 0), chunk_id, text))
+    for doc_id, chunks in documents.items():
+        chunks.sort()
+        index.lexical.add_document(doc_id, [c[1] for c in chunks], [c[2] for c in chunks])
+    return len(documents)
+
+# Scraped from the open collection only (a scrape never opens it)
+metrics.gauge_from(metrics.COLLECTION_CHUNKS, lambda: _collection.count() if _collection is not None else float("nan"))
 
 def get_collection_stats() -> dict:
     """Get statistics about the document collection"""
     try:
-        count = collection.count()
-        return {"total_chunks": count}
+        index = index_snapshot()
+        return {"total_chunks": index.collection.count(), "lexical_index": index.lexical.stats()}
     except Exception as e:
         return {"total_chunks": 0, "error": str(e)}
@@ -0,0 +1,29 @@
+"""Serve the embedding model (and vector store) to the API workers over a Unix socket.
+
+    EMBEDDING_SIDECAR_SOCKET=/tmp/rag-sidecar.sock python -m app.sidecar --index
+    EMBEDDING_SIDECAR_SOCKET=/tmp/rag-sidecar.sock uvicorn app.main:app --workers 8
+
+One process holds the model instead of one copy per worker. With --index it
+also owns the vector store, so a single process writes CHROMA_PATH. Start
+it before the workers: a worker that finds no sidecar loads its own model.
+"""
+import asyncio
+import argparse
+from .config import settings
+from .services.sidecar import SidecarServer
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=settings.EMBEDDING_SIDECAR_SOCKET,
+                        help="socket path (default EMBEDDING_SIDECAR_SOCKET)")
+    parser.add_argument("--index", action="store_true", help="also serve the vector store")
+    args = parser.parse_args(argv)
+    if not args.socket:
+        parser.error("--socket or EMBEDDING_SIDECAR_SOCKET is required")
+    try:
+        asyncio.run(SidecarServer(args.socket, index=args.index).serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
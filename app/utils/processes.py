@@ -0,0 +1,23 @@
+import os
+import socket
+from typing import Optional
+
+def process_owner() -> str:
+    """"host:pid" of this process, recorded on jobs it runs"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def owner_gone(owner: Optional[str]) -> bool:
+    """Whether the process that ran a job is dead; rows from before owners
+    were recorded count as dead, processes on other hosts as alive"""
+    if not owner:
+        return True
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
@@ -1,50 +1,210 @@
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
-    """Split text into overlapping chunks"""
-    if not text.strip():
-        return []
-    
-    words = text.split()
-    chunks = []
-    start = 0
+import re
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+import multiprocessing
+
+class PageLimitExceeded(ValueError):
+    """PDF has more pages than allowed"""
+    def __init__(self, page_count: int, max_pages: int):
+        super().__init__(f"PDF has {page_count} pages (maximum {max_pages})")
+        self.page_count = page_count
+        self.max_pages = max_pages
+
+def _effective_overlap(chunk_size: int, overlap: int) -> int:
+    # An overlap >= chunk_size would never advance; fall back to the
+    # default 20% ratio
+    return overlap if overlap < chunk_size else chunk_size // 5
+
+# Rough WordPiece-style count: words split into 8-character pieces, plus
+# punctuation marks. Used when no real tokenizer is available.
+_APPROX_TOKEN_RE = re.compile(r"\w{1,8}|[^\w\s]")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+def approx_token_count(text: str) -> int:
+    return len(_APPROX_TOKEN_RE.findall(text))
+
+@dataclass
+class Chunk:
+    """A chunk of a document. start/end are character offsets into the
+    cleaned text (clean_text of each page, pages joined by one space);
+    pages are 1-based."""
+    text: str
+    start: int
+    end: int
+    page_start: int
+    page_end: int
+    tokens: int
+
+@dataclass
+class _Unit:
+    # A sentence (or piece of an over-long sentence) in the cleaned text
+    text: str
+    start: int
+    page: int
+    tokens: int
+    new_paragraph: bool
+
+def _split_long(sentence: str, max_tokens: int, count_batch: Callable[[list[str]], list[int]]) -> Iterator[tuple]:
+    """Split a sentence over the budget at word boundaries: (offset, text, tokens)"""
+    words = sentence.split(" ")
+    piece, piece_tokens, offset, position = [], 0, 0, 0
+    for word, tokens in zip(words, count_batch(words)):
+        if piece and piece_tokens + tokens > max_tokens:
+            text = " ".join(piece)
+            yield offset, text, piece_tokens
+            offset = position
+            piece, piece_tokens = [], 0
+        piece.append(word)
+        piece_tokens += tokens
+        position += len(word) + 1
+    if piece:
+        yield offset, " ".join(piece), piece_tokens
+
+def _page_sentences(page: str) -> Iterator[tuple]:
+    """(sentence, starts a paragraph) for each sentence of a page"""
+    for paragraph in _PARAGRAPH_RE.split(page):
+        paragraph = " ".join(paragraph.split())
+        if paragraph:
+            for i, sentence in enumerate(_SENTENCE_END_RE.split(paragraph)):
+                yield sentence, i == 0
+
+def _units(pages: Iterable[str], max_tokens: int, count_batch: Callable[[list[str]], list[int]]) -> Iterator[_Unit]:
+    offset = 0  # start of the next page in the cleaned text
+    for page_number, page in enumerate(pages, start=1):
+        # One count_batch call for the whole page
+        sentences = list(_page_sentences(page))
+        counts = count_batch([sentence for sentence, _ in sentences])
+        page_length = 0
+        for i, ((sentence, new_paragraph), tokens) in enumerate(zip(sentences, counts)):
+            start = offset + page_length + (1 if i else 0)
+            pieces = [(0, sentence, tokens)] if tokens <= max_tokens else _split_long(sentence, max_tokens, count_batch)
+            for piece_offset, text, piece_tokens in pieces:
+                yield _Unit(text, start + piece_offset, page_number, piece_tokens, new_paragraph)
+                new_paragraph = False
+            page_length += len(sentence) + (1 if i else 0)
+        if page_length:
+            # Pages are joined with a single space
+            offset += page_length + 1
+
+def chunk_document(pages: Iterable[str], max_tokens: int = 254, overlap_tokens: int = 32,
+                   count_tokens: Callable[[str], int] = approx_token_count,
+                   count_tokens_batch: Optional[Callable[[list[str]], list[int]]] = None) -> Iterator[Chunk]:
+    """Sentence-aware chunker over a stream of page texts (or one text).
+
+    Yields chunks of whole sentences totalling at most max_tokens as counted
+    by count_tokens (use the embedder's tokenizer so chunks fit its window;
+    count_tokens_batch, when given, counts a page's sentences in one call);
+    only sentences longer than the budget are split, at word boundaries.
+    A paragraph break ends the current chunk once it is half full. Consecutive
+    chunks share up to overlap_tokens of trailing sentences (not across a
+    paragraph break). Only the current window is held in memory."""
+    if isinstance(pages, str):
+        pages = [pages]
+    count_batch = count_tokens_batch or (lambda texts: [count_tokens(text) for text in texts])
+    overlap_tokens = _effective_overlap(max_tokens, overlap_tokens)
+    window = deque()
+    window_tokens = 0
+
+    def emit() -> Chunk:
+        first, last = window[0], window[-1]
+        return Chunk(
+            text=" ".join(unit.text for unit in window),
+            start=first.start,
+            end=last.start + len(last.text),
+            page_start=first.page,
+            page_end=last.page,
+            tokens=window_tokens
+        )
+
+    for unit in _units(pages, max_tokens, count_batch):
+        paragraph_break = unit.new_paragraph and window_tokens >= max_tokens // 2
+        if window and (paragraph_break or window_tokens + unit.tokens > max_tokens):
+            yield emit()
+            if paragraph_break:
+                window.clear()
+                window_tokens = 0
+            else:
+                # Keep whole trailing sentences as overlap; always drop at
+                # least one unit, and make room for the next one
+                kept, kept_tokens = [], 0
+                for previous in reversed(window):
+                    if kept_tokens + previous.tokens > overlap_tokens or len(kept) + 1 == len(window):
+                        break
+                    kept.append(previous)
+                    kept_tokens += previous.tokens
+                while kept and kept_tokens + unit.tokens > max_tokens:
+                    kept_tokens -= kept.pop().tokens
+                window = deque(reversed(kept))
+                window_tokens = kept_tokens
+        window.append(unit)
+        window_tokens += unit.tokens
+
+    if window:
+        yield emit()
+
+def _extract_page_range(file_path: str, start: int, end: int) -> list[str]:
+    """Extract pages [start, end) (runs in a worker process)"""
+    from pypdf import PdfReader
     
-    while start < len(words):
-        # Calculate end position
-        end = start + chunk_size
-        
-        # Get chunk words
-        chunk_words = words[start:end]
-        chunk_text = " ".join(chunk_words)
-        
-        # Add chunk if it has content
-        if chunk_text.strip():
-            chunks.append(chunk_text)
-        
-        # Move start position (with overlap)
-        start = end - overlap
-        
-        # Break if we've processed all words
-        if end >= len(words):
-            break
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+_pdf_pools = {}
+
+def _get_pdf_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned (not forked) workers: the API process runs threads
+    if workers not in _pdf_pools:
+        _pdf_pools[workers] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pdf_pools[workers]
+
+def open_pdf_pages(file_path: str, max_pages: Optional[int] = None, workers: int = 1,
+                   pages_per_task: int = 16) -> tuple[int, Iterator[str]]:
+    """Parse the PDF once: its page count and an iterator of page texts in
+    page order.
+
+    Raises PageLimitExceeded before extracting anything when the PDF has
+    more than max_pages pages. With workers > 1, page ranges are extracted
+    in parallel on a process pool while keeping at most 2 ranges per worker
+    in flight, so pages stream out as soon as the next range is ready."""
+    from pypdf import PdfReader
     
-    return chunks
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+    if max_pages is not None and page_count > max_pages:
+        raise PageLimitExceeded(page_count, max_pages)
+    return page_count, _iter_pages(reader, file_path, page_count, workers, pages_per_task)
 
-def extract_pdf_text(file_path: str) -> str:
-    """Extract text from PDF file"""
-    try:
-        from pypdf import PdfReader
-        
-        reader = PdfReader(file_path)
-        text_content = ""
-        
+def _iter_pages(reader, file_path: str, page_count: int, workers: int, pages_per_task: int) -> Iterator[str]:
+    if workers <= 1 or page_count <= pages_per_task:
         for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text_content += page_text + "\n"
-        
-        return text_content.strip()
-    except Exception as e:
-        print(f"Error extracting PDF text: {e}")
-        return ""
+            yield page.extract_text() or ""
+        return
+    
+    pool = _get_pdf_pool(workers)
+    ranges = deque((start, min(start + pages_per_task, page_count))
+                   for start in range(0, page_count, pages_per_task))
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(_extract_page_range, file_path, start, end))
+            yield from in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+def iter_pdf_pages(file_path: str, max_pages: Optional[int] = None, workers: int = 1,
+                   pages_per_task: int = 16) -> Iterator[str]:
+    """Yield page texts in page order (see open_pdf_pages)"""
+    _, pages = open_pdf_pages(file_path, max_pages, workers, pages_per_task)
+    yield from pages
 
 def clean_text(text: str) -> str:
     """Clean and normalize text"""
@@ -58,3 +218,9 @@ def clean_text(text: str) -> str:
     # Add more cleaning rules here as needed
     
     return text
+
+def clean_page(page: str) -> str:
+    """clean_text that keeps paragraph breaks (as one blank line), so the
+    chunker gives the same chunks from the cleaned page as from the raw one"""
+    paragraphs = (" ".join(paragraph.split()) for paragraph in _PARAGRAPH_RE.split(page or ""))
+    return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
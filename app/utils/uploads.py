@@ -0,0 +1,91 @@
+import os
+import hashlib
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from ..services.executor import run_io
+
+PDF_MAGIC = b"%PDF-"
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries + part headers around the file
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized upload bodies while they arrive.
+
+    Requests whose Content-Length is already over the limit get a 413
+    without reading the body; otherwise the received byte count is checked
+    on every body message, so chunked uploads are cut off as soon as they
+    cross the limit instead of being buffered in full first."""
+
+    def __init__(self, app, max_body_bytes: int, path_prefix: str = "/upload"):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.path_prefix = path_prefix
+
+    def _too_large(self) -> HTTPException:
+        limit_mb = (self.max_body_bytes - MULTIPART_OVERHEAD) // (1024 * 1024)
+        return HTTPException(status_code=413, detail=f"File too large. Maximum size is {limit_mb}MB")
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "POST"
+                or not scope["path"].startswith(self.path_prefix)):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            error = self._too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=413, headers={"connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Raised inside body parsing; FastAPI re-raises HTTPExceptions
+                    raise self._too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+async def save_upload(file, dest_path: str, max_bytes: int, block_size: int,
+                      magic: bytes = PDF_MAGIC) -> tuple[int, str]:
+    """Copy an upload to dest_path in fixed-size blocks.
+
+    Enforces max_bytes and the magic-byte prefix as blocks arrive and
+    hashes on the fly, so memory use is one block regardless of file size.
+    Returns (size, sha256 hex digest); the partial file is removed on error."""
+    digest = hashlib.sha256()
+    size = 0
+    out = await run_io(open, dest_path, "wb")
+    try:
+        while True:
+            block = await file.read(block_size)
+            if not block:
+                break
+            if size == 0 and not block.startswith(magic[:len(block)]):
+                raise HTTPException(status_code=400, detail="File is not a valid PDF")
+            size += len(block)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB"
+                )
+            digest.update(block)
+            await run_io(out.write, block)
+        if size < len(magic):
+            raise HTTPException(status_code=400, detail="File is not a valid PDF")
+    except BaseException:
+        await run_io(out.close)
+        await run_io(_remove_quietly, dest_path)
+        raise
+    await run_io(out.close)
+    return size, digest.hexdigest()
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,92 @@
+"""Benchmark: POST /query/batch vs. a loop over POST /query.
+
+    python benchmarks/bench_batch_query.py --questions 256 --llm-ms 200
+    python benchmarks/bench_batch_query.py --embedder sentence-transformers
+
+Offline: synthetic chunks in a throwaway vector store + lexical index and a
+fake LLM provider that answers after --llm-ms. The app is called in-process
+(no network). Reports questions/s for one-at-a-time /query calls (what the
+evaluation jobs do today) and for /query/batch with --batch-size questions
+per call.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from synthetic_pdf import WORDS
+
+def build_corpus(chunks: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(60)) + "." for _ in range(chunks)]
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--llm-ms", type=float, default=200.0, help="fake provider latency")
+    parser.add_argument("--concurrency", type=int, default=8, help="BATCH_PROVIDER_CONCURRENCY")
+    parser.add_argument("--embedder", default="hashing", help="EMBEDDER_BACKEND to use")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Throwaway stores; must be set before the app modules read settings
+    workdir = tempfile.mkdtemp(prefix="bench-batch-")
+    os.environ["EMBEDDER_BACKEND"] = args.embedder
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical")
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+    os.environ["BATCH_PROVIDER_CONCURRENCY"] = str(args.concurrency)
+    import httpx
+    from app.main import app
+    from app.services import llm_providers
+    from app.services.llm_providers import LLMProvider
+    from app.services.vector_store import add_document_chunks
+
+    class FakeProvider(LLMProvider):
+        def __init__(self):
+            super().__init__("fake", 1)
+
+        async def agenerate(self, request):
+            await asyncio.sleep(args.llm_ms / 1000)
+            return "answer"
+
+    llm_providers.PROVIDERS[:] = [FakeProvider()]
+
+    texts = build_corpus(args.chunks, args.seed)
+    for d in range(0, len(texts), 500):
+        add_document_chunks(f"doc{d // 500:04d}", texts[d:d + 500])
+    rng = random.Random(args.seed + 1)
+    questions = [" ".join(rng.sample(WORDS, 6)) + "?" for _ in range(args.questions)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/query", json={"question": "warm up"})
+
+        start = time.perf_counter()
+        for question in questions:
+            response = await client.post("/query", json={"question": question})
+            assert response.json()["success"]
+        loop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for offset in range(0, len(questions), args.batch_size):
+            batch = [{"question": q} for q in questions[offset:offset + args.batch_size]]
+            response = await client.post("/query/batch", json={"queries": batch})
+            assert all(r["success"] for r in response.json()["results"])
+        batch_seconds = time.perf_counter() - start
+
+    print(f"{args.questions} questions, {args.chunks} chunks, LLM {args.llm_ms:.0f} ms, "
+          f"{args.concurrency} concurrent calls per provider\n")
+    print(f"{'client':<22}{'seconds':>9}{'questions/s':>13}")
+    print(f"{'loop over /query':<22}{loop_seconds:>9.2f}{args.questions / loop_seconds:>13.1f}")
+    print(f"{'/query/batch x' + str(args.batch_size):<22}{batch_seconds:>9.2f}{args.questions / batch_seconds:>13.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
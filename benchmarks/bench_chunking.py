@@ -0,0 +1,70 @@
+"""Benchmark: sentence-aware token-budgeted chunker vs. chunk_text.
+
+    python benchmarks/bench_chunking.py --pages 1000
+    python benchmarks/bench_chunking.py --tokenizer all-MiniLM-L6-v2   # real token counts
+
+Works on page texts (no PDF parsing). For each chunker reports wall time,
+pages/s, peak traced memory, chunk count, and how many chunks exceed the
+embedder's token window (the part past it is silently truncated at embed
+time).
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from synthetic_pdf import page_lines
+from legacy_chunking import chunk_text
+from app.utils.text_processing import chunk_document, clean_text, approx_token_count
+
+def synthetic_pages(count: int):
+    # Lines as sentences, a paragraph break every 8 lines
+    for number in range(count):
+        lines = page_lines(number)
+        yield "\n\n".join(" ".join(lines[i:i + 8]) for i in range(0, len(lines), 8))
+
+def run(name: str, chunker, pages: int, count_tokens, window: int) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = over = 0
+    for text in chunker(synthetic_pages(pages)):
+        chunks += 1
+        over += count_tokens(text) > window
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"name": name, "seconds": elapsed, "peak_mb": peak / 2**20, "chunks": chunks, "over": over}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--window", type=int, default=254, help="embedder token window")
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--tokenizer", help="sentence-transformers model whose tokenizer counts tokens")
+    args = parser.parse_args()
+
+    count_tokens = approx_token_count
+    if args.tokenizer:
+        from sentence_transformers import SentenceTransformer
+        tokenizer = SentenceTransformer(args.tokenizer).tokenizer
+        count_tokens = lambda text: len(tokenizer.tokenize(text))
+
+    def legacy(pages):
+        # What ingestion did: join and clean everything, then split into words
+        return chunk_text(clean_text("\n".join(pages)))
+
+    def streaming(pages):
+        for chunk in chunk_document(pages, max_tokens=args.window, overlap_tokens=args.overlap,
+                                    count_tokens=count_tokens):
+            yield chunk.text
+
+    print(f"{'chunker':<16}{'seconds':>9}{'pages/s':>9}{'peak MB':>9}{'chunks':>8}{'> window':>10}")
+    for name, chunker in [("chunk_text", legacy), ("chunk_document", streaming)]:
+        r = run(name, chunker, args.pages, count_tokens, args.window)
+        print(f"{r['name']:<16}{r['seconds']:>9.2f}{args.pages / r['seconds']:>9.0f}{r['peak_mb']:>9.2f}"
+              f"{r['chunks']:>8}{r['over']:>10}")
+
+if __name__ == "__main__":
+    main()
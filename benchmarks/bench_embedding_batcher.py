@@ -0,0 +1,83 @@
+"""Benchmark: micro-batched vs. one-at-a-time query embedding under concurrency.
+
+    python benchmarks/bench_embedding_batcher.py --concurrency 1 8 32 128
+    python benchmarks/bench_embedding_batcher.py --synthetic   # no model download
+
+--synthetic replaces the model with a cost model of batched CPU inference
+(fixed per-call overhead + per-item cost, GIL released like torch does),
+so the scheduling effect can be measured anywhere.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.executor import run_cpu
+
+def synthetic_encoder(call_ms: float, item_ms: float):
+    def encode(texts):
+        time.sleep((call_ms + item_ms * len(texts)) / 1000)
+        return [[0.0] * 384 for _ in texts]
+    return encode
+
+def model_encoder(name: str):
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(name)
+    return lambda texts: model.encode(texts).tolist()
+
+async def run_load(embed, concurrency: int, requests: int) -> dict:
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(f"what does clause {i} of the supplier contract say?")
+
+    async def client():
+        while not queue.empty():
+            text = queue.get_nowait()
+            start = time.perf_counter()
+            await embed(text)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "qps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(0.99 * (len(latencies) - 1))] * 1000
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--call-ms", type=float, default=8.0, help="synthetic per-call cost")
+    parser.add_argument("--item-ms", type=float, default=0.5, help="synthetic per-item cost")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    encode = synthetic_encoder(args.call_ms, args.item_ms) if args.synthetic else model_encoder(args.model)
+
+    async def unbatched(text):
+        return (await run_cpu(encode, [text]))[0]
+
+    print(f"{'concurrency':>11} | {'unbatched qps':>13} {'p50 ms':>8} {'p99 ms':>8} | "
+          f"{'batched qps':>11} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>9}")
+    for concurrency in args.concurrency:
+        batcher = EmbeddingBatcher(encode, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+        plain = await run_load(unbatched, concurrency, args.requests)
+        batched = await run_load(batcher.encode, concurrency, args.requests)
+        print(f"{concurrency:>11} | {plain['qps']:>13.0f} {plain['p50_ms']:>8.1f} {plain['p99_ms']:>8.1f} | "
+              f"{batched['qps']:>11.0f} {batched['p50_ms']:>8.1f} {batched['p99_ms']:>8.1f} "
+              f"{batcher.stats()['mean_batch_size']:>9.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
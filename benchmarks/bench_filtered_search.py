@@ -0,0 +1,74 @@
+"""Benchmark: vector and BM25 search over the whole corpus vs. a document filter.
+
+    python benchmarks/bench_filtered_search.py --docs 100 --chunks-per-doc 1000
+
+Fills a NumPy vector index and a lexical index with --docs documents of
+--chunks-per-doc chunks each, then times the same top-10 query unfiltered
+and restricted to one document (doc_ids / a where clause on document_id),
+which only scores the selected rows and chunks.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+from synthetic_pdf import WORDS
+from app.services.numpy_index import NumpyVectorIndex
+from app.services.lexical_index import LexicalIndex
+
+def median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--chunks-per-doc", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=9)
+    args = parser.parse_args()
+    per_doc = args.chunks_per_doc
+    rng = np.random.default_rng(0)
+    words = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors = NumpyVectorIndex(os.path.join(tmp, "vectors"), block_rows=8192)
+        lexical = LexicalIndex(os.path.join(tmp, "lexical"))
+        for d in range(args.docs):
+            ids = [f"doc{d}_chunk_{i}" for i in range(per_doc)]
+            vectors.add(
+                ids=ids,
+                embeddings=rng.normal(size=(per_doc, args.dimension)).astype(np.float32),
+                documents=[""] * per_doc,
+                metadatas=[{"document_id": f"doc{d}", "chunk_index": i} for i in range(per_doc)]
+            )
+            lexical.add_document(f"doc{d}", ids, [" ".join(words.choice(WORDS) for _ in range(60))
+                                                  for _ in ids])
+
+        query = rng.normal(size=(1, args.dimension)).astype(np.float32).tolist()
+        question = "contract warranty supplier invoice"
+        where = {"document_id": "doc0"}
+        results = [
+            ("numpy index", median_ms(lambda: vectors.query(query, n_results=10, include=[]), args.repeat),
+             median_ms(lambda: vectors.query(query, n_results=10, where=where, include=[]), args.repeat)),
+            ("lexical index", median_ms(lambda: lexical.search(question, k=10), args.repeat),
+             median_ms(lambda: lexical.search(question, k=10, doc_ids=["doc0"]), args.repeat)),
+        ]
+
+    print(f"{args.docs * per_doc} chunks, filter selects 1 of {args.docs} documents\n")
+    print(f"{'index':<15}{'unfiltered ms':>15}{'filtered ms':>13}{'speedup':>9}")
+    for name, unfiltered, filtered in results:
+        print(f"{name:<15}{unfiltered:>15.2f}{filtered:>13.2f}{unfiltered / filtered:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
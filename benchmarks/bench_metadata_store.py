@@ -0,0 +1,127 @@
+"""Benchmark: metadata store stats, listing and writes at 100k documents.
+
+    python benchmarks/bench_metadata_store.py --documents 100000
+    python benchmarks/bench_metadata_store.py --database-url postgresql+psycopg://rag@localhost/bench
+
+Fills a throwaway SQLite database (or the given empty database) with
+synthetic documents, then compares the counters table against the full-table
+aggregates stats used to run, and keyset pages against loading every row
+(the old GET /metadata) and OFFSET pages at the same depth. Also reports
+single-document write latency with the counters update included.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def timed(fn, repeat: int) -> float:
+    """Median milliseconds of fn()"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--writes", type=int, default=1000, help="single save_metadata calls to time")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url", default=None, help="empty database to use instead of a temp SQLite file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Must be set before the app modules read settings
+    workdir = tempfile.mkdtemp(prefix="bench-metadata-")
+    os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(workdir, "metadata.db")
+    os.environ["CORPUS_VERSION_PATH"] = os.path.join(workdir, "corpus_version")
+    from sqlalchemy import func, insert, text
+    from app.services import doc_store
+    from app.services.doc_store import (
+        DocumentMetadata, engine, get_session, save_metadata, delete_document,
+        get_document_stats, list_documents, list_documents_page
+    )
+
+    rng = random.Random(args.seed)
+    doc_store.init_db()
+    start_time = datetime(2024, 1, 1)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, args.documents, 10_000):
+            conn.execute(insert(DocumentMetadata), [{
+                "doc_id": f"doc-{i:07d}",
+                "filename": f"report_{rng.randrange(5000):04d}.pdf",
+                "pages": rng.randint(1, 200),
+                "chunks": rng.randint(1, 800),
+                "text_length": rng.randint(1_000, 500_000),
+                "upload_time": start_time + timedelta(seconds=rng.randrange(10_000_000)),
+                "content_hash": None
+            } for i in range(offset, min(offset + 10_000, args.documents))])
+    load_seconds = time.perf_counter() - start
+
+    # Rebuild the counters the way a first start on an existing database does
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM document_counters"))
+    backfill_ms = timed(doc_store._create_tables, 1)
+
+    def legacy_stats():
+        db = get_session()
+        try:
+            db.query(DocumentMetadata).count()
+            db.query(func.sum(DocumentMetadata.pages)).scalar()
+            db.query(func.sum(DocumentMetadata.chunks)).scalar()
+        finally:
+            db.close()
+
+    def offset_page(offset: int):
+        db = get_session()
+        try:
+            (db.query(DocumentMetadata)
+             .order_by(DocumentMetadata.upload_time.desc(), DocumentMetadata.doc_id.desc())
+             .offset(offset).limit(args.page_size).all())
+        finally:
+            db.close()
+
+    # Cursor at ~90% depth, reached by walking pages
+    depth_pages = int(args.documents * 0.9) // args.page_size
+    cursor = None
+    start = time.perf_counter()
+    for _ in range(depth_pages):
+        cursor = list_documents_page(limit=args.page_size, cursor=cursor)["next_cursor"]
+    walk_ms = (time.perf_counter() - start) * 1000
+
+    rows = [
+        ("stats: counters row", timed(get_document_stats, args.repeat)),
+        ("stats: full-table aggregates", timed(legacy_stats, args.repeat)),
+        ("list: first page (cursor)", timed(lambda: list_documents_page(limit=args.page_size), args.repeat)),
+        ("list: 90% deep page (cursor)", timed(lambda: list_documents_page(limit=args.page_size, cursor=cursor), args.repeat)),
+        ("list: 90% deep page (OFFSET)", timed(lambda: offset_page(depth_pages * args.page_size), args.repeat)),
+        ("list: every row (old endpoint)", timed(list_documents, max(1, args.repeat // 10))),
+    ]
+
+    write_ids = [f"bench-{i}" for i in range(args.writes)]
+    write_ms = timed(lambda: [save_metadata(doc_id, "new.pdf", 10, 40, 20_000) for doc_id in write_ids], 1)
+    delete_ms = timed(lambda: [delete_document(doc_id) for doc_id in write_ids], 1)
+    stats = get_document_stats()
+    assert stats["total_documents"] == args.documents
+
+    print(f"{engine.url.get_backend_name()}, {args.documents} documents "
+          f"(bulk load {load_seconds:.1f}s, counters backfill {backfill_ms:.0f} ms), "
+          f"page size {args.page_size}\n")
+    print(f"{'operation':<34}{'ms':>10}")
+    for name, ms in rows:
+        print(f"{name:<34}{ms:>10.2f}")
+    print(f"{'save_metadata (per document)':<34}{write_ms / args.writes:>10.2f}")
+    print(f"{'delete_document (per document)':<34}{delete_ms / args.writes:>10.2f}")
+    print(f"\nwalking {depth_pages} pages with cursors: {walk_ms / 1000:.1f}s "
+          f"({walk_ms / max(depth_pages, 1):.2f} ms/page)")
+
+if __name__ == "__main__":
+    main()
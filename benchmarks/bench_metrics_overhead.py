@@ -0,0 +1,143 @@
+"""Benchmark: cost of the Prometheus instrumentation on /query and ingestion.
+
+    python benchmarks/bench_metrics_overhead.py --queries 2000
+    python benchmarks/bench_metrics_overhead.py --llm-ms 50 --debug
+
+Offline: synthetic chunks in a throwaway vector store + lexical index, the
+hashing embedder and a fake LLM provider that answers after --llm-ms (0 =
+worst case, the instrumentation is then the largest share). Every question
+is sent with METRICS_ENABLED on and off back to back (alternating which
+goes first), so drift hits both sides equally; reports the median
+per-query time of each and the overhead. As wall-clock differences this
+small are close to the noise, it also counts the observations one query
+makes and times them in isolation for a noise-free estimate. Also times
+ingesting a synthetic PDF both ways.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from synthetic_pdf import WORDS, write_pdf
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=2000, help="per side")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="fake provider latency")
+    parser.add_argument("--pdf-pages", type=int, default=50)
+    parser.add_argument("--debug", action="store_true", help="also collect per-request timings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Throwaway stores; must be set before the app modules read settings
+    workdir = tempfile.mkdtemp(prefix="bench-metrics-")
+    os.environ["EMBEDDER_BACKEND"] = "hashing"
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "metadata.db")
+    os.environ["CORPUS_VERSION_PATH"] = os.path.join(workdir, "corpus_version")
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+    os.environ["DEBUG"] = str(args.debug)
+    import httpx
+    from prometheus_client import REGISTRY
+    from app.main import app
+    from app.config import settings
+    from app.services import llm_providers
+    from app.services.llm_providers import LLMProvider
+    from app.services import metrics
+    from app.services.ingest import ingest_document
+    from app.services.vector_store import add_document_chunks
+
+    class FakeProvider(LLMProvider):
+        def __init__(self):
+            super().__init__("fake", 1)
+
+        async def agenerate(self, request):
+            await asyncio.sleep(args.llm_ms / 1000)
+            return "answer"
+
+    llm_providers.PROVIDERS[:] = [FakeProvider()]
+
+    rng = random.Random(args.seed)
+    texts = [" ".join(rng.choice(WORDS) for _ in range(60)) + "." for _ in range(args.chunks)]
+    for d in range(0, len(texts), 500):
+        add_document_chunks(f"doc{d // 500:04d}", texts[d:d + 500])
+    questions = [" ".join(rng.sample(WORDS, 6)) + "?" for _ in range(args.queries)]
+
+    def observations() -> float:
+        """Histogram observations and counter increments made so far"""
+        total = 0.0
+        for family in REGISTRY.collect():
+            for sample in family.samples:
+                if sample.name.startswith("rag_") and sample.name.endswith(("_count", "_total")):
+                    total += sample.value
+        return total
+
+    samples = {True: [], False: []}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for question in questions[:50]:
+            await client.post("/query", json={"question": question})
+        # Minus what reading the registry observes itself (the document gauge query)
+        observations()
+        scrape = -observations() + observations()
+        before = observations()
+        await client.post("/query", json={"question": questions[0]})
+        per_query = observations() - before - scrape
+
+        for i, question in enumerate(questions):
+            # Alternate which side goes first
+            for enabled in ((True, False) if i % 2 == 0 else (False, True)):
+                settings.METRICS_ENABLED = enabled
+                start = time.perf_counter()
+                response = await client.post("/query", json={"question": question})
+                samples[enabled].append(time.perf_counter() - start)
+                assert response.status_code == 200
+    settings.METRICS_ENABLED = True
+
+    # One observation, with the per-request timing dict when --debug
+    def observe():
+        with metrics.timed("bench"):
+            pass
+    if args.debug:
+        metrics.start_timings()
+    start = time.perf_counter()
+    for _ in range(100_000):
+        observe()
+    per_observation = (time.perf_counter() - start) / 100_000
+
+    pdf = write_pdf(os.path.join(workdir, "doc.pdf"), pages=args.pdf_pages)
+    ingest = {True: [], False: []}
+    for r in range(10):
+        for enabled in ((True, False) if r % 2 == 0 else (False, True)):
+            settings.METRICS_ENABLED = enabled
+            start = time.perf_counter()
+            ingest_document(f"ingest-{enabled}", pdf, "doc.pdf")
+            ingest[enabled].append(time.perf_counter() - start)
+    settings.METRICS_ENABLED = True
+
+    def overhead(on: float, off: float) -> str:
+        return f"{(on - off) / off * 100:+.2f}%"
+
+    on, off = statistics.median(samples[True]), statistics.median(samples[False])
+    ingest_on, ingest_off = statistics.median(ingest[True]), statistics.median(ingest[False])
+    print(f"{len(samples[True])} queries per side, {args.chunks} chunks, LLM {args.llm_ms:.0f} ms, "
+          f"debug timings {'on' if args.debug else 'off'}\n")
+    print(f"{'':<26}{'metrics off':>13}{'metrics on':>13}{'overhead':>11}")
+    print(f"{'/query median (ms)':<26}{off * 1000:>13.3f}{on * 1000:>13.3f}{overhead(on, off):>11}")
+    estimate = per_query * per_observation
+    print(f"{'/query estimate (ms)':<26}{off * 1000:>13.3f}{(off + estimate) * 1000:>13.3f}"
+          f"{overhead(off + estimate, off):>11}"
+          f"   ({per_query:.0f} observations x {per_observation * 1e6:.1f} us)")
+    print(f"{'ingest ' + str(args.pdf_pages) + ' pages (ms)':<26}{ingest_off * 1000:>13.1f}"
+          f"{ingest_on * 1000:>13.1f}{overhead(ingest_on, ingest_off):>11}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
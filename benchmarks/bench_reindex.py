@@ -0,0 +1,110 @@
+"""Benchmark: live query latency while a background re-index runs, by duty cycle.
+
+    python benchmarks/bench_reindex.py --documents 40 --duty 1.0 0.5 0.25
+    python benchmarks/bench_reindex.py --embedder sentence-transformers --documents 10
+
+Ingests --documents synthetic PDFs, then for each REINDEX_DUTY_CYCLE builds
+a new index version from the kept texts (new chunk size and embedding
+dimension, not switched to) while --threads threads run hybrid queries
+against the active one. Reports how long the build took and the query
+p50/p95 and rate during it, next to a baseline without a re-index.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from synthetic_pdf import build_pdf, WORDS
+
+def measure_queries(retrieve, threads: int, until) -> dict:
+    """Latencies of queries run by `threads` threads until until() is true"""
+    latencies = []
+    lock = threading.Lock()
+
+    def run(seed: int):
+        rng = random.Random(seed)
+        while not until():
+            question = " ".join(rng.choice(WORDS) for _ in range(4))
+            start = time.perf_counter()
+            retrieve(question, k=5, mode="hybrid")
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+    start = time.perf_counter()
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "seconds": seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "qps": len(latencies) / seconds
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=10, help="pages per document")
+    parser.add_argument("--duty", type=float, nargs="+", default=[1.0, 0.5, 0.25])
+    parser.add_argument("--threads", type=int, default=4, help="concurrent queries")
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    parser.add_argument("--embedder", default="hashing", help="EMBEDDER_BACKEND")
+    args = parser.parse_args()
+
+    # Throwaway stores; must be set before the app modules read settings
+    workdir = tempfile.mkdtemp(prefix="bench-reindex-")
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["NUMPY_INDEX_PATH"] = os.path.join(workdir, "vectors")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "metadata.db")
+    os.environ["CORPUS_VERSION_PATH"] = os.path.join(workdir, "corpus_version")
+    os.environ["EMBEDDER_BACKEND"] = args.embedder
+    os.environ.pop("EMBEDDING_SIDECAR_SOCKET", None)
+    from app.config import settings
+    from app.services import index_versions
+    from app.services.ingest import ingest_document
+    from app.services.vector_store import retrieve_chunks, get_embedder
+
+    for d in range(args.documents):
+        path = os.path.join(workdir, f"doc{d}.pdf")
+        with open(path, "wb") as f:
+            f.write(build_pdf(pages=args.pages, lines=30, seed=d))
+        ingest_document(f"doc{d:04d}", path, f"doc{d}.pdf")
+    dimension = get_embedder().dimension
+
+    print(f"{get_embedder().model_id}, {args.documents} documents x {args.pages} pages, "
+          f"{args.threads} query threads, {os.cpu_count()} CPUs\n")
+    print(f"{'duty':>8}{'build s':>10}{'p50 ms':>9}{'p95 ms':>9}{'qps':>9}")
+    deadline = time.perf_counter() + args.baseline_seconds
+    r = measure_queries(retrieve_chunks, args.threads, lambda: time.perf_counter() > deadline)
+    print(f"{'none':>8}{'':>10}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['qps']:>9.0f}")
+
+    for duty in args.duty:
+        settings.REINDEX_DUTY_CYCLE = duty
+        version = index_versions.start_reindex(
+            {"chunk_max_tokens": 64, "embedder_dimension": dimension // 2} if args.embedder == "hashing"
+            else {"chunk_max_tokens": 64},
+            activate=False
+        )["version"]
+
+        def built() -> bool:
+            return index_versions.get_version(version)["status"] != index_versions.BUILDING
+        r = measure_queries(retrieve_chunks, args.threads, built)
+        state = index_versions.get_version(version)
+        if state["status"] != index_versions.READY:
+            raise SystemExit(f"Re-index failed: {state['error']}")
+        print(f"{duty:>8.2f}{r['seconds']:>10.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['qps']:>9.0f}")
+        index_versions.delete_version(version)
+
+if __name__ == "__main__":
+    main()
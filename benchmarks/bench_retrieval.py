@@ -0,0 +1,88 @@
+"""Benchmark: dense vs. lexical (BM25) vs. hybrid retrieval, offline.
+
+    python benchmarks/bench_retrieval.py --chunks 5000 --queries 200
+    python benchmarks/bench_retrieval.py --embedder sentence-transformers
+
+Builds a synthetic corpus where every chunk mentions one part number, in a
+throwaway vector store + lexical index. Two query sets, each with one known
+relevant chunk: "identifier" queries ask about a part number, "topical"
+queries reuse a handful of the chunk's words. Reports hit@k, MRR and
+search latency per mode.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from synthetic_pdf import WORDS
+
+MODES = ["dense", "lexical", "hybrid"]
+
+def build_corpus(chunks: int, seed: int):
+    rng = random.Random(seed)
+    texts = []
+    for i in range(chunks):
+        words = [rng.choice(WORDS) for _ in range(60)]
+        words.insert(rng.randrange(len(words)), f"part XK-{i:05d}")
+        texts.append(" ".join(words) + ".")
+    return texts
+
+def build_queries(texts, count: int, seed: int):
+    rng = random.Random(seed + 1)
+    queries = {"identifier": [], "topical": []}
+    for i in rng.sample(range(len(texts)), count):
+        queries["identifier"].append((f"what is part XK-{i:05d} used for", i))
+        words = [w for w in texts[i].rstrip(".").split() if not w.startswith(("part", "XK-"))]
+        queries["topical"].append((" ".join(rng.sample(words, 8)), i))
+    return queries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embedder", default="hashing", help="EMBEDDER_BACKEND to use")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Throwaway stores; must be set before the app modules read settings
+    workdir = tempfile.mkdtemp(prefix="bench-retrieval-")
+    os.environ["EMBEDDER_BACKEND"] = args.embedder
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical")
+    from app.services.vector_store import add_document_chunks, embed_chunks, search_similar_chunks
+
+    texts = build_corpus(args.chunks, args.seed)
+    start = time.perf_counter()
+    per_doc = 500
+    for d in range(0, len(texts), per_doc):
+        # Chunk ids are f"{doc_id}_chunk_{i}", so texts[j] is doc (j // per_doc)
+        add_document_chunks(f"doc{d // per_doc:04d}", texts[d:d + per_doc])
+    print(f"indexed {len(texts)} chunks in {time.perf_counter() - start:.1f}s\n")
+
+    queries = build_queries(texts, args.queries, args.seed)
+    print(f"{'queries':<11}{'mode':<9}{'hit@k':>7}{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}")
+    for kind, items in queries.items():
+        embeddings = embed_chunks([q for q, _ in items])
+        for mode in MODES:
+            ranks, latencies = [], []
+            for (query, target), embedding in zip(items, embeddings):
+                start = time.perf_counter()
+                results = search_similar_chunks(query, k=args.k, query_embedding=embedding, mode=mode)
+                latencies.append(time.perf_counter() - start)
+                found = results[0] if results else []
+                ranks.append(found.index(texts[target]) + 1 if texts[target] in found else None)
+            latencies.sort()
+            hit = sum(r is not None for r in ranks) / len(ranks)
+            mrr = sum(1 / r for r in ranks if r) / len(ranks)
+            print(f"{kind:<11}{mode:<9}{hit:>7.2f}{mrr:>7.3f}"
+                  f"{statistics.median(latencies) * 1000:>9.2f}"
+                  f"{latencies[int(0.95 * (len(latencies) - 1))] * 1000:>9.2f}")
+
+if __name__ == "__main__":
+    main()
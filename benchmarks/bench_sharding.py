@@ -0,0 +1,95 @@
+"""Benchmark: vector query latency as the shard count and corpus size grow.
+
+    python benchmarks/bench_sharding.py --sizes 20000 100000 --shards 1 2 4 8
+    python benchmarks/bench_sharding.py --backend chroma --sizes 20000
+
+Random unit vectors (no model needed) in documents of --doc-chunks chunks,
+split across the shards by document id exactly as VECTOR_SHARDS does. For
+each size and shard count reports ingest rate, the p50/p95 latency of a
+top-k query over the whole corpus (fanned out to every shard, merged with
+a heap), throughput with --concurrency queries in flight, and the p50 of a
+query filtered to one document (routed to its shard only). Shards are
+searched in parallel, so the gain depends on the cores available.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from bench_vector_backends import unit_vectors, open_backend
+from app.services.sharding import ShardedCollection
+
+def run(size: int, shards: int, args) -> dict:
+    path = tempfile.mkdtemp(prefix=f"bench-shards{shards}-")
+    try:
+        stores = [open_backend(args.backend, os.path.join(path, f"shard_{i:03d}")) for i in range(shards)]
+        collection = stores[0] if shards == 1 else ShardedCollection(stores)
+        start = time.perf_counter()
+        for doc, offset in enumerate(range(0, size, args.doc_chunks)):
+            vectors = unit_vectors(min(args.doc_chunks, size - offset), args.dim, seed=offset)
+            collection.add(
+                ids=[f"doc{doc}_chunk_{i}" for i in range(len(vectors))],
+                embeddings=vectors.tolist() if args.backend == "chroma" else vectors,
+                documents=[f"chunk {offset + i}" for i in range(len(vectors))],
+                metadatas=[{"document_id": f"doc{doc}", "chunk_index": i} for i in range(len(vectors))]
+            )
+        ingest_seconds = time.perf_counter() - start
+
+        queries = unit_vectors(args.queries, args.dim, seed=-1 % 2**32).tolist()
+
+        def query(embedding, where=None):
+            start = time.perf_counter()
+            collection.query(query_embeddings=[embedding], n_results=args.k, where=where,
+                             include=["documents", "metadatas"])
+            return time.perf_counter() - start
+
+        for embedding in queries[:10]:
+            query(embedding)
+        latencies = sorted(query(embedding) for embedding in queries)
+        filtered = [query(embedding, where={"document_id": f"doc{i % (size // args.doc_chunks)}"})
+                    for i, embedding in enumerate(queries)]
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(query, queries))
+            qps = len(queries) / (time.perf_counter() - start)
+
+        return {
+            "ingest_per_s": size / ingest_seconds,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+            "qps": qps,
+            "filtered_p50_ms": statistics.median(filtered) * 1000
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000], help="chunks in the corpus")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--doc-chunks", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8, help="queries in flight for the qps column")
+    args = parser.parse_args()
+
+    print(f"{args.backend}, dim {args.dim}, k={args.k}, {os.cpu_count()} CPUs\n")
+    print(f"{'chunks':>9}{'shards':>8}{'ingest/s':>11}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'qps':>9}{'1-doc p50 ms':>14}")
+    for size in args.sizes:
+        for shards in args.shards:
+            r = run(size, shards, args)
+            print(f"{size:>9}{shards:>8}{r['ingest_per_s']:>11.0f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                  f"{r['qps']:>9.0f}{r['filtered_p50_ms']:>14.2f}")
+
+if __name__ == "__main__":
+    main()
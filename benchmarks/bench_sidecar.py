@@ -0,0 +1,138 @@
+"""Benchmark: memory and throughput of N workers, in-process model vs. the sidecar.
+
+    python benchmarks/bench_sidecar.py --workers 1 4 8
+    python benchmarks/bench_sidecar.py --embedder hashing --seconds 5
+
+Starts N worker processes (fresh interpreters, like uvicorn --workers N).
+Each one embeds a question and runs a dense top-k search against a
+synthetic --chunks chunk corpus, in --threads threads, for --seconds. In
+"in-process" mode every worker loads its own model and opens the vector
+store itself. In "sidecar" mode they go through `python -m app.sidecar
+--index` on a Unix socket. Reports the summed RSS of every process
+(workers, plus the sidecar) and retrievals/s. RSS is read from /proc, so
+this runs on Linux.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import subprocess
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from synthetic_pdf import WORDS
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CHILD = """
+import sys, json, time, threading
+from app.services import vector_store
+from app.services.sidecar import SidecarEmbedder
+seconds, threads, seed = float(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+vector_store.retrieve_chunks("warm-up", k=5, mode="dense")
+print("ready", flush=True)
+sys.stdin.readline()
+deadline = time.perf_counter() + seconds
+counts = []
+def run(thread):
+    n = 0
+    while time.perf_counter() < deadline:
+        vector_store.retrieve_chunks(f"relief valve {seed} {thread} {n}", k=5, mode="dense")
+        n += 1
+    counts.append(n)
+workers = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+for w in workers: w.start()
+for w in workers: w.join()
+with open("/proc/self/status") as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS"))
+print(json.dumps({"retrievals": sum(counts), "rss_kb": rss,
+                  "sidecar": isinstance(vector_store.get_embedder(), SidecarEmbedder)}), flush=True)
+"""
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS")) / 1024
+
+def start_sidecar(env: dict, path: str) -> subprocess.Popen:
+    sidecar = subprocess.Popen([sys.executable, "-m", "app.sidecar", "--socket", path, "--index"],
+                               cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    line = sidecar.stdout.readline()
+    if "serving" not in line:
+        sidecar.kill()
+        raise SystemExit(f"Sidecar failed to start: {line}")
+    return sidecar
+
+def run(mode: str, workers: int, env: dict, args) -> dict:
+    env = dict(env)
+    sidecar = None
+    if mode == "sidecar":
+        env["EMBEDDING_SIDECAR_SOCKET"] = os.path.join(tempfile.mkdtemp(prefix="sidecar-"), "sidecar.sock")
+        sidecar = start_sidecar(env, env["EMBEDDING_SIDECAR_SOCKET"])
+    try:
+        children = [
+            subprocess.Popen([sys.executable, "-c", CHILD, str(args.seconds), str(args.threads), str(i)],
+                             cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            for i in range(workers)
+        ]
+        for child in children:
+            if child.stdout.readline().strip() != "ready":
+                raise SystemExit("A worker failed to start")
+        for child in children:
+            child.stdin.write("go\n")
+            child.stdin.flush()
+        results = [json.loads(child.stdout.readline()) for child in children]
+        for child in children:
+            child.wait()
+        if mode == "sidecar" and not all(r["sidecar"] for r in results):
+            raise SystemExit("A worker fell back to its own model")
+        worker_rss = sum(r["rss_kb"] for r in results) / 1024
+        sidecar_rss = rss_mb(sidecar.pid) if sidecar else 0.0
+        return {
+            "rss_mb": worker_rss + sidecar_rss,
+            "worker_rss_mb": worker_rss / workers,
+            "sidecar_rss_mb": sidecar_rss,
+            "per_second": sum(r["retrievals"] for r in results) / args.seconds
+        }
+    finally:
+        if sidecar is not None:
+            sidecar.terminate()
+            sidecar.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--modes", nargs="+", choices=["in-process", "sidecar"], default=["in-process", "sidecar"])
+    parser.add_argument("--embedder", default=None, help="EMBEDDER_BACKEND (default: configured)")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4, help="concurrent requests per worker")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Throwaway store; must be set before the app modules read settings
+    workdir = tempfile.mkdtemp(prefix="bench-sidecar-")
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical")
+    os.environ.pop("EMBEDDING_SIDECAR_SOCKET", None)
+    if args.embedder:
+        os.environ["EMBEDDER_BACKEND"] = args.embedder
+    from app.services.vector_store import add_document_chunks, get_embedder
+
+    rng = random.Random(args.seed)
+    texts = [" ".join(rng.choice(WORDS) for _ in range(60)) + "." for _ in range(args.chunks)]
+    for d in range(0, len(texts), 500):
+        add_document_chunks(f"doc{d // 500:04d}", texts[d:d + 500])
+
+    print(f"{get_embedder().model_id}, {args.chunks} chunks, {args.threads} threads per worker, "
+          f"{os.cpu_count()} CPUs\n")
+    print(f"{'mode':<12}{'workers':>8}{'RSS MB':>10}{'per worker':>12}{'sidecar':>10}{'retrievals/s':>14}")
+    for mode in args.modes:
+        for workers in args.workers:
+            r = run(mode, workers, dict(os.environ), args)
+            print(f"{mode:<12}{workers:>8}{r['rss_mb']:>10.0f}{r['worker_rss_mb']:>12.0f}"
+                  f"{r['sidecar_rss_mb']:>10.0f}{r['per_second']:>14.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark: cold-start cost of the API.
+
+    python benchmarks/bench_startup.py --runs 3
+
+Each run uses a fresh interpreter and reports how long `import app.main`
+takes (what the server pays before it can accept connections) and how long
+each heavy component takes to initialize during warm-up.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app.main
+import_seconds = time.perf_counter() - start
+from app.services.startup import warm_up, component_status
+start = time.perf_counter()
+warm_up()
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "warm_up_seconds": time.perf_counter() - start,
+    "components": component_status()
+}))
+"""
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f"{'step':<16}{'median s':>10}{'max s':>10}")
+    rows = [("import app.main", [r["import_seconds"] for r in runs])]
+    for name in runs[0]["components"]:
+        rows.append((name, [r["components"][name].get("seconds", 0.0) for r in runs]))
+    rows.append(("warm-up total", [r["warm_up_seconds"] for r in runs]))
+    for name, values in rows:
+        print(f"{name:<16}{statistics.median(values):>10.3f}{max(values):>10.3f}")
+
+if __name__ == "__main__":
+    main()
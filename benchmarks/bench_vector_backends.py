@@ -0,0 +1,109 @@
+"""Benchmark: NumPy memory-mapped float16 index vs. ChromaDB.
+
+    python benchmarks/bench_vector_backends.py --sizes 10000 100000 1000000
+    python benchmarks/bench_vector_backends.py --sizes 1000000 --backends numpy
+
+Random unit vectors (no model needed), added in documents of --doc-chunks
+chunks. For each size and backend reports ingest rate, single-query p50/p95,
+throughput when --batch queries are scored together, disk usage, and recall@k
+against exact search (Chroma's HNSW is approximate).
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.numpy_index import NumpyVectorIndex
+
+def unit_vectors(rows: int, dim: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def open_backend(name: str, path: str):
+    if name == "numpy":
+        return NumpyVectorIndex(path)
+    import chromadb
+    return chromadb.PersistentClient(path=path).get_or_create_collection("documents")
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def run(name: str, size: int, args) -> dict:
+    path = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        collection = open_backend(name, path)
+        start = time.perf_counter()
+        for doc, offset in enumerate(range(0, size, args.doc_chunks)):
+            vectors = unit_vectors(min(args.doc_chunks, size - offset), args.dim, seed=offset)
+            collection.add(
+                ids=[f"doc{doc}_chunk_{i}" for i in range(len(vectors))],
+                embeddings=vectors.tolist() if name == "chroma" else vectors,
+                documents=[f"chunk {offset + i}" for i in range(len(vectors))],
+                metadatas=[{"document_id": f"doc{doc}", "chunk_index": i} for i in range(len(vectors))]
+            )
+        ingest_seconds = time.perf_counter() - start
+
+        queries = unit_vectors(args.queries, args.dim, seed=-1 % 2**32)
+        latencies, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=args.k)
+            latencies.append(time.perf_counter() - start)
+            found.append(result["ids"][0])
+        latencies.sort()
+
+        start = time.perf_counter()
+        for offset in range(0, len(queries), args.batch):
+            collection.query(query_embeddings=queries[offset:offset + args.batch].tolist(), n_results=args.k)
+        batch_qps = len(queries) / (time.perf_counter() - start)
+
+        return {
+            "ingest_per_s": size / ingest_seconds,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+            "batch_qps": batch_qps,
+            "disk_mb": dir_size(path) / 2**20,
+            "found": found
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def exact_top_k(size: int, args, queries: np.ndarray) -> list:
+    """Ground truth in float32, recomputed block by block"""
+    best = [[] for _ in queries]
+    for doc, offset in enumerate(range(0, size, args.doc_chunks)):
+        vectors = unit_vectors(min(args.doc_chunks, size - offset), args.dim, seed=offset)
+        scores = queries @ vectors.T
+        for q in range(len(queries)):
+            best[q].extend((scores[q, i], f"doc{doc}_chunk_{i}") for i in range(len(vectors)))
+            best[q] = sorted(best[q], reverse=True)[:args.k]
+    return [[chunk_id for _, chunk_id in b] for b in best]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--doc-chunks", type=int, default=5000, help="chunks per add() call")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>9} {'backend':<8}{'ingest/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'batch qps':>11}{'disk MB':>9}{'recall':>8}")
+    for size in args.sizes:
+        truth = exact_top_k(size, args, unit_vectors(args.queries, args.dim, seed=-1 % 2**32))
+        for name in args.backends:
+            r = run(name, size, args)
+            recall = statistics.mean(len(set(f) & set(t)) / args.k for f, t in zip(r["found"], truth))
+            print(f"{size:>9} {name:<8}{r['ingest_per_s']:>10.0f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                  f"{r['batch_qps']:>11.0f}{r['disk_mb']:>9.1f}{recall:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Local stand-ins for the LLM providers (benchmarks and load tests).
+
+A spec is NAME=DISTRIBUTION[,fail=RATE], the distribution one of
+    fixed:MS               always MS milliseconds
+    uniform:LO:HI          uniform between LO and HI ms
+    lognormal:MEDIAN:SIGMA log-normal around MEDIAN ms (SIGMA ~0.3-0.8 for
+                           the long tail real APIs show)
+e.g. "primary=lognormal:300:0.5,fail=0.05". A failing call raises after
+its sampled latency, like an API returning an error.
+"""
+import math
+import random
+import asyncio
+from typing import AsyncIterator
+
+from app.services import llm_providers
+from app.services.llm_providers import LLMProvider
+
+class FakeLLMProvider(LLMProvider):
+    """Answers with a canned text after a sampled latency; fails at failure_rate"""
+
+    def __init__(self, name: str, priority: int, latency: tuple = ("fixed", 0.0),
+                 failure_rate: float = 0.0, seed: int = 0, tokens: int = 20):
+        super().__init__(name, priority)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(f"{seed}-{name}")
+        self.tokens = tokens
+        self.calls = 0
+        self.failures = 0
+
+    def sample_latency(self) -> float:
+        """Seconds"""
+        kind, *params = self.latency
+        if kind == "fixed":
+            ms = params[0]
+        elif kind == "uniform":
+            ms = self.rng.uniform(params[0], params[1])
+        else:
+            ms = self.rng.lognormvariate(math.log(max(params[0], 1e-3)), params[1])
+        return ms / 1000
+
+    async def agenerate(self, request) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.sample_latency())
+        if self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise RuntimeError(f"{self.name}: simulated provider error")
+        return " ".join(f"token{i}" for i in range(self.tokens))
+
+    async def astream(self, request) -> AsyncIterator[str]:
+        # Latency to the first token, then the answer in pieces
+        answer = await self.agenerate(request)
+        for word in answer.split(" "):
+            yield word + " "
+            await asyncio.sleep(0)
+
+def parse_spec(spec: str) -> dict:
+    """"primary=lognormal:300:0.5,fail=0.05" -> FakeLLMProvider keyword arguments"""
+    name, _, rest = spec.partition("=")
+    if not name or not rest:
+        raise ValueError(f"Bad provider spec {spec!r}, expected NAME=DISTRIBUTION[,fail=RATE]")
+    distribution, *options = rest.split(",")
+    kind, *params = distribution.split(":")
+    expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+    if kind not in expected or len(params) != expected[kind]:
+        raise ValueError(f"Bad latency distribution {distribution!r}")
+    failure_rate = 0.0
+    for option in options:
+        key, _, value = option.partition("=")
+        if key != "fail":
+            raise ValueError(f"Unknown provider option {option!r}")
+        failure_rate = float(value)
+    return {"name": name, "latency": (kind, *map(float, params)), "failure_rate": failure_rate}
+
+def install(specs: list[str], seed: int = 0) -> list[FakeLLMProvider]:
+    """Replace the configured providers (in place, so every importer sees
+    them) with fakes, in the order given"""
+    providers = [FakeLLMProvider(priority=i + 1, seed=seed, **parse_spec(spec)) for i, spec in enumerate(specs)]
+    llm_providers.PROVIDERS[:] = providers
+    return providers
@@ -0,0 +1,54 @@
+"""The word-window chunker ingestion used before sentence-aware, token-budgeted
+chunking (app.utils.text_processing.chunk_document); kept as the baseline the
+benchmarks compare against, and to build chunks without character offsets
+like the ones stored by older versions.
+"""
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator
+
+def _effective_overlap(chunk_size: int, overlap: int) -> int:
+    # An overlap >= chunk_size would never advance; fall back to the
+    # default 20% ratio
+    return overlap if overlap < chunk_size else chunk_size // 5
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
+    """Split text into overlapping chunks of chunk_size words"""
+    if not text.strip():
+        return []
+
+    overlap = _effective_overlap(chunk_size, overlap)
+    words = text.split()
+    chunks = []
+    start = 0
+
+    while start < len(words):
+        end = start + chunk_size
+        chunk = " ".join(words[start:end])
+        if chunk.strip():
+            chunks.append(chunk)
+        # Move start position (with overlap)
+        start = end - overlap
+        if end >= len(words):
+            break
+
+    return chunks
+
+def chunk_pages(pages: Iterable[str], chunk_size: int = 1000, overlap: int = 200) -> Iterator[str]:
+    """Streaming chunk_text: consume page texts as they arrive and yield the
+    same chunks chunk_text(clean_text("\\n".join(pages))) would return"""
+    overlap = _effective_overlap(chunk_size, overlap)
+    step = chunk_size - overlap
+    window = deque()
+
+    for page in pages:
+        window.extend(page.split())
+        # Only emit a full window once more words follow it; the last window
+        # is emitted at the end (as chunk_text does)
+        while len(window) > chunk_size:
+            yield " ".join(islice(window, chunk_size))
+            for _ in range(step):
+                window.popleft()
+
+    if window:
+        yield " ".join(window)
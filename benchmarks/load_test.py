@@ -0,0 +1,278 @@
+"""Load test: offline end-to-end ingest and query benchmark of the API.
+
+    python benchmarks/load_test.py --output results.json
+    python benchmarks/load_test.py --baseline baseline.json --tolerance 0.15
+    python benchmarks/load_test.py --provider primary=fixed:200,fail=0.2 --provider backup=fixed:500
+
+Runs the app in-process (no network, no API keys, no model download) on
+throwaway stores: a synthetic PDF corpus is uploaded through POST /upload
+(pages/s, chunks/s, per-upload latency), then POST /query is driven at each
+--concurrency level (p50/p95/p99 latency, QPS, success rate, providers
+used). LLM calls go to fake providers with the given latency and failure
+distributions (see fake_providers.py); embeddings come from --embedder
+(default: the deterministic hashing embedder). Results are written as JSON;
+with --baseline, metrics worse than the baseline by more than --tolerance
+are flagged and the exit status is 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from synthetic_pdf import WORDS, build_pdf
+
+DEFAULT_PROVIDERS = ["primary=lognormal:250:0.4,fail=0.05", "backup=lognormal:600:0.3"]
+
+# Metric -> True when higher is better; everything else is compared as a latency
+HIGHER_IS_BETTER = {"pages_per_second", "chunks_per_second", "qps", "success_rate"}
+COMPARED_LATENCIES = {"p50_ms", "p95_ms", "p99_ms"}  # max_ms is reported, too noisy to gate on
+# Run settings that make two results comparable
+SETTINGS_KEYS = ["cpus", "embedder", "providers", "documents", "pages_per_document", "queries_per_level"]
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile (0 for no values)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(p / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+def latency_summary(seconds: list[float]) -> dict:
+    """Milliseconds"""
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds, default=0.0) * 1000, 3),
+    }
+
+def build_questions(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [f"What does the {' '.join(rng.sample(WORDS, 4))} section say?" for _ in range(count)]
+
+async def run_ingest(client, args) -> dict:
+    """Upload the synthetic corpus, --upload-concurrency files at a time"""
+    pdfs = [(f"synthetic_{i:04d}.pdf", build_pdf(args.pages, seed=args.seed * 10_000 + i))
+            for i in range(args.documents)]
+    semaphore = asyncio.Semaphore(args.upload_concurrency)
+    latencies, results = [], []
+
+    async def upload(filename: str, data: bytes):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/upload", files={"file": (filename, data, "application/pdf")})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"Upload of {filename} failed: {response.status_code} {response.text}")
+            results.append(response.json())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(filename, data) for filename, data in pdfs))
+    seconds = time.perf_counter() - start
+    pages = sum(r["pages"] for r in results)
+    chunks = sum(r["chunks_created"] for r in results)
+    return {
+        "documents": len(results),
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 3),
+        **latency_summary(latencies),
+    }
+
+async def run_queries(client, questions: list[str], concurrency: int) -> dict:
+    """Send every question with `concurrency` requests in flight"""
+    queue = list(reversed(questions))
+    latencies, providers = [], {}
+    succeeded = 0
+
+    async def worker():
+        nonlocal succeeded
+        while queue:
+            question = queue.pop()
+            start = time.perf_counter()
+            response = await client.post("/query", json={"question": question})
+            latencies.append(time.perf_counter() - start)
+            body = response.json() if response.status_code == 200 else {}
+            if body.get("success"):
+                succeeded += 1
+            provider = body.get("provider_used", f"http_{response.status_code}")
+            providers[provider] = providers.get(provider, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    return {
+        "queries": len(latencies),
+        "seconds": round(seconds, 3),
+        "qps": round(len(latencies) / seconds, 3),
+        "success_rate": round(succeeded / len(latencies), 4) if latencies else 0.0,
+        **latency_summary(latencies),
+        "providers": providers,
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+async def run_suite(args) -> dict:
+    """Run ingest and query phases; returns the results document.
+    Stores and settings come from the environment, set by main()."""
+    import httpx
+    from app.main import app
+    from app.api import upload as upload_api
+    from fake_providers import install
+
+    # The per-deployment document cap does not apply to a benchmark corpus
+    upload_api.DOC_LIMIT = max(upload_api.DOC_LIMIT, args.documents)
+
+    results = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "embedder": args.embedder,
+            "providers": args.provider,
+            "documents": args.documents,
+            "pages_per_document": args.pages,
+            "queries_per_level": args.queries,
+            "seed": args.seed,
+        },
+        "query": {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+        results["ingest"] = await run_ingest(client, args)
+        # Warm-up (model, collection, code paths) outside the measurements
+        install(args.provider, seed=args.seed)
+        await run_queries(client, build_questions(10, args.seed + 1), 2)
+        for level, concurrency in enumerate(args.concurrency):
+            # Fresh providers (breakers, random streams) for every level
+            install(args.provider, seed=args.seed + level)
+            questions = build_questions(args.queries, args.seed + 100 + level)
+            results["query"][f"c{concurrency}"] = await run_queries(client, questions, concurrency)
+    return results
+
+def flatten(results: dict) -> dict:
+    """{"ingest.pages_per_second": ..., "query.c4.p95_ms": ...} for comparable metrics"""
+    metrics = {}
+    for key, value in results.get("ingest", {}).items():
+        if key in HIGHER_IS_BETTER or key in COMPARED_LATENCIES:
+            metrics[f"ingest.{key}"] = value
+    for level, stats in results.get("query", {}).items():
+        for key, value in stats.items():
+            if key in HIGHER_IS_BETTER or key in COMPARED_LATENCIES:
+                metrics[f"query.{level}.{key}"] = value
+    return metrics
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Every metric present in both, with its relative change and whether
+    it regressed by more than tolerance (0.1 = 10% slower/lower)"""
+    current, previous = flatten(results), flatten(baseline)
+    rows = []
+    for name in sorted(current.keys() & previous.keys()):
+        before, after = previous[name], current[name]
+        change = (after - before) / before if before else 0.0
+        higher_is_better = name.rsplit(".", 1)[-1] in HIGHER_IS_BETTER
+        worse = -change if higher_is_better else change
+        rows.append({
+            "metric": name,
+            "baseline": before,
+            "current": after,
+            "change": round(change, 4),
+            "regression": worse > tolerance,
+        })
+    return rows
+
+def print_report(results: dict):
+    ingest = results["ingest"]
+    print(f"ingest: {ingest['documents']} documents, {ingest['pages']} pages, {ingest['chunks']} chunks "
+          f"in {ingest['seconds']:.2f}s -> {ingest['pages_per_second']:.1f} pages/s, "
+          f"{ingest['chunks_per_second']:.1f} chunks/s (upload p50 {ingest['p50_ms']:.0f} ms)\n")
+    print(f"{'concurrency':>11}{'qps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'success':>9}  providers")
+    for level, stats in results["query"].items():
+        print(f"{level[1:]:>11}{stats['qps']:>9.1f}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['success_rate']:>9.1%}  {stats['providers']}")
+
+def settings_mismatch(results: dict, baseline: dict) -> list[str]:
+    """Run settings that differ from the baseline's"""
+    current, previous = results.get("meta", {}), baseline.get("meta", {})
+    return [key for key in SETTINGS_KEYS if current.get(key) != previous.get(key)]
+
+def print_comparison(rows: list[dict], tolerance: float, mismatch: list[str]):
+    print(f"\nvs. baseline (tolerance {tolerance:.0%}):")
+    if mismatch:
+        print(f"  warning: baseline was run with different {', '.join(mismatch)}")
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"  {row['metric']:<32}{row['baseline']:>12.2f}{row['current']:>12.2f}{row['change']:>+9.1%}  {flag}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=20, help="pages per synthetic PDF")
+    parser.add_argument("--upload-concurrency", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=200, help="per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--provider", action="append", default=None,
+                        help="fake provider spec, in fallback order (repeatable); default: "
+                             + " ".join(DEFAULT_PROVIDERS))
+    parser.add_argument("--embedder", default="hashing", help="EMBEDDER_BACKEND to use")
+    parser.add_argument("--semantic-cache", action="store_true", help="leave the answer cache on")
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    args.provider = args.provider or DEFAULT_PROVIDERS
+
+    # Throwaway stores; must be set before the app modules read settings
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    os.environ["EMBEDDER_BACKEND"] = args.embedder
+    os.environ["CHROMA_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "metadata.db")
+    os.environ["CORPUS_VERSION_PATH"] = os.path.join(workdir, "corpus_version")
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["SEMANTIC_CACHE_ENABLED"] = str(args.semantic_cache)
+    for key in ("OPENAI_API_KEY", "GOOGLE_GEMINI_API_KEY", "COHERE_API_KEY"):
+        os.environ.setdefault(key, "offline")
+
+    results = asyncio.run(run_suite(args))
+    print_report(results)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.tolerance)
+        mismatch = settings_mismatch(results, baseline)
+        results["comparison"] = {
+            "baseline": args.baseline, "tolerance": args.tolerance,
+            "settings_mismatch": mismatch, "metrics": rows
+        }
+        print_comparison(rows, args.tolerance, mismatch)
+        if any(row["regression"] for row in rows):
+            status = 1
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
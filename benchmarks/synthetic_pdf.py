@@ -0,0 +1,67 @@
+"""Synthetic PDF generator for benchmarks and tests (no extra dependencies)"""
+import random
+
+WORDS = (
+    "retrieval augmented generation vector embedding chunk document query answer "
+    "pipeline index latency throughput provider fallback context token model "
+    "section figure table appendix invoice contract policy warranty clause "
+    "revenue quarter forecast customer support shipment inventory supplier"
+).split()
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def page_lines(page_number: int, lines: int = 40, words_per_line: int = 12, seed: int = 0) -> list[str]:
+    """Deterministic pseudo-random text for one page"""
+    rng = random.Random(seed * 100003 + page_number)
+    out = [f"Page {page_number + 1} part-{seed}-{page_number:05d}"]
+    for _ in range(lines - 1):
+        out.append(" ".join(rng.choice(WORDS) for _ in range(words_per_line)) + ".")
+    return out
+
+def build_pdf(pages: int, lines: int = 40, words_per_line: int = 12, seed: int = 0) -> bytes:
+    """Build a text PDF with the given number of pages"""
+    objects = []  # object bodies, object N is objects[N - 1]
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # filled in below
+    pages_obj = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for number in range(pages):
+        text = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+        for line in page_lines(number, lines, words_per_line, seed):
+            text.append(f"({_escape(line)}) '")
+        text.append("ET")
+        stream = "\n".join(text).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+        ))
+
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+def write_pdf(path: str, pages: int, **kwargs) -> str:
+    with open(path, "wb") as f:
+        f.write(build_pdf(pages, **kwargs))
+    return path
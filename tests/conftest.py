@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+# Run the suite on the deterministic hashing embedder, a throwaway vector
+# store and metadata database, so no model download is needed and ./data is
+# left alone (set these variables to override)
+os.environ.setdefault("EMBEDDER_BACKEND", "hashing")
+os.environ.setdefault("CHROMA_PATH", tempfile.mkdtemp(prefix="chroma-test-"))
+os.environ.setdefault("LEXICAL_INDEX_PATH", tempfile.mkdtemp(prefix="lexical-test-"))
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="metadata-test-"), "metadata.db"))
+os.environ.setdefault("CORPUS_VERSION_PATH", os.path.join(tempfile.mkdtemp(prefix="corpus-test-"), "corpus_version"))
+
+import asyncio
+from app.services.llm_providers import LLMProvider
+
+class FakeProvider(LLMProvider):
+    """Local stand-in for an LLM provider.
+
+    Answers `answer` (or answer(request)) after `delay` seconds (or
+    delay(request)); fail=True raises "<name> broke" instead. astream sends
+    `tokens` (default: the whole answer), token_delay apart, and raises
+    after fail_after of them. Records the calls, the context each was
+    given, whether one was cancelled and the most calls in flight at once."""
+    def __init__(self, name: str = "fake", priority: int = 1, answer=None, delay=0.0,
+                 fail: bool = False, tokens=None, token_delay: float = 0.0, fail_after=None):
+        super().__init__(name, priority)
+        if answer is None:
+            answer = "".join(tokens) if tokens else f"answer from {name}"
+        self.answer = answer
+        self.delay = delay
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.fail_after = 0 if fail else fail_after  # tokens sent before raising (None = never)
+        self.calls = 0
+        self.contexts = []
+        self.cancelled = False
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _start(self, request):
+        self.calls += 1
+        self.contexts.append(request.context_for(self.name))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay(request) if callable(self.delay) else self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def _answer(self, request) -> str:
+        return self.answer(request) if callable(self.answer) else self.answer
+
+    async def agenerate(self, request):
+        await self._start(request)
+        if self.fail_after is not None:
+            raise RuntimeError(f"{self.name} broke")
+        return self._answer(request)
+
+    async def astream(self, request):
+        await self._start(request)
+        tokens = self.tokens if self.tokens is not None else [self._answer(request)]
+        for i, token in enumerate(tokens):
+            if i == self.fail_after:
+                raise RuntimeError(f"{self.name} broke")
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield token
+        if self.fail_after is not None and self.fail_after >= len(tokens):
+            raise RuntimeError(f"{self.name} broke")
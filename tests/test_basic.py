@@ -4,6 +4,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'a
 
 import pytest
 import json
+import tempfile
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -85,15 +86,15 @@ async def test_vector_store_functions():
 @pytest.mark.asyncio 
 async def test_text_processing():
     """Test text processing functions"""
-    from app.utils.text_processing import chunk_text, clean_text
+    from app.utils.text_processing import chunk_document, clean_text
     
     test_text = "This is a test document. " * 100
     cleaned = clean_text(test_text)
-    chunks = chunk_text(cleaned, chunk_size=50)
+    chunks = list(chunk_document([test_text], max_tokens=50))
     
     assert len(cleaned) > 0
     assert len(chunks) > 0
-    assert all(isinstance(chunk, str) for chunk in chunks)
+    assert all(isinstance(chunk.text, str) for chunk in chunks)
 
 def test_llm_providers_import():
     """Test that LLM providers can be imported"""
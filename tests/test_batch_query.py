@@ -0,0 +1,114 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.api import query as query_api
+from app.services import llm_providers, vector_store
+from app.services.vector_store import add_document_chunks, delete_document_chunks, retrieve_chunks, retrieve_chunks_batch
+from conftest import FakeProvider
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    """Retrieval stand-ins that count batch calls"""
+    calls = {"embed": 0, "retrieve": 0}
+
+    def fake_embed(texts):
+        calls["embed"] += 1
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    def fake_retrieve_batch(requests, include_embeddings=False):
+        calls["retrieve"] += 1
+        return [[{"id": f"doc_chunk_{i}", "text": f"chunk for {r['query']}", "metadata": {}}]
+                for i, r in enumerate(requests)]
+
+    provider = FakeProvider(answer=lambda request: f"answer to {request.query}",
+                            delay=lambda request: float(request.query.split()[-1]))
+    monkeypatch.setattr(query_api, "embed_chunks", fake_embed)
+    monkeypatch.setattr(query_api, "retrieve_chunks_batch", fake_retrieve_batch)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [provider])
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "BATCH_PROVIDER_CONCURRENCY", 3)
+    return calls, provider
+
+# Questions end with the provider delay in seconds
+DELAYS = [0.2, 0.0, 0.1, 0.05, 0.0, 0.15, 0.0, 0.1]
+QUESTIONS = [f"question {i} {delay}" for i, delay in enumerate(DELAYS)]
+
+def test_batch_results_in_request_order(fake_pipeline):
+    calls, provider = fake_pipeline
+
+    response = TestClient(app).post("/query/batch", json={
+        "queries": [{"question": q} for q in QUESTIONS] + [{"question": "  "}]
+    })
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["answer"] for r in results[:-1]] == [f"answer to {q}" for q in QUESTIONS]
+    assert all(r["success"] for r in results[:-1])
+    assert results[-1]["success"] is False and results[-1]["error"] == "Question cannot be empty"
+    # One embedding call and one retrieval call for the whole batch
+    assert calls == {"embed": 1, "retrieve": 1}
+    assert provider.max_in_flight == 3
+
+def test_batch_streams_ndjson_as_items_finish(fake_pipeline):
+    response = TestClient(app).post("/query/batch?stream=true", json={
+        "queries": [{"question": q} for q in QUESTIONS]
+    })
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == list(range(len(QUESTIONS)))
+    # Quick answers come out before the slowest one
+    assert lines[-1]["index"] != 1
+    assert lines[0]["answer"] == f"answer to {QUESTIONS[lines[0]['index']]}"
+
+def test_batch_size_limit(monkeypatch):
+    client = TestClient(app)
+    assert client.post("/query/batch", json={"queries": []}).status_code == 422
+    too_many = [{"question": "q"}] * (settings.BATCH_MAX_QUERIES + 1)
+    assert client.post("/query/batch", json={"queries": too_many}).status_code == 422
+
+class CountingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(len(kwargs["query_embeddings"]))
+        return self.collection.query(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+def test_batch_retrieval_matches_single_queries(monkeypatch):
+    a, b = str(uuid.uuid4()), str(uuid.uuid4())
+    add_document_chunks(a, ["pump service interval is one year", "warranty lasts two years", "seal kit XK-4821"])
+    add_document_chunks(b, ["invoice total is 400 euros", "payment due in thirty days"])
+    requests = [
+        {"query": "pump service", "k": 1, "mode": "dense", "doc_ids": [a]},
+        {"query": "warranty years", "k": 2, "mode": "hybrid", "doc_ids": [a]},
+        {"query": "XK-4821", "k": 1, "mode": "lexical", "doc_ids": [a, b]},
+        {"query": "invoice payment", "k": 3, "mode": "hybrid", "doc_ids": [a, b]},
+        {"query": "anything", "k": 3, "mode": "dense", "doc_ids": []},
+    ]
+    try:
+        expected = [retrieve_chunks(**r) for r in requests]
+        counting = CountingCollection(vector_store.get_collection())
+        monkeypatch.setattr(vector_store, "get_collection", lambda: counting)
+
+        results = retrieve_chunks_batch(requests)
+    finally:
+        delete_document_chunks(a)
+        delete_document_chunks(b)
+
+    assert [[h["id"] for h in hits] for hits in results] == [[h["id"] for h in hits] for hits in expected]
+    assert results[2][0]["text"] == "seal kit XK-4821"
+    assert results[4] == []
+    # One multi-vector query per document scope
+    assert sorted(counting.queries) == [1, 2]
@@ -0,0 +1,106 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import random
+import itertools
+import pytest
+from fastapi.testclient import TestClient
+from synthetic_pdf import build_pdf, page_lines
+from app.main import app
+from app.config import settings
+from app.api import upload as upload_api
+from app.services.doc_store import delete_document
+from app.services.vector_store import get_collection, delete_document_chunks, get_embedder
+from app.utils.text_processing import chunk_document, clean_text, approx_token_count
+
+PAGES = [
+    "The pump must be serviced yearly. Use only approved seals.\n\n"
+    "Warranty claims need the serial number. Claims are answered in ten days!",
+    "",
+    "Is the valve covered? Only when installed by a certified technician.",
+]
+
+def cleaned(pages):
+    return " ".join(text for text in (clean_text(page) for page in pages) if text)
+
+def test_offsets_and_pages_point_into_cleaned_text():
+    full = cleaned(PAGES)
+    chunks = list(chunk_document(PAGES, max_tokens=12, overlap_tokens=0))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert full[chunk.start:chunk.end] == chunk.text
+        assert chunk.tokens <= 12
+    assert chunks[0].page_start == 1
+    assert chunks[-1].page_end == 3
+    assert "technician" in chunks[-1].text
+
+def test_chunks_end_on_sentence_boundaries_and_fit_budget():
+    pages = [" ".join(page_lines(n, seed=3)) for n in range(20)]
+    for chunk in chunk_document(pages, max_tokens=100, overlap_tokens=20):
+        assert chunk.text.endswith(".")
+        assert approx_token_count(chunk.text) <= 100
+
+def test_overlap_repeats_whole_trailing_sentences():
+    text = " ".join(f"Sentence number {i} is here." for i in range(30))
+    chunks = list(chunk_document(text, max_tokens=30, overlap_tokens=8))
+    for previous, current in zip(chunks, chunks[1:]):
+        first_sentence = current.text.split(". ")[0] + "."
+        assert previous.text.endswith(first_sentence)
+        assert current.start < previous.end
+
+def test_paragraph_break_ends_a_half_full_chunk():
+    pages = ["One two three four five. Six seven eight.\n\nNew paragraph starts here."]
+    chunks = list(chunk_document(pages, max_tokens=16, overlap_tokens=4))
+    assert [c.text for c in chunks] == ["One two three four five. Six seven eight.", "New paragraph starts here."]
+
+def test_long_sentence_is_split_at_words():
+    sentence = " ".join(f"w{i}" for i in range(100)) + "."
+    chunks = list(chunk_document([sentence], max_tokens=25, overlap_tokens=0))
+    assert len(chunks) >= 4
+    assert " ".join(c.text for c in chunks) == sentence
+    assert all(c.tokens <= 25 for c in chunks)
+
+def test_pluggable_token_counter():
+    text = "Short one. Another short one. And a third."
+    by_chars = list(chunk_document(text, max_tokens=20, overlap_tokens=0, count_tokens=len))
+    assert [c.text for c in by_chars] == ["Short one.", "Another short one.", "And a third."]
+
+def test_chunker_streams_pages():
+    endless = (f"Page {n} says hello. It has two sentences." for n in itertools.count())
+    first = next(chunk_document(endless, max_tokens=30))
+    assert first.text.startswith("Page 0 says hello.")
+
+client = TestClient(app)
+
+@pytest.fixture
+def uploaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(upload_api, "DOC_LIMIT", 10**6)
+    doc_ids = []
+    yield doc_ids
+    for doc_id in doc_ids:
+        delete_document_chunks(doc_id)
+        delete_document(doc_id)
+
+def upload(**params):
+    data = build_pdf(pages=4, lines=20, seed=random.randrange(10**9))
+    return client.post("/upload", params=params, files={"file": ("manual.pdf", data, "application/pdf")})
+
+def test_upload_chunk_size_and_positions_are_stored(uploaded):
+    small = upload(chunk_tokens=40, chunk_overlap=0).json()
+    large = upload(chunk_tokens=200).json()
+    uploaded.extend([small["document_id"], large["document_id"]])
+    assert small["chunks_created"] > large["chunks_created"]
+
+    stored = get_collection().get(where={"document_id": small["document_id"]}, include=["metadatas"])
+    metadatas = sorted(stored["metadatas"], key=lambda m: m["chunk_index"])
+    assert metadatas[0]["page_start"] == 1
+    assert metadatas[-1]["page_end"] == 4
+    assert all(m["start_char"] < m["end_char"] for m in metadatas)
+
+def test_upload_rejects_chunks_larger_than_embedder_window(uploaded):
+    response = upload(chunk_tokens=get_embedder().max_tokens + 1)
+    assert response.status_code == 400
+    assert "window" in response.json()["detail"]
@@ -0,0 +1,116 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.services import llm_providers
+from app.services.llm_providers import LLMRequest, generate_with_fallback, ordered_providers
+from app.services.provider_health import CircuitBreaker, ProviderStats, CLOSED, OPEN, HALF_OPEN
+from conftest import FakeProvider
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+REQUEST = LLMRequest(query="q", context="c")
+
+@pytest.fixture(autouse=True)
+def breaker_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "BREAKER_RESET_SECONDS", 10.0)
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(clock=clock)
+    stats = ProviderStats()
+
+    for _ in range(2):
+        breaker.before_call()
+        stats.record_failure("boom")
+        breaker.record_failure(stats)
+    assert breaker.state == OPEN
+    assert not breaker.is_available()
+
+    clock.now += 10.0
+    assert breaker.is_available()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time while half-open
+    assert not breaker.is_available()
+
+    stats.record_success(0.1)
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+def test_failed_probe_reopens_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(clock=clock)
+    stats = ProviderStats()
+    for _ in range(2):
+        stats.record_failure("boom")
+        breaker.record_failure(stats)
+
+    clock.now += 10.0
+    breaker.before_call()
+    stats.record_failure("still down")
+    breaker.record_failure(stats)
+
+    assert breaker.state == OPEN
+    assert breaker.to_dict()["retry_in_seconds"] == pytest.approx(10.0)
+
+def test_ewma_stats():
+    stats = ProviderStats(alpha=0.5)
+    stats.record_success(1.0)
+    stats.record_success(3.0)
+    stats.record_failure("x")
+
+    assert stats.ewma_latency == pytest.approx(2.0)
+    assert stats.error_rate == pytest.approx(0.5)
+    assert stats.consecutive_failures == 1
+
+@pytest.mark.asyncio
+async def test_open_provider_is_skipped(monkeypatch):
+    broken = FakeProvider("broken", 1, fail=True)
+    healthy = FakeProvider("healthy", 2)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [broken, healthy])
+
+    for _ in range(4):
+        result = await generate_with_fallback(REQUEST, strategy="sequential")
+        assert result["provider_used"] == "healthy"
+
+    # Tripped after two failures, then skipped entirely
+    assert broken.calls == 2
+    assert broken.breaker.state == OPEN
+
+def test_latency_ordering(monkeypatch):
+    slow = FakeProvider("slow", 1)
+    fast = FakeProvider("fast", 2)
+    slow.stats.record_success(2.0)
+    fast.stats.record_success(0.2)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [slow, fast])
+
+    monkeypatch.setattr(settings, "PROVIDER_ORDERING", "priority")
+    assert [p.name for p in ordered_providers()] == ["slow", "fast"]
+
+    monkeypatch.setattr(settings, "PROVIDER_ORDERING", "latency")
+    assert [p.name for p in ordered_providers()] == ["fast", "slow"]
+
+def test_provider_health_endpoint(monkeypatch):
+    broken = FakeProvider("broken", 1)
+    for _ in range(2):
+        broken.stats.record_failure("down")
+        broken.breaker.record_failure(broken.stats)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [broken, FakeProvider("healthy", 2)])
+
+    response = TestClient(app).get("/health/providers")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["current_order"] == ["healthy"]
+    states = {p["name"]: p["state"] for p in data["providers"]}
+    assert states == {"broken": "open", "healthy": "closed"}
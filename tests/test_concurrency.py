@@ -0,0 +1,58 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+import httpx
+import pytest
+from app.main import app
+from app.api import query as query_api
+from app.services import llm_providers
+from conftest import FakeProvider
+
+class BlockingSearch:
+    """Blocking search stand-in (simulates embedding + Chroma) that holds
+    every call until released"""
+    def __init__(self):
+        self.released = threading.Event()
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, query: str, k: int = 5, query_embedding=None, **kwargs) -> list[dict]:
+        with self.lock:
+            self.running += 1
+        try:
+            self.released.wait(timeout=5)
+        finally:
+            with self.lock:
+                self.running -= 1
+        return [{"id": "doc_chunk_0", "text": "some relevant chunk", "metadata": {}}]
+
+@pytest.mark.asyncio
+async def test_health_stays_fast_during_slow_queries(monkeypatch):
+    """/health answers while several slow queries are in flight"""
+    search = BlockingSearch()
+    monkeypatch.setattr(query_api, "retrieve_chunks", search)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [FakeProvider("slow", delay=0.2)])
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        queries = [
+            asyncio.create_task(client.post("/query", json={"question": f"question {i}"}))
+            for i in range(8)
+        ]
+        await asyncio.sleep(0.1)
+
+        health = await client.get("/health")
+        # Answered while the blocking searches were still running (had they
+        # run on the event loop, none would be running now)
+        searches_running = search.running
+        search.released.set()
+
+        results = await asyncio.gather(*queries)
+
+    assert health.status_code == 200
+    assert searches_running > 0
+    assert all(r.status_code == 200 for r in results)
+    assert all(r.json()["provider_used"] == "slow" for r in results)
@@ -0,0 +1,135 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import uuid
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.services import llm_providers
+from app.services.context_builder import ContextBuilder, merge_adjacent, select_mmr, pack_context
+from app.services.doc_store import save_metadata, delete_document
+from app.services.vector_store import add_document_chunks, delete_document_chunks, retrieve_chunks
+from legacy_chunking import chunk_text
+from app.utils.text_processing import chunk_document, clean_text, approx_token_count
+from conftest import FakeProvider
+
+TEXT = (
+    "The pump must be serviced yearly. Use only approved seals. "
+    "Warranty claims need the serial number. Claims are answered in ten days. "
+    "The valve is covered when installed by a certified technician. "
+    "Replacement parts ship within a week."
+)
+
+def hits_for(chunks, doc_id="doc", metadatas=None, order=None):
+    hits = [
+        {"id": f"{doc_id}_chunk_{i}", "text": text,
+         "metadata": {"document_id": doc_id, "chunk_index": i, **((metadatas or {}).get(i, {}))}}
+        for i, text in enumerate(chunks)
+    ]
+    return [hits[i] for i in order] if order else hits
+
+def test_merges_offset_overlap_back_into_original_text():
+    chunks = list(chunk_document(TEXT, max_tokens=20, overlap_tokens=8))
+    assert len(chunks) > 2
+    metadatas = {i: {"start_char": c.start, "end_char": c.end} for i, c in enumerate(chunks)}
+    # Retrieval order is by score, not position
+    hits = hits_for([c.text for c in chunks], metadatas=metadatas, order=[2, 0, 1] + list(range(3, len(chunks))))
+
+    passages = merge_adjacent(hits)
+
+    assert len(passages) == 1
+    assert passages[0].text == clean_text(TEXT)
+    assert passages[0].rank == 0
+
+def test_merges_word_overlap_without_offsets():
+    words = " ".join(f"w{i}" for i in range(50))
+    chunks = chunk_text(words, chunk_size=20, overlap=5)
+
+    passages = merge_adjacent(hits_for(chunks))
+
+    assert [p.text for p in passages] == [words]
+
+def test_non_adjacent_chunks_and_other_documents_stay_separate():
+    hits = hits_for(["a b c", "d e f", "g h i"], order=[0, 2]) + hits_for(["x y z"], doc_id="other")
+
+    passages = merge_adjacent(hits)
+
+    assert [p.text for p in passages] == ["a b c", "g h i", "x y z"]
+
+def test_mmr_drops_near_duplicates_and_prefers_diversity():
+    passages = merge_adjacent([
+        {"id": "a", "text": "pump service", "metadata": {}, "embedding": [1.0, 0.0, 0.0]},
+        {"id": "b", "text": "pump service again", "metadata": {}, "embedding": [0.999, 0.04, 0.0]},
+        {"id": "c", "text": "pump parts", "metadata": {}, "embedding": [0.9, 0.3, 0.0]},
+        {"id": "d", "text": "warranty", "metadata": {}, "embedding": [0.6, 0.0, 0.8]},
+    ])
+
+    selected = select_mmr(passages, [1.0, 0.0, 0.0], lambda_=0.3)
+
+    assert [p.chunk_ids[0] for p in selected] == ["a", "d", "c"]
+
+def test_mmr_keeps_retrieval_order_without_embeddings():
+    passages = merge_adjacent(hits_for(["one", "three"], order=[1, 0]))
+    assert select_mmr(passages, [1.0, 0.0]) == passages
+
+def test_pack_respects_budget_and_truncates_when_nothing_fits():
+    alpha, beta, gamma = (" ".join([word] * count) for word, count in [("alpha", 50), ("beta", 10), ("gamma", 10)])
+    passages = merge_adjacent(hits_for([alpha, beta], order=[0]) + hits_for([gamma], doc_id="b"))
+
+    context, tokens = pack_context(passages, budget=25)
+    assert context == gamma
+    assert tokens == 10
+
+    context, tokens = pack_context(passages[:1], budget=25)
+    assert tokens == approx_token_count(context) == 25
+
+def test_builder_reports_savings():
+    chunks = chunk_text(" ".join(f"w{i}" for i in range(400)), chunk_size=100, overlap=20)
+    builder = ContextBuilder(hits_for(chunks))
+
+    context, tokens = builder.pack(10_000)
+
+    assert builder.tokens_retrieved == sum(approx_token_count(c) for c in chunks)
+    assert tokens == 400
+    assert builder.tokens_retrieved - tokens == 20 * (len(chunks) - 1)
+
+def test_query_uses_per_provider_budget(monkeypatch):
+    doc_id = str(uuid.uuid4())
+    chunks = list(chunk_document(" ".join(TEXT for _ in range(10)), max_tokens=30, overlap_tokens=10))
+    add_document_chunks(doc_id, [c.text for c in chunks], metadatas=[
+        {"start_char": c.start, "end_char": c.end} for c in chunks
+    ])
+    save_metadata(doc_id, "manual.pdf", pages=1, chunks=len(chunks), text_length=chunks[-1].end)
+    provider = FakeProvider("small")
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [provider])
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "PROVIDER_CONTEXT_TOKENS", {"small": 40})
+    try:
+        response = TestClient(app).post("/query", json={
+            "question": "When must the pump be serviced?",
+            "max_chunks": 6,
+            "filters": {"doc_ids": [doc_id]}
+        }).json()
+    finally:
+        delete_document_chunks(doc_id)
+        delete_document(doc_id)
+
+    assert response["success"] is True
+    assert len(response["relevant_chunks"]) == 6
+    assert response["context_tokens"] == approx_token_count(provider.contexts[0]) <= 40
+    retrieved = sum(approx_token_count(c) for c in response["relevant_chunks"])
+    assert response["tokens_saved"] == retrieved - response["context_tokens"]
+
+def test_retrieve_chunks_returns_embeddings():
+    doc_id = str(uuid.uuid4())
+    add_document_chunks(doc_id, ["pump service interval", "warranty terms"])
+    try:
+        for mode in ("dense", "lexical", "hybrid"):
+            hits = retrieve_chunks("pump service", k=2, mode=mode, doc_ids=[doc_id], include_embeddings=True)
+            assert hits[0]["text"] == "pump service interval"
+            assert hits[0]["metadata"]["chunk_index"] == 0
+            assert all(len(hit["embedding"]) == settings.EMBEDDER_DIMENSION for hit in hits)
+    finally:
+        delete_document_chunks(doc_id)
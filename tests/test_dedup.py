@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import random
+import hashlib
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from synthetic_pdf import build_pdf
+from app.main import app
+from app.config import settings
+from app.api import upload as upload_api
+from app.services.doc_store import claim_upload, delete_document, find_document_by_hash, release_upload
+from app.services.vector_store import get_collection, delete_document_chunks
+
+client = TestClient(app)
+
+@pytest.fixture
+def pdf_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(upload_api, "DOC_LIMIT", 10**6)
+    # Fresh content per run so earlier runs never look like duplicates
+    data = build_pdf(pages=3, lines=10, seed=random.randrange(10**9))
+    yield data
+    response_doc = find_document_by_hash(hashlib.sha256(data).hexdigest())
+    if response_doc:
+        delete_document_chunks(response_doc["doc_id"])
+        delete_document(response_doc["doc_id"])
+
+def upload(data: bytes, **params):
+    return client.post("/upload", params=params, files={"file": ("report.pdf", data, "application/pdf")})
+
+def test_identical_upload_returns_existing_document(pdf_bytes, monkeypatch):
+    first = upload(pdf_bytes)
+    assert first.status_code == 200
+    assert first.json()["status"] == "success"
+
+    calls = []
+    monkeypatch.setattr(upload_api, "ingest_document", lambda *a, **k: calls.append(a))
+    second = upload(pdf_bytes)
+
+    assert second.status_code == 200
+    assert second.json()["status"] == "duplicate"
+    assert second.json()["document_id"] == first.json()["document_id"]
+    assert second.json()["content_hash"] == first.json()["content_hash"]
+    assert calls == []
+
+def test_duplicate_does_not_count_against_limit(pdf_bytes, monkeypatch):
+    upload(pdf_bytes)
+    monkeypatch.setattr(upload_api, "DOC_LIMIT", 0)
+
+    assert upload(pdf_bytes).json()["status"] == "duplicate"
+    assert upload(build_pdf(pages=1, seed=-1)).status_code == 400
+
+def test_identical_uploads_at_the_same_time_ingest_once(pdf_bytes, monkeypatch):
+    calls = []
+    started, finish = threading.Event(), threading.Event()
+    def slow_ingest(doc_id, *args, **kwargs):
+        calls.append(doc_id)
+        started.set()
+        finish.wait(5)
+        return {"document_id": doc_id, "status": "success"}
+    monkeypatch.setattr(upload_api, "ingest_document", slow_ingest)
+
+    responses = []
+    first = threading.Thread(target=lambda: responses.append(upload(pdf_bytes)))
+    first.start()
+    assert started.wait(5)
+    second = upload(pdf_bytes)
+    finish.set()
+    first.join()
+
+    assert second.status_code == 202
+    assert second.json()["status"] == "processing"
+    assert second.json()["document_id"] == calls[0] == responses[0].json()["document_id"]
+    assert len(calls) == 1
+    # The claim ends with the upload holding it
+    content_hash = hashlib.sha256(pdf_bytes).hexdigest()
+    assert claim_upload(content_hash, "next") is None
+    release_upload(content_hash, "next")
+
+def test_force_reingests_under_same_id(pdf_bytes):
+    first = upload(pdf_bytes).json()
+    doc_id = first["document_id"]
+
+    forced = upload(pdf_bytes, force="true").json()
+
+    assert forced["status"] == "reingested"
+    assert forced["document_id"] == doc_id
+    # Old chunks are replaced, not duplicated
+    stored = get_collection().get(where={"document_id": doc_id})
+    assert len(stored["ids"]) == first["chunks_created"]
@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import uuid
+from sqlalchemy import func, text
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.doc_store import (
+    DocumentMetadata, engine, get_session, save_metadata, delete_document, delete_documents,
+    get_document_stats, list_documents_page
+)
+
+client = TestClient(app)
+
+def table_totals() -> dict:
+    """What the counters must match, computed the slow way"""
+    db = get_session()
+    try:
+        documents, pages, chunks, text_length = db.query(
+            func.count(DocumentMetadata.doc_id),
+            func.coalesce(func.sum(DocumentMetadata.pages), 0),
+            func.coalesce(func.sum(DocumentMetadata.chunks), 0),
+            func.coalesce(func.sum(DocumentMetadata.text_length), 0)
+        ).one()
+        return {"total_documents": documents, "total_pages": pages,
+                "total_chunks": chunks, "total_text_length": text_length}
+    finally:
+        db.close()
+
+def assert_counters_consistent():
+    stats = get_document_stats()
+    assert {key: stats[key] for key in table_totals()} == table_totals()
+
+def test_counters_follow_saves_replaces_and_deletes():
+    before = get_document_stats()
+    a, b, c = (str(uuid.uuid4()) for _ in range(3))
+
+    assert save_metadata(a, "a.pdf", pages=3, chunks=10, text_length=1000)
+    assert save_metadata(b, "b.pdf", pages=2, chunks=5, text_length=400)
+    # Re-ingest replaces the row: totals change by the difference
+    assert save_metadata(a, "a.pdf", pages=4, chunks=12, text_length=1500)
+    assert save_metadata(c, "c.pdf", pages=1, chunks=1, text_length=10)
+
+    stats = get_document_stats()
+    assert stats["total_documents"] == before["total_documents"] + 3
+    assert stats["total_pages"] == before["total_pages"] + 7
+    assert stats["total_chunks"] == before["total_chunks"] + 18
+    assert stats["documents_remaining"] == before["documents_remaining"] - 3
+    assert_counters_consistent()
+
+    assert delete_document(a)
+    assert not delete_document(a)
+    assert sorted(delete_documents([b, c, a])) == sorted([b, c])
+
+    assert get_document_stats() == before
+    assert_counters_consistent()
+
+def test_sqlite_runs_in_wal_mode():
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+def walk(sort: str, order: str, limit: int) -> list:
+    rows, cursor = [], None
+    while True:
+        params = {"limit": limit, "sort": sort, "order": order}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/metadata", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["documents"]) <= limit
+        rows.extend(body["documents"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return rows
+
+def test_cursor_pagination_visits_every_row_once_in_order():
+    tag = uuid.uuid4().hex[:8]
+    # Repeated page counts exercise the doc_id tie-breaker
+    doc_ids = [f"{tag}-{i:02d}" for i in range(23)]
+    for i, doc_id in enumerate(doc_ids):
+        save_metadata(doc_id, f"{tag}_{i % 5}.pdf", pages=i % 3, chunks=1, text_length=10)
+    try:
+        for sort, order in [("upload_time", "desc"), ("pages", "asc"), ("filename", "desc"), ("doc_id", "asc")]:
+            rows = walk(sort, order, limit=4)
+            keys = [row["doc_id"] for row in rows]
+            assert len(keys) == len(set(keys)) == get_document_stats()["total_documents"]
+            assert set(doc_ids) <= set(keys)
+            expected = sorted(rows, key=lambda row: (row[sort], row["doc_id"]), reverse=order == "desc")
+            assert keys == [row["doc_id"] for row in expected]
+    finally:
+        delete_documents(doc_ids)
+
+def test_pagination_parameters_are_validated():
+    doc_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+    for doc_id in doc_ids:
+        save_metadata(doc_id, "x.pdf", pages=1, chunks=1, text_length=1)
+    try:
+        cursor = client.get("/metadata", params={"limit": 1, "sort": "pages"}).json()["next_cursor"]
+        assert cursor
+        assert list_documents_page(limit=1, sort="pages", cursor=cursor)["documents"]
+        assert client.get("/metadata", params={"cursor": "not-a-cursor"}).status_code == 400
+        # A cursor only continues the sort it came from
+        assert client.get("/metadata", params={"cursor": cursor, "sort": "filename"}).status_code == 400
+        assert client.get("/metadata", params={"sort": "content_hash"}).status_code == 422
+        assert client.get("/metadata", params={"limit": 5000}).status_code == 422
+    finally:
+        delete_documents(doc_ids)
@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+import chromadb
+from types import SimpleNamespace
+from app.services.embedders import HashingEmbedder, OnnxEmbedder, create_embedder
+from app.services.vector_store import check_embedder, EmbedderMismatchError
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(64)
+    first = embedder.encode(["The supplier contract", ""])
+    second = HashingEmbedder(64).encode(["The supplier contract", ""])
+    assert first == second
+    assert len(first[0]) == 64
+    assert np.linalg.norm(first[0]) == pytest.approx(1.0, abs=1e-6)
+    assert first[1] == [0.0] * 64
+
+def test_hashing_embedder_similarity_follows_shared_words():
+    query, related, unrelated = np.array(HashingEmbedder().encode([
+        "termination clause of the supplier contract",
+        "the contract termination clause requires notice",
+        "quarterly revenue grew in europe"
+    ]))
+    assert query @ related > query @ unrelated
+
+def test_create_embedder_selects_backend():
+    settings = SimpleNamespace(EMBEDDER_BACKEND="hashing", EMBEDDER_DIMENSION=32)
+    embedder = create_embedder(settings)
+    assert embedder.model_id == "hashing-32"
+    assert embedder.dimension == 32
+
+    with pytest.raises(ValueError):
+        create_embedder(SimpleNamespace(EMBEDDER_BACKEND="word2vec"))
+    with pytest.raises(ValueError):
+        create_embedder(SimpleNamespace(EMBEDDER_BACKEND="onnx", EMBEDDER_MODEL_PATH=None))
+
+def test_collection_records_embedder_and_refuses_mismatch(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = client.get_or_create_collection("documents")
+
+    check_embedder(collection, HashingEmbedder(16))
+    assert collection.metadata["embedding_model"] == "hashing-16"
+    assert collection.metadata["embedding_dimension"] == 16
+    # Same embedder again is fine
+    check_embedder(client.get_collection("documents"), HashingEmbedder(16))
+
+    with pytest.raises(EmbedderMismatchError):
+        check_embedder(client.get_collection("documents"), HashingEmbedder(32))
+
+def test_unrecorded_collection_checks_stored_dimension(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = client.get_or_create_collection("documents")
+    collection.add(ids=["a"], embeddings=[[0.1] * 8], documents=["old chunk"])
+
+    with pytest.raises(EmbedderMismatchError):
+        check_embedder(collection, HashingEmbedder(16))
+
+    check_embedder(collection, HashingEmbedder(8))
+    assert collection.metadata["embedding_model"] == "hashing-8"
+
+def build_onnx_model(directory, vocab, dim=4):
+    """Tiny "transformer": an embedding lookup per token, plus a word-level tokenizer"""
+    onnx = pytest.importorskip("onnx")
+    from onnx import helper, TensorProto
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    table = np.random.default_rng(0).normal(size=(len(vocab), dim)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "tiny",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "seq"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "seq"]),
+        ],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "seq", dim])],
+        initializer=[helper.make_tensor("table", TensorProto.FLOAT, table.shape, table.flatten())]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    path = os.path.join(directory, "model.onnx")
+    onnx.save(model, path)
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(os.path.join(directory, "tokenizer.json"))
+    return path, table
+
+def test_onnx_embedder_mean_pools_real_tokens(tmp_path):
+    vocab = {"[PAD]": 0, "[UNK]": 1, "hello": 2, "world": 3}
+    path, table = build_onnx_model(str(tmp_path), vocab)
+    embedder = OnnxEmbedder(path, max_length=64)
+    assert embedder.dimension == 4
+    assert embedder.max_tokens == 62
+    assert embedder.count_tokens("hello world " * 50) == 100  # not truncated
+
+    # Padding of the shorter text must not change its vector
+    short, long = np.array(embedder.encode(["hello", "hello world world"]))
+    expected_short = table[2] / np.linalg.norm(table[2])
+    expected_long = (table[2] + 2 * table[3]) / 3
+    expected_long /= np.linalg.norm(expected_long)
+    assert short == pytest.approx(expected_short, abs=1e-5)
+    assert long == pytest.approx(expected_long, abs=1e-5)
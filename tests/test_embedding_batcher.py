@@ -0,0 +1,63 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gc
+import asyncio
+import pytest
+from app.services.embedding_batcher import EmbeddingBatcher
+
+class RecordingEncoder:
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model exploded")
+        return [[float(len(text)), float(i)] for i, text in enumerate(texts)]
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_batched():
+    encoder = RecordingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=20)
+    texts = ["x" * n for n in range(1, 21)]
+
+    vectors = await asyncio.gather(*(batcher.encode(text) for text in texts))
+
+    # Each caller gets the vector computed for its own text
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert [len(b) for b in encoder.batches] == [8, 8, 4]
+    assert batcher.stats()["mean_batch_size"] == pytest.approx(20 / 3, abs=0.01)
+
+@pytest.mark.asyncio
+async def test_lone_request_skips_max_wait():
+    encoder = RecordingEncoder()
+    # A minute's wait would time the request out if it were applied
+    batcher = EmbeddingBatcher(encoder, max_batch_size=64, max_wait_ms=60_000)
+
+    vector = await asyncio.wait_for(batcher.encode("hello"), timeout=30)
+
+    assert vector == [5.0, 0.0]
+    assert encoder.batches == [["hello"]]
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    batcher = EmbeddingBatcher(RecordingEncoder(fail=True), max_batch_size=4, max_wait_ms=5)
+
+    results = await asyncio.gather(*(batcher.encode(t) for t in "abc"), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_running_batches_survive_garbage_collection():
+    batcher = EmbeddingBatcher(RecordingEncoder(), max_batch_size=2, max_wait_ms=5)
+
+    pending = asyncio.gather(*(batcher.encode(t) for t in "abcd"))
+    await asyncio.sleep(0)
+    assert len(batcher._tasks) == 2
+    gc.collect()
+
+    assert [v[0] for v in await pending] == [1.0] * 4
+    assert not batcher._tasks
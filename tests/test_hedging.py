@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import pytest
+from app.config import settings
+from app.services import llm_providers
+from app.services.llm_providers import LLMRequest, generate_with_fallback
+from conftest import FakeProvider
+
+REQUEST = LLMRequest(query="What is AI?", context="AI is artificial intelligence.")
+# Longer than any test waits: a call that depends on it times out instead
+NEVER = 3600.0
+
+@pytest.fixture
+def hedge_settings(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_DELAY_SECONDS", 0.05)
+
+@pytest.mark.asyncio
+async def test_hedged_returns_first_success_and_cancels_losers(monkeypatch, hedge_settings):
+    slow = FakeProvider("slow", 1, delay=NEVER)
+    fast = FakeProvider("fast", 2, delay=0.0)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [slow, fast])
+
+    result = await asyncio.wait_for(generate_with_fallback(REQUEST, strategy="hedged"), timeout=30)
+
+    assert result["success"] is True
+    assert result["provider_used"] == "fast"
+    assert result["hedge_delay"] == 0.05
+    # The losing call sees its cancellation on the next turns of the loop
+    while slow.in_flight:
+        await asyncio.sleep(0)
+    assert slow.cancelled
+
+@pytest.mark.asyncio
+async def test_hedged_does_not_hedge_fast_primary(monkeypatch, hedge_settings):
+    primary = FakeProvider("primary", 1, delay=0.0)
+    backup = FakeProvider("backup", 2, delay=0.01)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [primary, backup])
+
+    result = await generate_with_fallback(REQUEST, strategy="hedged")
+
+    assert result["provider_used"] == "primary"
+    assert backup.calls == 0
+
+@pytest.mark.asyncio
+async def test_hedged_replaces_failed_primary_immediately(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_DELAY_SECONDS", NEVER)
+    broken = FakeProvider("broken", 1, delay=0.0, fail=True)
+    backup = FakeProvider("backup", 2, delay=0.0)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [broken, backup])
+
+    result = await asyncio.wait_for(generate_with_fallback(REQUEST, strategy="hedged"), timeout=30)
+
+    assert result["provider_used"] == "backup"
+
+@pytest.mark.asyncio
+async def test_hedged_all_fail(monkeypatch, hedge_settings):
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [
+        FakeProvider("a", 1, delay=0.0, fail=True),
+        FakeProvider("b", 2, delay=0.0, fail=True),
+    ])
+
+    result = await generate_with_fallback(REQUEST, strategy="hedged")
+
+    assert result["success"] is False
+    assert result["provider_used"] == "none"
+    assert "b broke" in result["error"]
+
+@pytest.mark.asyncio
+async def test_sequential_strategy_still_falls_back(monkeypatch):
+    broken = FakeProvider("broken", 1, delay=0.0, fail=True)
+    backup = FakeProvider("backup", 2, delay=0.0)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [broken, backup])
+
+    result = await generate_with_fallback(REQUEST, strategy="sequential")
+
+    assert result["provider_used"] == "backup"
+    assert "hedge_delay" not in result
+
+def test_hedge_delay_uses_observed_p90(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_DELAY_SECONDS", None)
+    monkeypatch.setattr(settings, "HEDGE_MIN_SAMPLES", 10)
+    provider = FakeProvider("p", 1, delay=0.0)
+
+    assert llm_providers.hedge_delay_for(provider) == settings.HEDGE_DEFAULT_DELAY_SECONDS
+
+    for i in range(1, 101):
+        provider.stats.record_success(i / 100)
+    assert llm_providers.hedge_delay_for(provider) == pytest.approx(0.9, abs=0.02)
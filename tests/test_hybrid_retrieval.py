@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from app.services.vector_store import add_document_chunks, delete_document_chunks, search_similar_chunks
+
+CHUNKS = [
+    "Replace the hydraulic pump seal every 500 operating hours.",
+    "Part XK-4821 is the pressure relief valve for the main hydraulic line.",
+    "The pump housing is cast aluminium and needs no maintenance.",
+    "Warranty claims must be filed within 30 days of the failure.",
+]
+
+def test_tokenize_keeps_identifiers_whole():
+    assert tokenize("Order part XK-4821 (rev. v2.3.1) now.") == ["order", "part", "xk-4821", "rev", "v2.3.1", "now"]
+
+def test_bm25_ranks_rare_term_first(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.add_document("manual", [f"c{i}" for i in range(len(CHUNKS))], CHUNKS)
+    results = index.search("which part is xk-4821", k=2)
+    assert results[0][0] == "c1"
+    assert results[0][1] > results[1][1]
+    assert index.search("nonexistent gibberish") == []
+
+def test_index_persists_and_updates_per_document(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.add_document("a", ["a_0"], ["hydraulic pump seal"])
+    index.add_document("b", ["b_0"], ["warranty claims"])
+
+    reloaded = LexicalIndex(str(tmp_path))
+    assert reloaded.stats() == {"documents": 2, "chunks": 2, "terms": 5}
+    assert reloaded.search("warranty")[0][0] == "b_0"
+
+    # Re-adding replaces the old chunks; removing drops the segment
+    reloaded.add_document("a", ["a_0"], ["torque settings"])
+    assert reloaded.search("pump") == []
+    reloaded.remove_document("b")
+    assert LexicalIndex(str(tmp_path)).stats() == {"documents": 1, "chunks": 1, "terms": 2}
+
+def test_index_follows_changes_from_other_processes(tmp_path):
+    # Two instances on one directory stand in for two worker processes
+    worker, other = LexicalIndex(str(tmp_path)), LexicalIndex(str(tmp_path))
+    worker.add_document("a", ["a_0"], ["hydraulic pump seal"])
+    assert other.search("pump")[0][0] == "a_0"
+
+    worker.add_document("b", ["b_0"], ["warranty claims"])
+    worker.add_document("a", ["a_0"], ["torque settings"])
+    assert other.search("pump") == []
+    assert other.search("warranty")[0][0] == "b_0"
+
+    other.remove_document("b")
+    assert worker.search("warranty") == []
+    assert worker.stats() == other.stats() == {"documents": 1, "chunks": 1, "terms": 2}
+
+def test_reciprocal_rank_fusion_weights():
+    dense = ["a", "b", "c"]
+    lexical = ["c", "d"]
+    assert reciprocal_rank_fusion([(dense, 1.0), (lexical, 1.0)], k=2) == ["c", "a"]
+    # Lexical switched off: dense order only
+    assert reciprocal_rank_fusion([(dense, 1.0), (lexical, 0.0)], k=3) == dense
+    assert reciprocal_rank_fusion([(dense, 1.0), (lexical, 5.0)], k=2) == ["c", "d"]
+
+@pytest.fixture
+def indexed_doc():
+    doc_id = f"hybrid-{uuid.uuid4().hex[:8]}"
+    assert add_document_chunks(doc_id, CHUNKS)
+    yield doc_id
+    delete_document_chunks(doc_id)
+
+@pytest.mark.parametrize("mode", ["lexical", "hybrid"])
+def test_search_finds_exact_identifier(indexed_doc, mode):
+    results = search_similar_chunks("XK-4821", k=2, mode=mode)
+    assert results[0][0] == CHUNKS[1]
+
+def test_search_modes_return_same_shape(indexed_doc):
+    for mode in ["dense", "lexical", "hybrid"]:
+        results = search_similar_chunks("hydraulic pump seal", k=3, mode=mode)
+        assert len(results) == 1
+        assert 0 < len(results[0]) <= 3
+    with pytest.raises(ValueError):
+        search_similar_chunks("pump", mode="fuzzy")
+
+def test_deleted_document_leaves_lexical_index(indexed_doc):
+    delete_document_chunks(indexed_doc)
+    assert all(CHUNKS[1] not in chunks for chunks in search_similar_chunks("XK-4821", k=5, mode="lexical"))
+
+def test_query_rejects_bad_retrieval_settings():
+    client = TestClient(app)
+    assert client.post("/query", json={"question": "q", "retrieval_mode": "fuzzy"}).status_code == 422
+    assert client.post("/query", json={"question": "q", "lexical_weight": -1}).status_code == 422
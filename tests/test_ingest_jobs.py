@@ -0,0 +1,151 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import uuid
+import socket
+import subprocess
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.services import ingest_jobs
+from app.services.doc_store import get_session
+from app.services.ingest import IngestError
+from app.services.ingest_jobs import IngestJob, IngestJobQueue, get_job, QUEUED, RUNNING
+
+client = TestClient(app)
+
+def fake_ingest(doc_id, file_path, filename, progress=None, **kwargs):
+    progress("extract")
+    progress("embed", chunks_total=3, chunks_done=0)
+    progress("embed", chunks_done=3)
+    progress("store")
+    return {"document_id": doc_id, "chunks_created": 3}
+
+def failing_ingest(doc_id, file_path, filename, progress=None, **kwargs):
+    progress("extract")
+    raise IngestError("Could not extract text from PDF")
+
+def wait_for_job(job_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+def test_background_upload_returns_job_and_completes(monkeypatch, upload_dir):
+    monkeypatch.setattr(ingest_jobs, "ingest_document", fake_ingest)
+
+    response = client.post(
+        "/upload?background=true",
+        files={"file": ("report.pdf", b"%PDF-1.4 fake", "application/pdf")}
+    )
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status_url"] == f"/upload/jobs/{data['job_id']}"
+
+    job = wait_for_job(data["job_id"])
+    assert job["status"] == "done"
+    assert job["chunks_total"] == 3
+    assert job["chunks_done"] == 3
+    assert job["error"] is None
+    # The worker removes the saved upload when it is done
+    assert os.listdir(upload_dir) == []
+
+def test_failed_job_reports_reason(monkeypatch):
+    monkeypatch.setattr(ingest_jobs, "ingest_document", failing_ingest)
+
+    response = client.post(
+        "/upload?background=true",
+        files={"file": ("broken.pdf", b"%PDF-1.4 fake", "application/pdf")}
+    )
+    job = wait_for_job(response.json()["job_id"])
+
+    assert job["status"] == "failed"
+    assert job["stage"] == "extract"
+    assert job["error"] == "Could not extract text from PDF"
+
+def test_rejected_background_upload_removes_file(monkeypatch, upload_dir):
+    from app.api import upload as upload_api
+    monkeypatch.setattr(upload_api, "DOC_LIMIT", 0)
+
+    response = client.post(
+        "/upload?background=true",
+        files={"file": ("report.pdf", b"%PDF-1.4 " + uuid.uuid4().bytes, "application/pdf")}
+    )
+
+    assert response.status_code == 400
+    assert "Document limit reached" in response.json()["detail"]
+    assert os.listdir(upload_dir) == []
+
+def test_unknown_job_is_404():
+    assert client.get("/upload/jobs/does-not-exist").status_code == 404
+
+def test_queued_jobs_resume_after_restart(monkeypatch, upload_dir):
+    monkeypatch.setattr(ingest_jobs, "ingest_document", fake_ingest)
+    path = upload_dir / "left_over.pdf"
+    path.write_bytes(b"%PDF-1.4 fake")
+    job_id = str(uuid.uuid4())
+
+    # A job persisted by a previous process that never got to run
+    db = get_session()
+    db.add(IngestJob(job_id=job_id, doc_id=str(uuid.uuid4()), filename="left_over.pdf",
+                     file_path=str(path), status=QUEUED))
+    db.commit()
+    db.close()
+
+    IngestJobQueue(workers=1, max_depth=10).start()
+
+    deadline = time.time() + 5
+    while get_job(job_id)["status"] != "done" and time.time() < deadline:
+        time.sleep(0.02)
+    assert get_job(job_id)["status"] == "done"
+
+def test_each_left_over_job_runs_in_one_worker_process(monkeypatch, upload_dir):
+    ingested = []
+    def counting_ingest(doc_id, file_path, filename, progress=None, **kwargs):
+        ingested.append(filename)
+        return fake_ingest(doc_id, file_path, filename, progress=progress)
+    monkeypatch.setattr(ingest_jobs, "ingest_document", counting_ingest)
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    host = socket.gethostname()
+
+    # Left by earlier processes: never started, cut off by a crash, and
+    # still being run by a live worker (this one)
+    jobs = {}
+    db = get_session()
+    for name, status, owner in [("queued", QUEUED, None), ("orphaned", RUNNING, f"{host}:{dead.pid}"),
+                                ("running", RUNNING, f"{host}:{os.getpid()}")]:
+        path = upload_dir / f"{name}.pdf"
+        path.write_bytes(b"%PDF-1.4 fake")
+        jobs[name] = str(uuid.uuid4())
+        db.add(IngestJob(job_id=jobs[name], doc_id=str(uuid.uuid4()), filename=name,
+                         file_path=str(path), status=status, owner=owner))
+    db.commit()
+    db.close()
+
+    # Two queues stand in for two worker processes starting up
+    IngestJobQueue(workers=2, max_depth=10).start()
+    IngestJobQueue(workers=2, max_depth=10).start()
+
+    deadline = time.time() + 5
+    while {get_job(jobs[name])["status"] for name in ("queued", "orphaned")} != {"done"} and time.time() < deadline:
+        time.sleep(0.02)
+    assert get_job(jobs["queued"])["status"] == get_job(jobs["orphaned"])["status"] == "done"
+    assert sorted(ingested) == ["orphaned", "queued"]
+    assert get_job(jobs["running"])["status"] == "running"
+
+    db = get_session()
+    db.query(IngestJob).filter(IngestJob.job_id == jobs["running"]).delete()
+    db.commit()
+    db.close()
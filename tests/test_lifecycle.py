@@ -0,0 +1,121 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import uuid
+import threading
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import lifecycle
+from app.services.doc_store import save_metadata, find_document_ids
+from app.services.vector_store import add_document_chunks, search_similar_chunks, get_collection, lexical_index
+from app.services.semantic_cache import get_corpus_version
+
+client = TestClient(app)
+
+def make_document(text: str, filename: str = "manual.pdf", metadata: bool = True) -> str:
+    doc_id = str(uuid.uuid4())
+    add_document_chunks(doc_id, [f"{text} part one", f"{text} part two"])
+    if metadata:
+        save_metadata(doc_id, filename, pages=1, chunks=2, text_length=100)
+    return doc_id
+
+def chunk_count(doc_id: str) -> int:
+    return len(get_collection().get(ids=[f"{doc_id}_chunk_0", f"{doc_id}_chunk_1"])["ids"])
+
+def test_delete_cascades_to_vectors_and_lexical_index():
+    tag = uuid.uuid4().hex[:8]
+    doc_id = make_document(f"zebra{tag} maintenance")
+    assert search_similar_chunks(f"zebra{tag}", k=2, mode="lexical") != [[]]
+    version = get_corpus_version()
+
+    response = client.delete(f"/metadata/{doc_id}")
+
+    assert response.status_code == 200
+    assert response.json()["chunks_deleted"] is True
+    assert find_document_ids(doc_ids=[doc_id]) == []
+    assert chunk_count(doc_id) == 0
+    assert doc_id not in lexical_index.document_ids()
+    for mode in ("lexical", "hybrid"):
+        assert all(f"zebra{tag}" not in text for text in search_similar_chunks(f"zebra{tag}", k=5, mode=mode)[0])
+    # Cached answers are invalidated
+    assert get_corpus_version() > version
+    assert client.delete(f"/metadata/{doc_id}").status_code == 404
+
+def test_bulk_delete_by_filter():
+    tag = uuid.uuid4().hex[:8]
+    old = [make_document("old report", f"report_{tag}_{i}.pdf") for i in range(3)]
+    keep = make_document("invoice", f"invoice_{tag}.pdf")
+    try:
+        assert client.delete("/metadata").status_code == 400
+
+        response = client.delete("/metadata", params={"filename_pattern": f"report_{tag}_*"})
+
+        assert response.status_code == 200
+        assert sorted(response.json()["deleted"]) == sorted(old)
+        assert all(chunk_count(doc_id) == 0 for doc_id in old)
+        assert chunk_count(keep) == 2
+
+        future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+        response = client.delete("/metadata", params={
+            "filename_pattern": f"invoice_{tag}.pdf", "uploaded_after": future
+        })
+        assert response.json()["deleted"] == []
+        assert chunk_count(keep) == 2
+    finally:
+        lifecycle.delete_documents([keep])
+
+def test_compaction_removes_old_orphans_only():
+    known = make_document("known document")
+    orphan = make_document("orphan document", metadata=False)
+    try:
+        # Too recent: might be a document still being ingested
+        report = client.post("/metadata/compact").json()
+        assert orphan not in report["orphaned_documents"]
+
+        report = client.post("/metadata/compact", params={"min_age_seconds": 0, "dry_run": True}).json()
+        assert orphan in report["orphaned_documents"]
+        assert known not in report["orphaned_documents"]
+        assert chunk_count(orphan) == 2
+
+        report = client.post("/metadata/compact", params={"min_age_seconds": 0}).json()
+        assert orphan in report["orphaned_documents"]
+        assert report["orphaned_chunks"] >= 2
+        assert {"bytes_before", "bytes_after", "bytes_reclaimed"} <= set(report)
+        assert chunk_count(orphan) == 0
+        assert orphan not in lexical_index.document_ids()
+        assert chunk_count(known) == 2
+    finally:
+        lifecycle.delete_documents([known, orphan])
+
+def test_deletes_while_queries_are_in_flight():
+    tag = uuid.uuid4().hex[:8]
+    keep = make_document(f"stable{tag} pump guide")
+    doomed = [make_document(f"stable{tag} temporary notes {i}") for i in range(10)]
+    errors = []
+    stop = threading.Event()
+
+    def query_loop():
+        while not stop.is_set():
+            try:
+                for mode in ("dense", "lexical", "hybrid"):
+                    texts = search_similar_chunks(f"stable{tag} pump guide", k=3, mode=mode)[0]
+                    assert all(text is not None for text in texts)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=query_loop) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    try:
+        for doc_id in doomed:
+            assert lifecycle.delete_documents([doc_id])["deleted"] == [doc_id]
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        lifecycle.delete_documents([keep])
+
+    assert not errors
+    assert all(chunk_count(doc_id) == 0 for doc_id in doomed)
@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import asyncio
+import argparse
+import pytest
+from app.config import settings
+from app.services import llm_providers
+from app.services.lifecycle import delete_matching
+from app.services.llm_providers import LLMRequest
+import load_test
+from fake_providers import FakeLLMProvider, parse_spec, install
+
+def test_parse_provider_specs():
+    assert parse_spec("primary=lognormal:300:0.5,fail=0.05") == {
+        "name": "primary", "latency": ("lognormal", 300.0, 0.5), "failure_rate": 0.05
+    }
+    assert parse_spec("backup=fixed:800")["failure_rate"] == 0.0
+    for bad in ("primary", "primary=gaussian:1", "primary=uniform:1", "primary=fixed:1,retry=2"):
+        with pytest.raises(ValueError):
+            parse_spec(bad)
+
+@pytest.mark.asyncio
+async def test_fake_provider_is_seeded(monkeypatch):
+    monkeypatch.setattr(llm_providers, "PROVIDERS", list(llm_providers.PROVIDERS))
+    request = LLMRequest(query="q", context="c")
+
+    async def outcomes(seed):
+        provider = install(["flaky=fixed:0,fail=0.3"], seed=seed)[0]
+        results = []
+        for _ in range(200):
+            try:
+                await provider.agenerate(request)
+                results.append(True)
+            except RuntimeError:
+                results.append(False)
+        return results
+
+    first = await outcomes(1)
+    assert first == await outcomes(1)
+    assert 0.2 < first.count(False) / len(first) < 0.4
+    assert llm_providers.PROVIDERS[0].name == "flaky"
+
+    lognormal = FakeLLMProvider("slow", 1, latency=("lognormal", 200.0, 0.5))
+    samples = sorted(lognormal.sample_latency() for _ in range(1001))
+    assert 0.17 < samples[500] < 0.23
+
+def test_compare_flags_regressions_by_direction():
+    baseline = {
+        "ingest": {"pages_per_second": 100.0, "p50_ms": 50.0, "max_ms": 90.0, "documents": 10},
+        "query": {"c4": {"qps": 40.0, "p95_ms": 200.0, "success_rate": 1.0, "providers": {}}},
+    }
+    current = {
+        "ingest": {"pages_per_second": 80.0, "p50_ms": 40.0, "max_ms": 900.0, "documents": 10},
+        "query": {"c4": {"qps": 41.0, "p95_ms": 260.0, "success_rate": 0.95, "providers": {}}},
+    }
+
+    rows = {row["metric"]: row for row in load_test.compare(current, baseline, tolerance=0.1)}
+
+    assert set(rows) == {"ingest.pages_per_second", "ingest.p50_ms", "query.c4.qps",
+                         "query.c4.p95_ms", "query.c4.success_rate"}
+    assert rows["ingest.pages_per_second"]["regression"]   # throughput down 20%
+    assert not rows["ingest.p50_ms"]["regression"]         # faster
+    assert not rows["query.c4.qps"]["regression"]
+    assert rows["query.c4.p95_ms"]["regression"]           # latency up 30%
+    assert not rows["query.c4.success_rate"]["regression"]  # down 5%, within tolerance
+
+def test_suite_runs_end_to_end(monkeypatch):
+    monkeypatch.setattr(llm_providers, "PROVIDERS", list(llm_providers.PROVIDERS))
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    from app.api import upload as upload_api
+    monkeypatch.setattr(upload_api, "DOC_LIMIT", upload_api.DOC_LIMIT)
+    args = argparse.Namespace(
+        documents=2, pages=2, upload_concurrency=2, queries=6, concurrency=[1, 3],
+        provider=["primary=fixed:1,fail=0.5", "backup=fixed:1"], embedder="hashing", seed=7
+    )
+
+    try:
+        results = asyncio.run(load_test.run_suite(args))
+    finally:
+        delete_matching(filename_pattern="synthetic_*.pdf")
+
+    assert results["ingest"]["documents"] == 2 and results["ingest"]["pages"] == 4
+    assert results["ingest"]["pages_per_second"] > 0
+    assert set(results["query"]) == {"c1", "c3"}
+    for stats in results["query"].values():
+        assert stats["queries"] == 6 and stats["success_rate"] == 1.0
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+        assert set(stats["providers"]) <= {"primary", "backup"}
@@ -0,0 +1,86 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import uuid
+import pytest
+from prometheus_client import REGISTRY
+from fastapi.testclient import TestClient
+from synthetic_pdf import write_pdf
+from app.main import app
+from app.config import settings
+from app.services import llm_providers
+from app.services.ingest import ingest_document
+from app.services.lifecycle import delete_documents
+from conftest import FakeProvider
+
+client = TestClient(app)
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+@pytest.fixture
+def document(tmp_path):
+    doc_id = str(uuid.uuid4())
+    ingest_document(doc_id, write_pdf(str(tmp_path / "doc.pdf"), pages=3, lines=5), "doc.pdf")
+    yield doc_id
+    delete_documents([doc_id])
+
+def test_ingest_records_each_stage(tmp_path):
+    before = {stage: sample("rag_stage_seconds_count", stage=stage)
+              for stage in ("extract", "clean", "chunk", "embed", "index")}
+    batches = sample("rag_embedding_batch_size_count")
+    doc_id = str(uuid.uuid4())
+
+    ingest_document(doc_id, write_pdf(str(tmp_path / "doc.pdf"), pages=3, lines=5), "doc.pdf")
+    delete_documents([doc_id])
+
+    for stage, count in before.items():
+        assert sample("rag_stage_seconds_count", stage=stage) == count + 1, stage
+    assert sample("rag_embedding_batch_size_count") > batches
+    assert sample("rag_db_seconds_count", operation="INSERT") > 0
+
+def test_query_metrics_and_fallbacks(document, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [FakeProvider("down", 1, fail=True), FakeProvider("up", 2)])
+    searches = sample("rag_stage_seconds_count", stage="vector_search")
+
+    response = client.post("/query", json={"question": "What is on page 2?", "retrieval_mode": "hybrid"})
+
+    assert response.json()["provider_used"] == "up"
+    assert sample("rag_stage_seconds_count", stage="vector_search") == searches + 1
+    assert sample("rag_llm_failures_total", provider="down") >= 1
+    assert sample("rag_llm_fallbacks_total", provider="down") >= 1
+    assert sample("rag_llm_generate_seconds_count", provider="up", outcome="success") >= 1
+    # Labelled by route template
+    assert sample("rag_http_request_seconds_count", method="POST", route="/query") >= 1
+
+def test_metrics_endpoint_exposition(document):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for name in ("rag_stage_seconds_bucket", "rag_http_requests_in_flight",
+                 "rag_vector_collection_chunks", "rag_documents"):
+        assert name in body
+    assert sample("rag_documents") >= 1
+    assert sample("rag_vector_collection_chunks") >= 1
+    # Only the scrape itself is in flight
+    assert sample("rag_http_requests_in_flight") == 0
+
+def test_debug_timing_breakdown(document, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [FakeProvider("fake", 1)])
+    question = {"question": "What is on page 1?", "retrieval_mode": "hybrid"}
+
+    assert client.post("/query", json=question).json()["timings"] is None
+
+    monkeypatch.setattr(settings, "DEBUG", True)
+    timings = client.post("/query", json=question).json()["timings"]
+
+    for stage in ("embed", "vector_search", "lexical_search", "context", "llm_fake", "generate", "total"):
+        assert stage in timings, stage
+    assert timings["total"] >= timings["generate"] >= timings["llm_fake"]
+    assert timings["total"] >= timings["embed"] + timings["context"]
@@ -0,0 +1,181 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import threading
+import subprocess
+import numpy as np
+import pytest
+from app.config import settings
+from app.services import vector_store
+from app.services.numpy_index import NumpyVectorIndex, VECTORS_FILE
+
+def random_unit(rows: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def add_doc(index, doc_id, vectors, offset=0):
+    ids = [f"{doc_id}_chunk_{i}" for i in range(len(vectors))]
+    index.add(
+        ids=ids,
+        embeddings=vectors.tolist(),
+        documents=[f"text of {chunk_id}" for chunk_id in ids],
+        metadatas=[{"document_id": doc_id, "chunk_index": i} for i in range(len(vectors))]
+    )
+    return ids
+
+def test_top_k_matches_brute_force_for_query_batches(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path), block_rows=64)  # several blocks
+    vectors = random_unit(500)
+    add_doc(index, "a", vectors[:300])
+    add_doc(index, "b", vectors[300:])
+
+    queries = random_unit(7, seed=1)
+    rows, scores = index.top_k(queries, k=10)
+    for q, query in enumerate(queries):
+        expected = np.argsort(-(vectors @ query))[:10]
+        assert rows[q] == expected.tolist()
+        assert scores[q] == pytest.approx((vectors @ query)[expected], abs=2e-3)
+
+def test_query_returns_chroma_shaped_results(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    vectors = random_unit(20)
+    ids = add_doc(index, "a", vectors)
+
+    results = index.query(query_embeddings=[vectors[3].tolist(), vectors[7].tolist()], n_results=2)
+    assert [r[0] for r in results["ids"]] == [ids[3], ids[7]]
+    assert results["documents"][0][0] == f"text of {ids[3]}"
+    assert results["metadatas"][1][0] == {"document_id": "a", "chunk_index": 7}
+    assert results["distances"][0][0] == pytest.approx(0.0, abs=1e-2)
+    assert index.get(ids=[ids[5], "missing"], include=["documents"]) == {"ids": [ids[5]], "documents": [f"text of {ids[5]}"]}
+
+def test_delete_tombstones_and_survives_reopen(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    vectors = random_unit(30)
+    add_doc(index, "a", vectors[:10])
+    add_doc(index, "b", vectors[10:])
+    index.delete(where={"document_id": "a"})
+    assert index.count() == 20
+
+    reopened = NumpyVectorIndex(str(tmp_path))
+    assert reopened.count() == 20
+    hits = reopened.query(query_embeddings=[vectors[0].tolist()], n_results=30)["ids"][0]
+    assert len(hits) == 20
+    assert all(chunk_id.startswith("b_") for chunk_id in hits)
+
+def test_read_only_reader_sees_new_rows(tmp_path):
+    writer = NumpyVectorIndex(str(tmp_path))
+    vectors = random_unit(10)
+    add_doc(writer, "a", vectors[:5])
+
+    reader = NumpyVectorIndex(str(tmp_path), read_only=True)
+    assert reader.count() == 5
+    with pytest.raises(PermissionError):
+        add_doc(reader, "c", vectors[:1])
+
+    add_doc(writer, "b", vectors[5:])
+    assert reader.count() == 10
+    assert reader.query(query_embeddings=[vectors[8].tolist()], n_results=1)["ids"][0] == ["b_chunk_3"]
+
+def test_reader_in_another_process(tmp_path):
+    writer = NumpyVectorIndex(str(tmp_path))
+    vectors = random_unit(10)
+    add_doc(writer, "a", vectors)
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    code = (
+        "import json; from app.services.numpy_index import NumpyVectorIndex; "
+        f"index = NumpyVectorIndex({str(tmp_path)!r}, read_only=True); "
+        f"print(json.dumps(index.query(query_embeddings=[{vectors[4].tolist()!r}], n_results=1)['ids']))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout) == [["a_chunk_4"]]
+
+def test_partial_write_is_ignored(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    vectors = random_unit(6)
+    add_doc(index, "a", vectors[:3])
+    # A writer crashed after appending vectors but before logging them
+    with open(os.path.join(str(tmp_path), VECTORS_FILE), "ab") as f:
+        f.write(b"\x00" * 100)
+
+    reopened = NumpyVectorIndex(str(tmp_path))
+    assert reopened.count() == 3
+    add_doc(reopened, "b", vectors[3:])
+    assert reopened.query(query_embeddings=[vectors[4].tolist()], n_results=1)["ids"][0] == ["b_chunk_1"]
+
+def test_compaction_reclaims_deleted_rows(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path), block_rows=64)
+    vectors = random_unit(300)
+    add_doc(index, "a", vectors[:100])
+    add_doc(index, "b", vectors[100:200])
+    add_doc(index, "c", vectors[200:])
+    reader = NumpyVectorIndex(str(tmp_path), read_only=True)
+    assert reader.count() == 300
+    index.delete(where={"document_id": {"$in": ["a", "c"]}})
+
+    report = index.compact()
+
+    assert report["rows_before"] == 300 and report["rows_after"] == 100
+    assert report["bytes_reclaimed"] > 0
+    assert sorted(os.listdir(str(tmp_path))) == ["rows.jsonl", "texts.1.bin", "vectors.1.f16", "write.lock"]
+    for opened in (index, reader, NumpyVectorIndex(str(tmp_path))):
+        assert opened.count() == 100
+        result = opened.query(query_embeddings=[vectors[150].tolist()], n_results=1)
+        assert result["ids"] == [["b_chunk_50"]]
+        assert result["documents"] == [["text of b_chunk_50"]]
+    # Appends go to the new generation
+    add_doc(index, "d", vectors[:10])
+    assert reader.query(query_embeddings=[vectors[3].tolist()], n_results=1)["ids"] == [["d_chunk_3"]]
+    assert index.compact()["bytes_reclaimed"] == 0
+
+def test_queries_stay_correct_during_compaction(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path), block_rows=64)
+    vectors = random_unit(400)
+    for d in range(8):
+        add_doc(index, f"doc{d}", vectors[d * 50:(d + 1) * 50])
+    errors = []
+    stop = threading.Event()
+
+    def query_loop():
+        while not stop.is_set():
+            try:
+                result = index.query(query_embeddings=[vectors[375].tolist()], n_results=1)
+                assert result["ids"] == [["doc7_chunk_25"]], result["ids"]
+                assert result["documents"] == [["text of doc7_chunk_25"]]
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=query_loop) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for d in range(7):
+        index.delete(where={"document_id": f"doc{d}"})
+        index.compact()
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert index.count() == 50
+
+@pytest.fixture
+def numpy_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(settings, "NUMPY_INDEX_PATH", str(tmp_path))
+    monkeypatch.setattr(vector_store, "_collection", None)
+    yield
+
+def test_vector_store_api_on_numpy_backend(numpy_backend):
+    chunks = ["Part XK-4821 is the relief valve.", "The warranty lasts two years."]
+    assert vector_store.add_document_chunks("numpy-doc", chunks)
+    assert isinstance(vector_store.get_collection(), NumpyVectorIndex)
+    assert vector_store.get_collection_stats()["total_chunks"] == 2
+    assert vector_store.get_collection().metadata["embedding_model"] == vector_store.get_embedder().model_id
+
+    for mode in ["dense", "hybrid"]:
+        assert vector_store.search_similar_chunks("warranty years", k=1, mode=mode) == [[chunks[1]]]
+    assert vector_store.delete_document_chunks("numpy-doc")
+    assert vector_store.get_collection_stats()["total_chunks"] == 0
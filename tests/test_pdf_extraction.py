@@ -0,0 +1,58 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import random
+import pytest
+from synthetic_pdf import write_pdf
+from legacy_chunking import chunk_pages, chunk_text
+from app.services.ingest import ingest_document, IngestError
+from app.utils.text_processing import clean_text, iter_pdf_pages, open_pdf_pages, PageLimitExceeded
+
+def test_chunk_pages_matches_chunk_text():
+    """Streaming chunking gives exactly the chunks of the whole-document path"""
+    for seed in range(50):
+        rng = random.Random(seed)
+        pages = [" ".join(f"w{rng.randint(0, 99)}" for _ in range(rng.randint(0, 80)))
+                 for _ in range(rng.randint(1, 6))]
+        chunk_size = rng.randint(5, 60)
+        overlap = rng.randint(0, chunk_size - 1)
+
+        expected = chunk_text(clean_text("\n".join(pages)), chunk_size, overlap)
+        assert list(chunk_pages(pages, chunk_size, overlap)) == expected
+
+def test_chunk_text_overlap_larger_than_chunk_size_terminates():
+    chunks = chunk_text("word " * 500, chunk_size=50, overlap=200)
+    assert 0 < len(chunks) < 20
+
+def test_parallel_pages_stream_in_order(tmp_path):
+    path = write_pdf(str(tmp_path / "doc.pdf"), pages=40, lines=5)
+
+    sequential = list(iter_pdf_pages(path))
+    parallel = list(iter_pdf_pages(path, workers=2, pages_per_task=8))
+
+    assert len(parallel) == 40
+    assert parallel == sequential
+    assert parallel[0].startswith("Page 1 ")
+    assert parallel[39].startswith("Page 40 ")
+
+    page_count, pages = open_pdf_pages(path, workers=2, pages_per_task=8)
+    assert page_count == 40 and list(pages) == sequential
+
+def test_page_limit_uses_real_page_count(tmp_path):
+    path = write_pdf(str(tmp_path / "long.pdf"), pages=12, lines=2)
+    pages = iter_pdf_pages(path, max_pages=10)
+
+    with pytest.raises(PageLimitExceeded) as excinfo:
+        next(pages)
+    assert excinfo.value.page_count == 12
+
+def test_ingest_rejects_too_many_pages(tmp_path, monkeypatch):
+    from app.services import ingest
+    monkeypatch.setattr(ingest, "MAX_PAGES", 5)
+    path = write_pdf(str(tmp_path / "long.pdf"), pages=6, lines=2)
+
+    with pytest.raises(IngestError) as excinfo:
+        ingest_document("doc", path, "long.pdf")
+    assert "This document has 6 pages" in excinfo.value.detail
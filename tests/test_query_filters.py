@@ -0,0 +1,146 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import uuid
+import random
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.services import llm_providers
+from app.services.doc_store import save_metadata, delete_document, find_document_ids
+from app.services.vector_store import add_document_chunks, delete_document_chunks, search_similar_chunks
+from app.services.numpy_index import NumpyVectorIndex
+from app.services.lexical_index import LexicalIndex
+from synthetic_pdf import WORDS
+from conftest import FakeProvider
+
+@pytest.fixture
+def documents():
+    """Three documents in the metadata DB and the vector store"""
+    tag = uuid.uuid4().hex[:8]
+    docs = {
+        f"{tag}-a": (f"invoice_{tag}_march.pdf", ["The invoice total for March is 4,200 EUR."]),
+        f"{tag}-b": (f"invoiceX{tag}-april.pdf", ["The invoice total for April is 3,100 EUR."]),
+        f"{tag}-c": (f"contract_{tag}.pdf", ["The contract renews every year in April."]),
+    }
+    for doc_id, (filename, chunks) in docs.items():
+        save_metadata(doc_id, filename, pages=1, chunks=len(chunks), text_length=100)
+        add_document_chunks(doc_id, chunks)
+    yield tag, docs
+    for doc_id in docs:
+        delete_document_chunks(doc_id)
+        delete_document(doc_id)
+
+def test_find_document_ids_by_pattern_and_time(documents):
+    tag, docs = documents
+    a, b, c = docs
+    assert sorted(find_document_ids(filename_pattern=f"invoice_{tag}_*")) == [a]
+    assert sorted(find_document_ids(filename_pattern=f"INVOICE_{tag.upper()}_*.PDF")) == [a]
+    # "_" in the pattern is literal, "?" matches any single character
+    assert sorted(find_document_ids(filename_pattern=f"invoice?{tag}?*.pdf")) == [a, b]
+    assert sorted(find_document_ids(filename_pattern=f"*{tag}*", doc_ids=[b, c, "other"])) == [b, c]
+
+    now = datetime.utcnow()
+    assert set(docs) <= set(find_document_ids(uploaded_after=now - timedelta(minutes=5)))
+    assert not set(docs) & set(find_document_ids(uploaded_before=now - timedelta(minutes=5)))
+
+@pytest.mark.parametrize("mode", ["dense", "lexical", "hybrid"])
+def test_search_stays_inside_selected_documents(documents, mode):
+    tag, docs = documents
+    a, b, c = docs
+    results = search_similar_chunks("invoice total April", k=5, mode=mode, doc_ids=[a, c])
+    assert results and set(results[0]) <= {docs[a][1][0], docs[c][1][0]}
+    assert docs[b][1][0] not in results[0]
+    assert search_similar_chunks("invoice", mode=mode, doc_ids=[]) == []
+
+def test_query_endpoint_applies_filters(documents, monkeypatch):
+    tag, docs = documents
+    a, b, c = docs
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [FakeProvider("echo", answer=lambda request: request.context)])
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    client = TestClient(app)
+
+    response = client.post("/query", json={
+        "question": "What is the invoice total?",
+        "filters": {"filename_pattern": f"invoice_{tag}_*"}
+    }).json()
+    assert response["relevant_chunks"] == docs[a][1]
+
+    response = client.post("/query", json={
+        "question": "What is the invoice total?",
+        "filters": {"filename_pattern": "no-such-file-*.pdf"}
+    }).json()
+    assert response["success"] is False
+    assert response["relevant_chunks"] == []
+
+# Large collection, filter matching 1% of the chunks
+
+def random_text(seed: int, words: int = 60) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+DOCS = 100
+CHUNKS_PER_DOC = 200
+DIM = 64
+
+class RecordingDict(dict):
+    """dict recording every key read with d[key]"""
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.read = []
+
+    def __getitem__(self, key):
+        self.read.append(key)
+        return super().__getitem__(key)
+
+def test_filtered_vector_search_scores_only_selected_rows(tmp_path, monkeypatch):
+    index = NumpyVectorIndex(str(tmp_path), block_rows=8192)
+    rng = np.random.default_rng(0)
+    for d in range(DOCS):
+        vectors = rng.normal(size=(CHUNKS_PER_DOC, DIM)).astype(np.float32)
+        index.add(
+            ids=[f"doc{d}_chunk_{i}" for i in range(CHUNKS_PER_DOC)],
+            embeddings=vectors,
+            documents=[""] * CHUNKS_PER_DOC,
+            metadatas=[{"document_id": f"doc{d}", "chunk_index": i} for i in range(CHUNKS_PER_DOC)]
+        )
+    query = rng.normal(size=(1, DIM)).astype(np.float32).tolist()
+    where = {"document_id": "doc42"}
+    scored = []
+    score_top_k = index._score_top_k
+
+    def recording_score_top_k(queries, block, rows, *args):
+        scored.extend(rows)
+        return score_top_k(queries, block, rows, *args)
+    monkeypatch.setattr(index, "_score_top_k", recording_score_top_k)
+
+    hits = index.query(query_embeddings=query, n_results=10, where=where)["ids"][0]
+    assert len(hits) == 10
+    assert all(h.startswith("doc42_") for h in hits)
+    assert sorted(scored) == list(range(42 * CHUNKS_PER_DOC, 43 * CHUNKS_PER_DOC))
+
+    scored.clear()
+    index.query(query_embeddings=query, n_results=10, include=[])
+    assert len(scored) == DOCS * CHUNKS_PER_DOC
+
+def test_filtered_lexical_search_scores_only_selected_chunks(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    for d in range(DOCS):
+        ids = [f"doc{d}_chunk_{i}" for i in range(CHUNKS_PER_DOC)]
+        index.add_document(f"doc{d}", ids, [random_text(d * 10_000 + i) for i in range(len(ids))])
+    query = "contract warranty supplier invoice"
+    # Every BM25 evaluation reads the chunk's length
+    index._lengths = RecordingDict(index._lengths)
+
+    hits = index.search(query, k=10, doc_ids=["doc42"])
+    assert hits and all(chunk_id.startswith("doc42_") for chunk_id, _ in hits)
+    assert index._lengths.read and all(chunk_id.startswith("doc42_") for chunk_id in index._lengths.read)
+
+    index._lengths.read.clear()
+    index.search(query, k=10)
+    assert {chunk_id.split("_")[0] for chunk_id in index._lengths.read} == {f"doc{d}" for d in range(DOCS)}
@@ -0,0 +1,248 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import time
+import uuid
+import random
+import fcntl
+import socket
+import threading
+import subprocess
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+from synthetic_pdf import build_pdf
+from app.main import app
+from app.config import settings
+from app.services import index_versions, vector_store
+from app.services.doc_store import DocumentMetadata, get_document_text_stats, get_session, load_document_text
+from app.services.index_versions import IndexVersion, IndexVersionError, _Throttle
+from app.services.ingest import ingest_document
+from app.services.lexical_index import LexicalIndex
+from app.services.lifecycle import delete_documents
+from app.utils.text_processing import chunk_document, clean_page, iter_pdf_pages
+
+client = TestClient(app)
+
+PAGES = [
+    "The pump must be serviced   yearly. Use only approved seals.\n \n"
+    "Warranty claims need the\nserial number. Claims are answered in ten days!",
+    "",
+    "Is the valve covered?\n\n\nOnly when installed by a certified technician.",
+]
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """A throwaway index at the default paths (version 1) and no recorded
+    versions; yields a function ingesting a synthetic PDF"""
+    monkeypatch.setattr(settings, "CHROMA_PATH", str(tmp_path / "chroma"))
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_PATH", str(tmp_path / "lexical"))
+    monkeypatch.setattr(settings, "REINDEX_DUTY_CYCLE", 1.0)
+    monkeypatch.setattr(vector_store, "lexical_index", LexicalIndex(str(tmp_path / "lexical")))
+    for name in ("_collection", "_embedder", "_index_config", "_active_stamp"):
+        monkeypatch.setattr(vector_store, name, None)
+    db = get_session()
+    db.query(IndexVersion).delete()
+    db.commit()
+    db.close()
+    doc_ids = []
+
+    def ingest(seed: int) -> str:
+        path = tmp_path / f"{seed}.pdf"
+        path.write_bytes(build_pdf(pages=3, lines=12, seed=seed))
+        doc_id = str(uuid.uuid4())
+        ingest_document(doc_id, str(path), f"manual-{seed}.pdf")
+        doc_ids.append(doc_id)
+        return doc_id
+    yield ingest
+    delete_documents(doc_ids)
+    for name in ("_collection", "_embedder", "_index_config", "_active_stamp"):
+        monkeypatch.setattr(vector_store, name, None)
+
+def wait_for(version: int, status: str) -> dict:
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        state = index_versions.get_version(version)
+        if state["status"] == status:
+            return state
+        assert state["status"] not in ("failed", "cancelled"), state
+        time.sleep(0.05)
+    raise AssertionError(f"version {version} never became {status}")
+
+def chunk_ids(doc_id: str) -> list:
+    stored = vector_store.get_collection().get(where={"document_id": doc_id})
+    return stored["ids"]
+
+def recorded_chunks(doc_id: str) -> int:
+    db = get_session()
+    try:
+        return db.get(DocumentMetadata, doc_id).chunks
+    finally:
+        db.close()
+
+def test_clean_page_gives_the_same_chunks():
+    raw = list(chunk_document(PAGES, max_tokens=12, overlap_tokens=4))
+    kept = list(chunk_document([clean_page(page) for page in PAGES], max_tokens=12, overlap_tokens=4))
+
+    assert [(c.text, c.start, c.end, c.page_start, c.page_end) for c in kept] == \
+           [(c.text, c.start, c.end, c.page_start, c.page_end) for c in raw]
+    assert clean_page(PAGES[2]) == "Is the valve covered?\n\nOnly when installed by a certified technician."
+
+def test_ingest_keeps_cleaned_text_compressed(index, tmp_path):
+    before = get_document_text_stats()
+    seed = random.randrange(10**9)
+    doc_id = index(seed=seed)
+
+    pages = load_document_text(doc_id)
+    extracted = list(iter_pdf_pages(str(tmp_path / f"{seed}.pdf")))
+    assert len(pages) == 3 and pages == [clean_page(page) for page in extracted]
+    stats = get_document_text_stats()
+    assert stats["documents"] == before["documents"] + 1
+    assert stats["compressed_bytes"] - before["compressed_bytes"] < stats["text_length"] - before["text_length"]
+
+    delete_documents([doc_id])
+    assert load_document_text(doc_id) is None
+
+def test_reindex_switches_versions_and_rolls_back(index, tmp_path):
+    doc_ids = [index(seed=random.randrange(10**9)) for _ in range(2)]
+    old_chunks = {doc_id: len(chunk_ids(doc_id)) for doc_id in doc_ids}
+    question = "warranty seal pump"
+
+    started = index_versions.start_reindex({"chunk_max_tokens": 30, "chunk_overlap_tokens": 0,
+                                            "embedder_dimension": 96})
+    assert started["version"] == 2 and started["config"]["vector_path"] == f"{settings.CHROMA_PATH}-v2"
+    state = wait_for(2, "active")
+
+    assert state["documents_done"] == state["documents_total"]
+    assert index_versions.get_version(1)["status"] == "retired"
+    assert vector_store.get_embedder().dimension == 96
+    hits = vector_store.retrieve_chunks(question, k=3, doc_ids=doc_ids, include_embeddings=True)
+    assert hits and all(len(hit["embedding"]) == 96 for hit in hits)
+    for doc_id in doc_ids:
+        assert len(chunk_ids(doc_id)) > old_chunks[doc_id]
+        assert recorded_chunks(doc_id) == len(chunk_ids(doc_id))
+    # Another worker process follows through the file in the default store directory
+    assert os.path.exists(os.path.join(settings.CHROMA_PATH, vector_store.ACTIVE_INDEX))
+
+    assert index_versions.rollback()["status"] == "activating"
+    wait_for(1, "active")
+
+    assert index_versions.get_version(1)["status"] == "active"
+    assert index_versions.get_version(2)["status"] == "retired"
+    assert vector_store.get_embedder().dimension == 384
+    assert {doc_id: len(chunk_ids(doc_id)) for doc_id in doc_ids} == old_chunks
+    assert recorded_chunks(doc_ids[0]) == old_chunks[doc_ids[0]]
+
+    index_versions.delete_version(2)
+    assert not os.path.exists(f"{settings.CHROMA_PATH}-v2")
+    with pytest.raises(IndexVersionError, match="is active"):
+        index_versions.delete_version(1)
+
+def test_activation_catches_up_with_changes_during_build(index):
+    kept, removed = index(seed=random.randrange(10**9)), index(seed=random.randrange(10**9))
+    index_versions.start_reindex({"embedder_dimension": 64}, activate=False)
+    wait_for(2, "ready")
+
+    # Meanwhile version 1 still serves, and takes changes
+    added = index(seed=random.randrange(10**9))
+    delete_documents([removed])
+    assert vector_store.get_embedder().dimension == 384
+
+    index_versions.activate_version(2)
+    wait_for(2, "active")
+
+    assert vector_store.get_embedder().dimension == 64
+    assert chunk_ids(kept) and chunk_ids(added) and not chunk_ids(removed)
+    assert removed not in vector_store.index_snapshot().lexical.document_ids()
+
+    # Version 1 catches up in turn when rolled back to
+    later = index(seed=random.randrange(10**9))
+    index_versions.rollback()
+    wait_for(1, "active")
+    assert chunk_ids(later)
+
+def test_index_api(index):
+    index(seed=random.randrange(10**9))
+
+    response = client.get("/index/versions")
+    assert response.status_code == 200
+    assert [v["status"] for v in response.json()["versions"]] == ["active"]
+    assert response.json()["document_texts"]["documents"] >= 1
+
+    assert client.post("/index/reindex", json={"chunk_max_tokens": 0}).status_code == 422
+    assert client.post("/index/rollback").status_code == 409
+    assert client.get("/index/versions/9").status_code == 404
+
+    response = client.post("/index/reindex", json={"chunk_overlap_tokens": 8, "activate": False})
+    assert response.status_code == 202
+    version = response.json()["version"]
+    assert response.json()["config"]["chunk_overlap_tokens"] == 8
+    wait_for(version, "ready")
+    assert client.delete("/index/versions/1").status_code == 409
+    response = client.post(f"/index/versions/{version}/activate")
+    assert response.status_code == 202 and response.json()["status"] == "activating"
+    assert client.post(f"/index/versions/{version}/activate").status_code == 409
+    wait_for(version, "active")
+    response = client.delete("/index/versions/1")
+    assert response.status_code == 409 and "cannot be deleted" in response.json()["detail"]
+
+def test_switch_waits_for_writes_in_other_processes(index):
+    # Another worker storing chunks holds the lock file shared
+    os.makedirs(settings.CHROMA_PATH, exist_ok=True)
+    other = open(os.path.join(settings.CHROMA_PATH, vector_store.WRITE_LOCK), "a")
+    fcntl.flock(other, fcntl.LOCK_SH)
+    switched = threading.Event()
+
+    def switch():
+        with vector_store.index_writes(exclusive=True):
+            switched.set()
+    thread = threading.Thread(target=switch)
+    thread.start()
+    assert not switched.wait(0.2)
+
+    fcntl.flock(other, fcntl.LOCK_UN)
+    other.close()
+    assert switched.wait(5)
+    thread.join()
+    # Writes in this process nest and take the lock again afterwards
+    with vector_store.index_writes(), vector_store.index_writes():
+        pass
+
+def test_restart_fails_only_builds_of_dead_workers(index):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    host = socket.gethostname()
+    db = get_session()
+    db.add_all([
+        IndexVersion(version=1, status="active", config="{}"),
+        IndexVersion(version=2, status="building", config="{}", owner=f"{host}:{os.getpid()}"),
+        IndexVersion(version=3, status="building", config="{}", owner=f"{host}:{dead.pid}"),
+        IndexVersion(version=4, status="building", config="{}"),
+        IndexVersion(version=5, status="activating", config="{}", owner=f"{host}:{dead.pid}",
+                     retired_at=datetime.utcnow()),
+    ])
+    db.commit()
+    db.close()
+
+    assert index_versions.fail_interrupted_builds() == 3
+
+    assert [index_versions.get_version(v)["status"] for v in range(2, 6)] == \
+           ["building", "failed", "failed", "retired"]
+    db = get_session()
+    db.query(IndexVersion).delete()
+    db.commit()
+    db.close()
+
+def test_throttle_works_duty_cycle_of_the_time():
+    now, slept = [100.0], []
+    throttle = _Throttle(0.25, clock=lambda: now[0], sleep=slept.append)
+    now[0] += 0.5
+    throttle.pause()
+    now[0] += 0.1
+    throttle.pause()
+    assert slept == pytest.approx([1.5, 0.3])
+
+    _Throttle(1.0, clock=lambda: now[0], sleep=slept.append).pause()
+    assert len(slept) == 2
@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.api import query as query_api
+from app.services import llm_providers, semantic_cache as cache_module
+from app.services.semantic_cache import SemanticCache, bump_corpus_version
+from conftest import FakeProvider
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+async def fake_embed(query):
+    return [1.0, 0.0, 0.0]
+
+PAYLOAD = {"answer": "42", "provider_used": "fake", "success": True, "relevant_chunks": ["c"]}
+
+@pytest.fixture(autouse=True)
+def version_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CORPUS_VERSION_PATH", str(tmp_path / "corpus_version"))
+
+def test_similar_query_hits_and_dissimilar_misses():
+    cache = SemanticCache(max_entries=10, ttl_seconds=60, threshold=0.9)
+    cache.store([1.0, 0.0, 0.0], 5, PAYLOAD)
+
+    assert cache.lookup([0.99, 0.05, 0.0], 5) == PAYLOAD
+    assert cache.lookup([0.0, 1.0, 0.0], 5) is None
+    # Different max_chunks is a different answer
+    assert cache.lookup([1.0, 0.0, 0.0], 3) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+def test_lru_eviction():
+    cache = SemanticCache(max_entries=2, ttl_seconds=60, threshold=0.99)
+    cache.store([1.0, 0.0, 0.0], 5, {"answer": "a"})
+    cache.store([0.0, 1.0, 0.0], 5, {"answer": "b"})
+    # Touch "a" so "b" becomes least recently used
+    assert cache.lookup([1.0, 0.0, 0.0], 5) == {"answer": "a"}
+    cache.store([0.0, 0.0, 1.0], 5, {"answer": "c"})
+
+    assert cache.lookup([0.0, 1.0, 0.0], 5) is None
+    assert cache.lookup([1.0, 0.0, 0.0], 5) == {"answer": "a"}
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = SemanticCache(max_entries=10, ttl_seconds=30, threshold=0.9, clock=clock)
+    cache.store([1.0, 0.0], 5, PAYLOAD)
+
+    clock.now = 29
+    assert cache.lookup([1.0, 0.0], 5) == PAYLOAD
+    clock.now = 31
+    assert cache.lookup([1.0, 0.0], 5) is None
+
+def test_corpus_change_invalidates():
+    cache = SemanticCache(max_entries=10, ttl_seconds=60, threshold=0.9)
+    cache.store([1.0, 0.0], 5, PAYLOAD)
+
+    bump_corpus_version()
+
+    assert cache.lookup([1.0, 0.0], 5) is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_stale_answer_not_stored():
+    cache = SemanticCache(max_entries=10, ttl_seconds=60, threshold=0.9)
+    seen_version = cache_module.get_corpus_version()
+    bump_corpus_version()
+
+    cache.store([1.0, 0.0], 5, PAYLOAD, corpus_version=seen_version)
+
+    assert cache.lookup([1.0, 0.0], 5) is None
+
+def test_query_endpoint_serves_from_cache(monkeypatch):
+    provider = FakeProvider("counting", answer=lambda request: f"answer {provider.calls}")
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [provider])
+    monkeypatch.setattr(query_api, "retrieve_chunks", lambda query, k=5, query_embedding=None, **kwargs: [
+        {"id": "doc_chunk_0", "text": "chunk", "metadata": {}}
+    ])
+    monkeypatch.setattr(query_api, "embed_query_batched", fake_embed)
+    monkeypatch.setattr(query_api, "semantic_cache", SemanticCache(max_entries=10, ttl_seconds=60, threshold=0.9))
+    client = TestClient(app)
+
+    first = client.post("/query", json={"question": "What is AI?"}).json()
+    second = client.post("/query", json={"question": "what's AI"}).json()
+
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["answer"] == first["answer"]
+    assert provider.calls == 1
+    assert client.get("/query/cache").json()["hits"] == 1
@@ -0,0 +1,123 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import random
+import pytest
+from app.config import settings
+from app.services import vector_store
+from app.services.lexical_index import LexicalIndex
+from app.services.sharding import ShardedCollection, read_manifest, shard_of
+
+WORDS = ["valve", "pump", "warranty", "pressure", "invoice", "torque", "filter", "sensor",
+         "gasket", "bearing", "voltage", "coolant", "manual", "service", "seal", "rotor"]
+
+@pytest.fixture(params=["chroma", "numpy"])
+def store(request, tmp_path, monkeypatch):
+    """A throwaway vector store of the backend; returns a function opening
+    it with a shard count"""
+    monkeypatch.setattr(settings, "VECTOR_BACKEND", request.param)
+    monkeypatch.setattr(vector_store, "lexical_index", LexicalIndex(str(tmp_path / "lexical")))
+
+    def open_store(shards: int, name: str = "vectors"):
+        monkeypatch.setattr(settings, "CHROMA_PATH", str(tmp_path / name))
+        monkeypatch.setattr(settings, "NUMPY_INDEX_PATH", str(tmp_path / name))
+        monkeypatch.setattr(settings, "VECTOR_SHARDS", shards)
+        monkeypatch.setattr(vector_store, "_collection", None)
+        return vector_store.get_collection()
+    yield open_store
+    monkeypatch.setattr(vector_store, "_collection", None)
+
+def add_corpus(documents: int = 12, chunks: int = 5, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    doc_ids = [f"doc-{seed}-{d}" for d in range(documents)]
+    for d, doc_id in enumerate(doc_ids):
+        texts = [f"tag{d}x{c} " + " ".join(rng.choice(WORDS) for _ in range(8)) for c in range(chunks)]
+        assert vector_store.add_document_chunks(doc_id, texts)
+    return doc_ids
+
+def search(question: str, k: int = 8, doc_ids=None) -> list[str]:
+    return [hit["id"] for hit in vector_store.retrieve_chunks(question, k=k, mode="dense", doc_ids=doc_ids)]
+
+def distances(question: str, k: int = 8, doc_ids=None) -> list[float]:
+    """Top-k distances (equal distances may come back in any order, so
+    results are compared by these)"""
+    results = vector_store.get_collection().query(
+        query_embeddings=[vector_store.embed_query(question)], n_results=k,
+        where=vector_store.document_filter(doc_ids), include=["distances"]
+    )
+    return [round(float(distance), 4) for distance in results["distances"][0]]
+
+def test_shard_assignment_is_stable_and_spread():
+    assert shard_of("report.pdf", 4) == shard_of("report.pdf", 4)
+    counts = [0] * 4
+    for i in range(4000):
+        counts[shard_of(f"doc-{i}", 4)] += 1
+    assert min(counts) > 900
+
+def test_sharded_store_matches_unsharded(store):
+    questions = ["valve pressure warranty", "torque sensor", "coolant pump seal"]
+    store(1)
+    doc_ids = add_corpus()
+    expected = [distances(question) for question in questions]
+    expected_filtered = distances("valve pressure warranty", doc_ids=doc_ids[:3])
+    for doc_id in doc_ids:
+        vector_store.delete_document_chunks(doc_id)
+
+    # A fresh store: the shard count is set at creation
+    collection = store(4, name="sharded")
+    assert isinstance(collection, ShardedCollection) and len(collection.shards) == 4
+    assert read_manifest(settings.NUMPY_INDEX_PATH)["shards"] == 4
+    add_corpus()
+
+    # Every document in exactly its own shard
+    for doc_id in doc_ids:
+        owner = shard_of(doc_id, 4)
+        for i, shard in enumerate(collection.shards):
+            stored = shard.get(ids=[f"{doc_id}_chunk_{c}" for c in range(5)])["ids"]
+            assert len(stored) == (5 if i == owner else 0)
+    assert collection.count() == 60
+    assert [distances(question) for question in questions] == expected
+    assert distances("valve pressure warranty", doc_ids=doc_ids[:3]) == expected_filtered
+    for d in (0, 7):
+        assert search(f"tag{d}x3", k=1) == [f"{doc_ids[d]}_chunk_3"]
+
+    # Paging runs across the shards
+    indexed = vector_store.indexed_documents(page_size=7)
+    assert {doc_id: entry["chunks"] for doc_id, entry in indexed.items()} == {doc_id: 5 for doc_id in doc_ids}
+
+    assert vector_store.delete_documents_chunks(doc_ids[:6])
+    assert collection.count() == 30
+    assert all(doc_id in doc_ids[6:] for doc_id in (chunk.rsplit("_chunk_", 1)[0] for chunk in search("valve pump")))
+
+def test_rebalance_keeps_results(store):
+    collection = store(3)
+    doc_ids = add_corpus(documents=10)
+    questions = ["valve pressure warranty", "bearing rotor manual"]
+    expected = [distances(question) for question in questions]
+    old_shards = os.path.join(settings.NUMPY_INDEX_PATH, "g1")
+    assert os.path.isdir(old_shards)
+
+    for shards in (5, 1):
+        report = vector_store.rebalance_shards(shards)
+        assert report["chunks"] == 50 and sum(report["chunks_per_shard"]) == 50
+        # Reopened with the new count, whatever VECTOR_SHARDS says
+        collection = store(3)
+        assert read_manifest(settings.NUMPY_INDEX_PATH)["shards"] == shards
+        assert collection.count() == 50
+        assert [distances(question) for question in questions] == expected
+        assert search("tag4x2", k=1) == [f"{doc_ids[4]}_chunk_2"]
+        assert collection.metadata["embedding_model"] == vector_store.get_embedder().model_id
+    assert not os.path.exists(old_shards)
+    assert set(vector_store.indexed_documents()) == set(doc_ids)
+
+def test_existing_unsharded_store_keeps_its_layout(store):
+    store(1)
+    add_corpus(documents=2)
+    os.remove(os.path.join(settings.NUMPY_INDEX_PATH, "shards.json"))  # from before sharding
+
+    collection = store(4)
+
+    assert not isinstance(collection, ShardedCollection)
+    assert collection.count() == 10
+    assert read_manifest(settings.NUMPY_INDEX_PATH) == {"shards": 1, "generation": 0}
@@ -0,0 +1,212 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from app.config import settings
+from app.services import sidecar, vector_store
+from app.services.sidecar import (SidecarClient, SidecarCollection, SidecarEmbedder, SidecarError,
+                                  SidecarServer, ENCODE, HEADER, OK, join_embeddings, pack_frame,
+                                  split_embeddings, unpack_frame)
+from app.utils.text_processing import chunk_document
+
+def start_server(path: str, index: bool = True) -> tuple:
+    """A sidecar on path, in a thread of this process: (server, stop)"""
+    server = SidecarServer(path, index=index)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    task = loop.create_task(server.serve(ready))
+
+    async def drain():
+        # Let the cancelled connection handlers close their sockets
+        await asyncio.gather(*asyncio.all_tasks() - {asyncio.current_task()}, return_exceptions=True)
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        loop.run_until_complete(drain())
+        loop.close()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert ready.wait(30)
+
+    def cancel_all():
+        for pending in asyncio.all_tasks(loop):
+            pending.cancel()
+
+    def stop():
+        loop.call_soon_threadsafe(cancel_all)
+        thread.join(10)
+    return server, stop
+
+def socket_path() -> str:
+    return os.path.join(tempfile.mkdtemp(prefix="sidecar-"), "sidecar.sock")
+
+@pytest.fixture
+def server():
+    """A sidecar (serving the vector store too) on a temporary socket"""
+    server, stop = start_server(socket_path())
+    yield server
+    stop()
+
+@pytest.fixture
+def workers_use(monkeypatch):
+    """Make vector_store look for a sidecar at a path, as a fresh worker would"""
+    def use(path):
+        monkeypatch.setattr(settings, "EMBEDDING_SIDECAR_SOCKET", path)
+        monkeypatch.setattr(sidecar, "_client", None)
+        monkeypatch.setattr(sidecar, "_client_retry_at", 0.0)
+        monkeypatch.setattr(vector_store, "_embedder", None)
+        monkeypatch.setattr(vector_store, "_collection", None)
+    yield use
+    monkeypatch.setattr(vector_store, "_embedder", None)
+    monkeypatch.setattr(vector_store, "_collection", None)
+
+def test_frame_round_trip():
+    matrix = np.arange(6, dtype=np.float32).reshape(2, 3)
+    frame = pack_frame(ENCODE, {"texts": ["a", "é"]}, matrix)
+
+    op, payload, decoded = unpack_frame(frame[:HEADER.size], frame[HEADER.size:])
+
+    assert op == ENCODE and payload == {"texts": ["a", "é"]}
+    assert decoded.dtype == np.float32 and np.array_equal(decoded, matrix)
+    assert unpack_frame(pack_frame(ENCODE)[:HEADER.size], b"") == (ENCODE, None, None)
+
+def test_result_embeddings_travel_in_the_matrix():
+    vectors = np.arange(12, dtype=np.float32).reshape(4, 3)
+    results = {
+        "query": {"ids": [["a", "b", "c"], ["d"]], "embeddings": [list(vectors[:3]), list(vectors[3:])],
+                  "distances": [[0.1, 0.2, 0.3], [0.4]]},
+        "get": {"ids": ["a", "b"], "embeddings": vectors[:2]},
+    }
+    for method, result in results.items():
+        frame = pack_frame(OK, *split_embeddings(method, result))
+        _, payload, matrix = unpack_frame(frame[:HEADER.size], frame[HEADER.size:])
+
+        assert "embeddings" not in payload and matrix.dtype == np.float32
+        joined = join_embeddings(method, payload, matrix)
+        assert joined["ids"] == result["ids"]
+        assert np.array_equal(np.concatenate(joined["embeddings"]).ravel(),
+                              np.concatenate(result["embeddings"]).ravel())
+    assert join_embeddings("get", *split_embeddings("get", {"ids": [], "embeddings": []})) == \
+           {"ids": [], "embeddings": []}
+    assert split_embeddings("count", 3) == (3, None)
+
+def test_embedder_matches_in_process(server):
+    client = SidecarClient(server.path, timeout=30)
+    embedder = SidecarEmbedder(client)
+    local = vector_store.get_embedder()
+    texts = ["The relief valve is part XK-4821.", "Warranty lasts two years."] * 20
+
+    assert client.info["model_id"] == local.model_id and client.info["index"]
+    assert np.allclose(embedder.encode(texts), local.encode(texts), atol=1e-6)
+    assert embedder.count_tokens(texts[0]) == local.count_tokens(texts[0])
+    assert embedder.encode([]) == []
+
+    # Token counts for a whole page of sentences in one round trip
+    before = server.requests
+    assert embedder.count_tokens_batch(texts) == [local.count_tokens(text) for text in texts]
+    assert server.requests == before + 1
+    batches = []
+
+    def count_batch(batch):
+        batches.append(len(batch))
+        return embedder.count_tokens_batch(batch)
+    list(chunk_document(["One. Two. Three.", "Four.\n\nFive."], count_tokens_batch=count_batch))
+    assert batches == [3, 2]
+
+    # Concurrent single-text requests from several threads (one connection each)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        vectors = list(pool.map(lambda text: embedder.encode([text])[0], texts))
+    assert np.allclose(vectors, local.encode(texts), atol=1e-6)
+
+def test_workers_use_sidecar_for_model_and_index(server, workers_use):
+    workers_use(server.path)
+
+    assert isinstance(vector_store.get_embedder(), SidecarEmbedder)
+    assert isinstance(vector_store.get_collection(), SidecarCollection)
+    before = server.requests
+    chunks = ["Part XK-4821 is the relief valve.", "The warranty lasts two years."]
+    assert vector_store.add_document_chunks("sidecar-doc", chunks)
+    try:
+        hits = vector_store.retrieve_chunks("warranty years", k=1, mode="dense", doc_ids=["sidecar-doc"],
+                                            include_embeddings=True)
+        assert [hit["text"] for hit in hits] == [chunks[1]]
+        assert len(hits[0]["embedding"]) == vector_store.get_embedder().dimension
+        stored = vector_store.get_collection().get(ids=["sidecar-doc_chunk_0"], include=["metadatas"])
+        assert stored["metadatas"][0]["document_id"] == "sidecar-doc"
+        assert server.requests > before
+    finally:
+        assert vector_store.delete_document_chunks("sidecar-doc")
+    assert vector_store.get_collection().get(ids=["sidecar-doc_chunk_0"])["ids"] == []
+
+    with pytest.raises(SidecarError, match="Unknown collection method"):
+        vector_store.get_collection()._call("upsert")
+
+def test_falls_back_in_process_without_sidecar(workers_use):
+    workers_use(os.path.join(tempfile.mkdtemp(), "missing.sock"))
+
+    assert sidecar.sidecar_client() is None
+    assert not isinstance(vector_store.get_embedder(), SidecarEmbedder)
+    assert not isinstance(vector_store.get_collection(), SidecarCollection)
+
+def test_worker_attaches_to_sidecar_started_later(workers_use, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_SIDECAR_RETRY_SECONDS", 0.0)
+    path = socket_path()
+    workers_use(path)
+    assert not isinstance(vector_store.get_embedder(), SidecarEmbedder)
+
+    server, stop = start_server(path)
+    try:
+        assert isinstance(vector_store.get_embedder(), SidecarEmbedder)
+        assert isinstance(vector_store.get_collection(), SidecarCollection)
+    finally:
+        stop()
+
+def test_embedder_works_in_process_while_sidecar_is_down(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_SIDECAR_RETRY_SECONDS", 0.0)
+    path = socket_path()
+    server, stop = start_server(path, index=False)
+    embedder = SidecarEmbedder(SidecarClient(path, timeout=1), vector_store.load_local_embedder)
+    local = vector_store.load_local_embedder()
+    texts = ["The relief valve is part XK-4821.", "Warranty lasts two years."]
+
+    stop()
+    assert np.allclose(embedder.encode(texts), local.encode(texts), atol=1e-6)
+    assert embedder.count_tokens_batch(texts) == [local.count_tokens(text) for text in texts]
+
+    # Restarted: back to the sidecar
+    server, stop = start_server(path, index=False)
+    try:
+        assert np.allclose(embedder.encode(texts), local.encode(texts), atol=1e-6)
+        assert server.requests == 1
+    finally:
+        stop()
+
+    # Without a local model to fall back on the error is raised
+    with pytest.raises(SidecarError, match="unreachable"):
+        SidecarEmbedder(embedder.client).encode(texts)
+
+def test_collection_is_read_only_while_sidecar_is_down(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_SIDECAR_RETRY_SECONDS", 0.0)
+    path = socket_path()
+    server, stop = start_server(path)
+    local = vector_store.load_local_embedder()
+    collection = SidecarCollection(SidecarClient(path, timeout=1),
+                                   lambda: vector_store.open_local_collection(local))
+    count = collection.count()
+
+    stop()
+    # Reads fall back to the store on disk; writes fail so ingestion is retried
+    assert collection.count() == count
+    with pytest.raises(SidecarError, match="unreachable"):
+        collection.add(ids=["down_chunk_0"], embeddings=local.encode(["text"]), documents=["text"])
+    with pytest.raises(SidecarError, match="unreachable"):
+        collection.delete(ids=["down_chunk_0"])
@@ -0,0 +1,54 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import subprocess
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.services import startup
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HEAVY_MODULES = ["torch", "chromadb", "sentence_transformers", "openai", "cohere", "google.generativeai"]
+
+def test_importing_app_does_not_load_heavy_dependencies():
+    # Fresh interpreter: this process has already imported everything
+    code = (
+        "import sys, json; import app.main; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+def test_timed_init_records_status():
+    assert startup.timed_init("test_component", lambda: 42) == 42
+    assert startup.component_status()["test_component"]["status"] == "ready"
+
+    def broken():
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        startup.timed_init("test_broken", broken)
+    status = startup.component_status()["test_broken"]
+    assert status["status"] == "failed"
+    assert status["error"] == "boom"
+
+def test_live_always_ok():
+    response = TestClient(app).get("/live")
+    assert response.status_code == 200
+
+def test_ready_after_warm_up(monkeypatch):
+    monkeypatch.setattr(settings, "WARMUP_ON_STARTUP", True)
+    with TestClient(app) as client:
+        # Lifespan starts the warm-up thread; wait for it to finish
+        startup._warm_up_thread.join(timeout=120)
+        response = client.get("/ready")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["ready"] is True
+        for name in startup.REQUIRED_COMPONENTS:
+            assert body["components"][name]["status"] == "ready"
@@ -0,0 +1,162 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import time
+import socket
+import threading
+import httpx
+import pytest
+import uvicorn
+from app.main import app
+from app.config import settings
+from app.api import query as query_api
+from app.services import llm_providers
+from app.services.llm_providers import LLMRequest, stream_with_fallback
+from conftest import FakeProvider
+
+TOKENS = ("Paris ", "is ", "the ", "capital.")
+
+REQUEST = LLMRequest(query="What is the capital of France?", context="Paris is the capital.")
+
+async def collect(request=REQUEST):
+    return [event async for event in stream_with_fallback(request)]
+
+@pytest.mark.asyncio
+async def test_streams_tokens_then_done(monkeypatch):
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [FakeProvider("fake", 1, tokens=TOKENS)])
+
+    events = await collect()
+
+    assert events[0]["type"] == "provider" and events[0]["provider"] == "fake"
+    assert [e["text"] for e in events if e["type"] == "token"] == ["Paris ", "is ", "the ", "capital."]
+    assert events[-1] == {"type": "done", "result": {
+        "answer": "Paris is the capital.", "provider_used": "fake", "success": True
+    }}
+
+@pytest.mark.asyncio
+async def test_falls_back_before_first_token(monkeypatch):
+    broken = FakeProvider("broken", 1, tokens=TOKENS, fail_after=0)
+    backup = FakeProvider("backup", 2, tokens=TOKENS)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [broken, backup])
+
+    events = await collect()
+
+    assert [e["provider"] for e in events if e["type"] == "provider"] == ["backup"]
+    assert events[-1]["result"]["success"] is True
+    assert broken.stats.failures == 1
+
+@pytest.mark.asyncio
+async def test_no_fallback_after_first_token(monkeypatch):
+    flaky = FakeProvider("flaky", 1, tokens=TOKENS, fail_after=2)
+    backup = FakeProvider("backup", 2, tokens=TOKENS)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [flaky, backup])
+
+    events = await collect()
+
+    result = events[-1]["result"]
+    assert result["success"] is False
+    assert result["answer"] == "Paris is "
+    assert result["provider_used"] == "flaky"
+    assert backup.calls == 0
+
+@pytest.mark.asyncio
+async def test_stalled_stream_times_out_and_falls_back(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_TIMEOUT_SECONDS", 0.1)
+    stalled = FakeProvider("stalled", 1, tokens=TOKENS, delay=5.0)
+    backup = FakeProvider("backup", 2, tokens=TOKENS)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [stalled, backup])
+
+    start = time.perf_counter()
+    events = await collect()
+
+    assert time.perf_counter() - start < 1.0
+    assert events[-1]["result"]["provider_used"] == "backup"
+
+@pytest.mark.asyncio
+async def test_all_failed(monkeypatch):
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [FakeProvider("broken", 1, tokens=TOKENS, fail_after=0)])
+
+    events = await collect()
+
+    assert events == [{"type": "done", "result": {
+        "answer": "Sorry, all AI providers are currently unavailable.",
+        "provider_used": "none", "success": False, "error": "broken broke"
+    }}]
+
+# End to end through a real server: the test clients buffer streamed bodies
+
+@pytest.fixture(scope="module")
+def server_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="off", log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+@pytest.fixture
+def fake_retrieval(monkeypatch):
+    async def fake_embed(query):
+        return [1.0, 0.0, 0.0]
+
+    def fake_retrieve(query, k=5, query_embedding=None, **kwargs):
+        return [{"id": "doc_chunk_0", "text": "Paris is the capital of France.", "metadata": {}}]
+
+    monkeypatch.setattr(query_api, "embed_query_batched", fake_embed)
+    monkeypatch.setattr(query_api, "retrieve_chunks", fake_retrieve)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+
+def read_events(url: str, question: str = "What is the capital of France?"):
+    """(event, data, seconds since the request) for each SSE message"""
+    events = []
+    start = time.perf_counter()
+    with httpx.stream("POST", f"{url}/query/stream", json={"question": question}, timeout=10) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for message in response.iter_text():
+            # Messages may arrive together; split on the blank-line separator
+            for block in filter(None, message.split("\n\n")):
+                lines = dict(line.split(": ", 1) for line in block.splitlines())
+                events.append((lines["event"], json.loads(lines["data"]), time.perf_counter() - start))
+    return events
+
+def test_sse_time_to_first_byte(server_url, fake_retrieval, monkeypatch):
+    provider = FakeProvider("fake", 1, tokens=TOKENS, delay=0.3, token_delay=0.2)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [provider])
+
+    events = read_events(server_url)
+
+    names = [name for name, _, _ in events]
+    assert names == ["chunks", "provider", "token", "token", "token", "token", "done"]
+    chunks_at = events[0][2]
+    first_token_at = events[2][2]
+    done_at = events[-1][2]
+    # Chunks arrive before the provider starts answering, the first token
+    # long before the full answer (0.3s + 3 * 0.2s)
+    assert chunks_at < 0.25
+    assert first_token_at < 0.6
+    assert done_at - first_token_at > 0.45
+    assert events[0][1]["relevant_chunks"] == ["Paris is the capital of France."]
+    done = events[-1][1]
+    assert done["provider_used"] == "fake" and done["success"] is True
+    assert "".join(data["text"] for name, data, _ in events if name == "token") == "Paris is the capital."
+
+def test_sse_fallback_before_first_token(server_url, fake_retrieval, monkeypatch):
+    broken = FakeProvider("broken", 1, tokens=TOKENS, delay=0.1, fail_after=0)
+    backup = FakeProvider("backup", 2, tokens=TOKENS, delay=0.1)
+    monkeypatch.setattr(llm_providers, "PROVIDERS", [broken, backup])
+
+    events = read_events(server_url)
+
+    assert [data["provider"] for name, data, _ in events if name == "provider"] == ["backup"]
+    assert events[-1][1]["provider_used"] == "backup"
+
+def test_sse_empty_question_rejected(server_url):
+    response = httpx.post(f"{server_url}/query/stream", json={"question": "  "})
+    assert response.status_code == 400
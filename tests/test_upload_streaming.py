@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import hashlib
+import tracemalloc
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app.utils.uploads import save_upload
+
+BLOCK = 64 * 1024
+
+class GeneratedUpload:
+    """UploadFile stand-in that produces a PDF-looking body lazily"""
+    def __init__(self, size: int):
+        self.remaining = size
+        self.first = True
+
+    async def read(self, n: int) -> bytes:
+        n = min(n, self.remaining)
+        self.remaining -= n
+        if self.first and n:
+            self.first = False
+            return (b"%PDF-1.4\n" + b"x" * n)[:n]
+        return b"x" * n
+
+async def peak_memory_for(size: int, dest: str) -> int:
+    tracemalloc.start()
+    try:
+        await save_upload(GeneratedUpload(size), dest, max_bytes=1 << 30, block_size=BLOCK)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@pytest.mark.asyncio
+async def test_peak_memory_is_constant_in_file_size(tmp_path):
+    small = await peak_memory_for(2 * 1024 * 1024, str(tmp_path / "small.pdf"))
+    large = await peak_memory_for(32 * 1024 * 1024, str(tmp_path / "large.pdf"))
+
+    # A handful of blocks at most, and no growth with 16x the data
+    assert large < 8 * BLOCK
+    assert large < small * 1.5 + BLOCK
+
+@pytest.mark.asyncio
+async def test_hash_and_size_computed_on_the_fly(tmp_path):
+    dest = str(tmp_path / "doc.pdf")
+    size, digest = await save_upload(GeneratedUpload(300_000), dest, max_bytes=1 << 30, block_size=BLOCK)
+
+    with open(dest, "rb") as f:
+        data = f.read()
+    assert size == len(data) == 300_000
+    assert digest == hashlib.sha256(data).hexdigest()
+
+@pytest.mark.asyncio
+async def test_size_limit_enforced_while_streaming(tmp_path):
+    dest = tmp_path / "big.pdf"
+    with pytest.raises(HTTPException) as excinfo:
+        await save_upload(GeneratedUpload(10 * BLOCK), str(dest), max_bytes=3 * BLOCK, block_size=BLOCK)
+
+    assert excinfo.value.status_code == 400
+    assert not dest.exists()
+
+def test_non_pdf_bytes_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    response = TestClient(app).post(
+        "/upload",
+        files={"file": ("fake.pdf", b"MZ\x90\x00 not a pdf", "application/pdf")}
+    )
+
+    assert response.status_code == 400
+    assert "not a valid PDF" in response.json()["detail"]
+    assert os.listdir(tmp_path) == []
+
+def test_oversized_content_length_rejected_before_body(monkeypatch):
+    response = TestClient(app).post(
+        "/upload",
+        content=b"",
+        headers={
+            "content-type": "multipart/form-data; boundary=x",
+            "content-length": str(settings.MAX_UPLOAD_BYTES * 2)
+        }
+    )
+
+    assert response.status_code == 413
+    assert "File too large" in response.json()["detail"]